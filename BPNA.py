@@ -1,10 +1,8 @@
 import numpy as np
-import matplotlib.pyplot as plt
 
 # Simulation Parameters
 T = 1000         # Total simulation time in ms
 dt = 1           # Time step in ms
-time = np.arange(0, T, dt)
 
 # STDP Parameters
 A_plus = 0.01    # Learning rate for Long-Term Potentiation (LTP)
@@ -12,77 +10,186 @@ A_minus = 0.012  # Learning rate for Long-Term Depression (LTD)
 tau_plus = 20.0  # Time constant for LTP in ms
 tau_minus = 20.0 # Time constant for LTD in ms
 
-# Initialize synaptic weight array (simulate memristor-based weight)
-w = np.zeros_like(time, dtype=float)
-w[0] = 0.5     # Initial synaptic weight
+w0 = 0.5       # Initial synaptic weight (simulate memristor-based weight)
 
-# Generate pre- and post-synaptic spike trains as binary sequences.
 # For simplicity, we use a low probability to simulate approximately 10 Hz firing rate.
 p_pre = 0.01   # Probability of pre-synaptic spike at any ms
 p_post = 0.01  # Probability of post-synaptic spike at any ms
 
-np.random.seed(42)  # Seed for reproducibility
-pre_spikes = np.random.rand(len(time)) < p_pre
-post_spikes = np.random.rand(len(time)) < p_post
-
-# Simulation: Update synaptic weight based on pair-based STDP.
 # We use a fixed pairing window (ms) to check for nearby spikes.
 window = 50  # ms window for pairing spikes
 
-for t in range(1, len(time)):
-    current_weight = w[t-1]
-    delta_w = 0.0
-    
-    # LTP: If a pre-synaptic spike occurs, look ahead for post-synaptic spikes
-    if pre_spikes[t]:
-        for dt_offset in range(1, window):
-            if t + dt_offset < len(time) and post_spikes[t + dt_offset]:
-                delta_t = dt_offset  # Positive time difference: pre before post
-                delta_w += A_plus * np.exp(-delta_t / tau_plus)
-    
-    # LTD: If a post-synaptic spike occurs, look back for pre-synaptic spikes
-    if post_spikes[t]:
-        for dt_offset in range(1, window):
-            if t - dt_offset >= 0 and pre_spikes[t - dt_offset]:
-                delta_t = dt_offset  
-                delta_w -= A_minus * np.exp(-delta_t / tau_minus)
-    
-    # Update synaptic weight while keeping it within the range [0, 1]
-    new_weight = current_weight + delta_w
-    w[t] = np.clip(new_weight, 0, 1)
-
-# Visualization
-plt.figure(figsize=(12, 10))
-
-# Plot Synaptic Weight Evolution
-plt.subplot(3, 1, 1)
-plt.plot(time, w, color='blue', lw=2)
-plt.xlabel('Time (ms)')
-plt.ylabel('Synaptic Weight')
-plt.title('Evolution of Synaptic Weight (Memristor Conductance)')
-plt.grid(True)
-
-# Plot Pre-Synaptic Spike Train
-plt.subplot(3, 1, 2)
-pre_spike_times = time[pre_spikes]
-plt.eventplot(pre_spike_times, colors='black', lineoffsets=0.5)
-plt.xlabel('Time (ms)')
-plt.ylabel('Pre-Synaptic Spikes')
-plt.title('Pre-Synaptic Spike Train')
-plt.xlim(0, T)
-plt.ylim(0, 1.5)
-plt.grid(True)
-
-# Plot Post-Synaptic Spike Train
-plt.subplot(3, 1, 3)
-post_spike_times = time[post_spikes]
-plt.eventplot(post_spike_times, colors='red', lineoffsets=0.5)
-plt.xlabel('Time (ms)')
-plt.ylabel('Post-Synaptic Spikes')
-plt.title('Post-Synaptic Spike Train')
-plt.xlim(0, T)
-plt.ylim(0, 1.5)
-plt.grid(True)
-
-plt.tight_layout()
-plt.show()
+
+def generate_spike_trains(n_steps, p_pre=p_pre, p_post=p_post, seed=42):
+    """Pre- and post-synaptic spike trains as binary sequences"""
+    np.random.seed(seed)  # Seed for reproducibility
+    pre_spikes = np.random.rand(n_steps) < p_pre
+    post_spikes = np.random.rand(n_steps) < p_post
+    return pre_spikes, post_spikes
+
+
+def stdp_reference(pre_spikes, post_spikes, w_init=w0, A_plus=A_plus, A_minus=A_minus,
+                   tau_plus=tau_plus, tau_minus=tau_minus, window=window):
+    """Pair-based STDP one timestep at a time; returns the weight at every step"""
+    n_steps = len(pre_spikes)
+    w = np.zeros(n_steps, dtype=float)
+    w[0] = w_init
+
+    for t in range(1, n_steps):
+        current_weight = w[t-1]
+        delta_w = 0.0
+
+        # LTP: If a pre-synaptic spike occurs, look ahead for post-synaptic spikes
+        if pre_spikes[t]:
+            for dt_offset in range(1, window):
+                if t + dt_offset < n_steps and post_spikes[t + dt_offset]:
+                    delta_t = dt_offset  # Positive time difference: pre before post
+                    delta_w += A_plus * np.exp(-delta_t / tau_plus)
+
+        # LTD: If a post-synaptic spike occurs, look back for pre-synaptic spikes
+        if post_spikes[t]:
+            for dt_offset in range(1, window):
+                if t - dt_offset >= 0 and pre_spikes[t - dt_offset]:
+                    delta_t = dt_offset
+                    delta_w -= A_minus * np.exp(-delta_t / tau_minus)
+
+        # Update synaptic weight while keeping it within the range [0, 1]
+        new_weight = current_weight + delta_w
+        w[t] = np.clip(new_weight, 0, 1)
+    return w
+
+
+def stdp_kernel(amplitude, tau, window=window):
+    """amplitude * exp(-d / tau) for spike separations d = 0 .. window-1; d = 0 never pairs"""
+    kernel = amplitude * np.exp(-np.arange(window) / tau)
+    kernel[0] = 0.0
+    return kernel
+
+
+def spike_pairs(pre_idx, post_idx, window=window):
+    """All (pre, post) spike index pairs with 1 <= post - pre < window, from sorted index arrays"""
+    lo = np.searchsorted(post_idx, pre_idx + 1)
+    hi = np.searchsorted(post_idx, pre_idx + window)
+    counts = hi - lo
+    starts = np.repeat(lo, counts)
+    # Position of each pair within its pre spike's run of partners
+    rank = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(pre_idx, counts), post_idx[starts + rank]
+
+
+def clipped_cumsum(start, deltas, low=0.0, high=1.0):
+    """Running sum of `deltas` from `start`, clipped to [low, high] after every step"""
+    values = start + np.cumsum(deltas)
+    outside = (values < low) | (values > high)
+    if not outside.any():
+        return values
+    # Plain cumsum agrees up to the first step that leaves the range; go sequential from there
+    first = int(np.argmax(outside))
+    current = values[first - 1] if first else start
+    clipped = []
+    for delta in deltas[first:].tolist():
+        current = min(max(current + delta, low), high)
+        clipped.append(current)
+    values[first:] = clipped
+    return values
+
+
+def stdp_deltas(pre_idx, post_idx, A_plus=A_plus, A_minus=A_minus,
+                tau_plus=tau_plus, tau_minus=tau_minus, window=window):
+    """(steps, unclipped weight change at each) from sorted spike index arrays
+
+    Each (pre, post) pair within the window adds its LTP term at the pre spike and its
+    LTD term at the post spike. Work is proportional to the number of spikes and pairs,
+    not to the simulated time.
+    """
+    pre, post = spike_pairs(pre_idx, post_idx, window)
+    lag = post - pre
+    steps, inverse = np.unique(np.concatenate((pre, post)), return_inverse=True)
+    ltp = np.bincount(inverse[:len(pre)], weights=stdp_kernel(A_plus, tau_plus, window)[lag],
+                      minlength=len(steps))
+    ltd = np.bincount(inverse[len(pre):], weights=stdp_kernel(A_minus, tau_minus, window)[lag],
+                      minlength=len(steps))
+    delta = ltp - ltd
+    # The weight at step 0 is the initial value, never updated
+    changed = (delta != 0) & (steps > 0)
+    return steps[changed], delta[changed]
+
+
+def stdp_updates(pre_idx, post_idx, w_init=w0, A_plus=A_plus, A_minus=A_minus,
+                 tau_plus=tau_plus, tau_minus=tau_minus, window=window):
+    """(steps where the weight changes, weight after each change) from sorted spike index arrays"""
+    steps, delta = stdp_deltas(pre_idx, post_idx, A_plus, A_minus, tau_plus, tau_minus, window)
+    return steps, clipped_cumsum(w_init, delta)
+
+
+def stdp_vectorized(pre_spikes, post_spikes, w_init=w0, A_plus=A_plus, A_minus=A_minus,
+                    tau_plus=tau_plus, tau_minus=tau_minus, window=window):
+    """Same weights as stdp_reference, computed from the spike index arrays
+
+    The weight only moves at spike events, so clipping runs over those rather than over
+    every timestep; see stdp_updates.
+    """
+    n_steps = len(pre_spikes)
+    events, values = stdp_updates(np.flatnonzero(pre_spikes), np.flatnonzero(post_spikes), w_init,
+                                  A_plus, A_minus, tau_plus, tau_minus, window)
+    # Hold each value until the next event
+    run_lengths = np.diff(np.concatenate(([0], events, [n_steps])))
+    return np.repeat(np.concatenate(([w_init], values)), run_lengths)
+
+
+def plot_stdp(time, w, pre_spikes, post_spikes):
+    # Imported here so the simulators can be used without loading matplotlib
+    import matplotlib.pyplot as plt
+
+    plt.figure(figsize=(12, 10))
+
+    # Plot Synaptic Weight Evolution
+    plt.subplot(3, 1, 1)
+    plt.plot(time, w, color='blue', lw=2)
+    plt.xlabel('Time (ms)')
+    plt.ylabel('Synaptic Weight')
+    plt.title('Evolution of Synaptic Weight (Memristor Conductance)')
+    plt.grid(True)
+
+    # Plot Pre-Synaptic Spike Train
+    plt.subplot(3, 1, 2)
+    pre_spike_times = time[pre_spikes]
+    plt.eventplot(pre_spike_times, colors='black', lineoffsets=0.5)
+    plt.xlabel('Time (ms)')
+    plt.ylabel('Pre-Synaptic Spikes')
+    plt.title('Pre-Synaptic Spike Train')
+    plt.xlim(0, time[-1] + dt)
+    plt.ylim(0, 1.5)
+    plt.grid(True)
+
+    # Plot Post-Synaptic Spike Train
+    plt.subplot(3, 1, 3)
+    post_spike_times = time[post_spikes]
+    plt.eventplot(post_spike_times, colors='red', lineoffsets=0.5)
+    plt.xlabel('Time (ms)')
+    plt.ylabel('Post-Synaptic Spikes')
+    plt.title('Post-Synaptic Spike Train')
+    plt.xlim(0, time[-1] + dt)
+    plt.ylim(0, 1.5)
+    plt.grid(True)
+
+    plt.tight_layout()
+    plt.show()
+
+
+def simulate(T=T, p_pre=p_pre, p_post=p_post, seed=42, w_init=w0, A_plus=A_plus, A_minus=A_minus,
+             tau_plus=tau_plus, tau_minus=tau_minus, window=window):
+    """Run the whole simulation for one parameter set; returns (time, w, pre_spikes, post_spikes)"""
+    time = np.arange(0, T, dt)
+    pre_spikes, post_spikes = generate_spike_trains(len(time), p_pre, p_post, seed)
+    # Simulation: Update synaptic weight based on pair-based STDP.
+    w = stdp_vectorized(pre_spikes, post_spikes, w_init, A_plus, A_minus, tau_plus, tau_minus, window)
+    return time, w, pre_spikes, post_spikes
+
+
+def main():
+    plot_stdp(*simulate())
+
+
+if __name__ == "__main__":
+    main()
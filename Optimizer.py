@@ -1,5 +1,23 @@
+import re
 import time
 
+MAX_SCANNER_PATTERN = 100_000  # longest regex DFA.to_regex will build
+STREAM_CHUNK_SIZE = 1 << 20      # characters read per chunk by OptimizedLexer.iter_tokens
+
+END = '$'  # end-of-input lookahead in FOLLOW sets and the LL(1) table
+PARSER_MODES = ('cyk', 'll1', 'earley')
+
+EXPRESSION_PRODUCTIONS = {
+    'E': [['E', '+', 'T'], ['T']],
+    'T': [['T', '*', 'F'], ['F']],
+    'F': [['(', 'E', ')'], ['id'], ['num']]
+}
+
+# Characters above Latin-1 whose lower() is a single Latin-1 character, keyed by that
+# character: KELVIN SIGN, ANGSTROM SIGN, CAPITAL SHARP S and CAPITAL Y WITH DIAERESIS
+_LATIN1_CASE_ALIASES = {'k': ('\u212a',), '\xe5': ('\u212b',), '\xdf': ('\u1e9e',), '\xff': ('\u0178',)}
+_case_aliases = None
+
 # ======================
 # DFA Class
 # ======================
@@ -10,88 +28,547 @@ class DFA:
         self.transitions = transitions
         self.start = start
         self.accepts = accepts
+
+    def to_dict(self):
+        """JSON-serializable form; from_dict restores it"""
+        return {
+            'states': sorted(self.states, key=str),
+            'alphabet': sorted(self.alphabet),
+            'transitions': {state: dict(sorted(moves.items())) for state, moves in self.transitions.items()},
+            'start': self.start,
+            'accepts': sorted(self.accepts, key=str),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(set(data['states']), set(data['alphabet']),
+                   {state: dict(moves) for state, moves in data['transitions'].items()},
+                   data['start'], set(data['accepts']))
         
     def minimize(self):
-        # Hopcroft's algorithm implementation for DFA minimization
-        P = set([frozenset(self.accepts), frozenset(self.states - self.accepts)])
-        W = set([frozenset(self.accepts)])
-
-        while W:
-            A = W.pop()
-            for c in self.alphabet:
-                X = set()
-                for state in self.states:
-                    if self.transitions[state].get(c, None) in A:
-                        X.add(state)
-                if not X:
+        """Equivalent DFA with the fewest states, by Hopcroft's algorithm in O(n k log n)
+
+        Missing transitions go to a virtual dead state, so partial DFAs minimize correctly.
+        States are indexed, predecessors are precomputed per symbol, and blocks are
+        refined in place: each block is a contiguous slice of one state array, and a
+        split moves the marked states to the front of the slice. Result states are named
+        S0 (the start), S1, ... in breadth-first order over the sorted alphabet, so the
+        same input always gives the same names.
+        """
+        states = sorted(self.states, key=str)
+        symbols = sorted(self.alphabet, key=str)
+        index = {state: i for i, state in enumerate(states)}
+        sink = len(states)
+        n = sink + 1
+
+        # delta[a][q] and its inverse; the sink loops to itself on every symbol
+        delta = []
+        inverse = []
+        for symbol in symbols:
+            row = [sink] * n
+            preds = [[] for _ in range(n)]
+            for q, state in enumerate(states):
+                target = self.transitions.get(state, {}).get(symbol)
+                if target is not None:
+                    row[q] = index[target]
+            for q in range(n):
+                preds[row[q]].append(q)
+            delta.append(row)
+            inverse.append(preds)
+
+        # Partition: block b owns elems[first[b]:end[b]]; loc[q] is q's position in elems
+        accepting = [q for q, state in enumerate(states) if state in self.accepts]
+        rejecting = [q for q, state in enumerate(states) if state not in self.accepts] + [sink]
+        elems = accepting + rejecting
+        loc = [0] * n
+        for position, q in enumerate(elems):
+            loc[q] = position
+        block_of = [0] * n
+        first = []
+        end = []
+        for members in (accepting, rejecting):
+            if members:
+                for q in members:
+                    block_of[q] = len(first)
+                first.append(loc[members[0]])
+                end.append(loc[members[0]] + len(members))
+        marked = [0] * len(first)
+
+        waiting = []
+        in_waiting = set()
+        if len(first) == 2:
+            smaller = 0 if end[0] - first[0] <= end[1] - first[1] else 1
+            for a in range(len(symbols)):
+                waiting.append((smaller, a))
+                in_waiting.add((smaller, a))
+
+        while waiting:
+            splitter, a = waiting.pop()
+            in_waiting.discard((splitter, a))
+            preds = inverse[a]
+            touched = []
+            for q in elems[first[splitter]:end[splitter]]:
+                for p in preds[q]:
+                    b = block_of[p]
+                    # Swap p into the marked prefix of its block
+                    if loc[p] >= first[b] + marked[b]:
+                        if not marked[b]:
+                            touched.append(b)
+                        swap_pos = first[b] + marked[b]
+                        other = elems[swap_pos]
+                        elems[swap_pos], elems[loc[p]] = p, other
+                        loc[other], loc[p] = loc[p], swap_pos
+                        marked[b] += 1
+
+            for b in touched:
+                split = first[b] + marked[b]
+                marked[b] = 0
+                if split == end[b]:
                     continue
-                
-                new_P = set()
-                for Y in P:
-                    intersect = X & Y
-                    difference = Y - X
-                    if intersect and difference:
-                        new_P.add(frozenset(intersect))
-                        new_P.add(frozenset(difference))
-                        if Y in W:
-                            W.remove(Y)
-                            W.add(frozenset(intersect))
-                            W.add(frozenset(difference))
-                        else:
-                            if len(intersect) <= len(difference):
-                                W.add(frozenset(intersect))
-                            else:
-                                W.add(frozenset(difference))
+                # The new block takes the smaller side, so each state moves O(log n) times
+                new_block = len(first)
+                if split - first[b] <= end[b] - split:
+                    first.append(first[b])
+                    end.append(split)
+                    first[b] = split
+                else:
+                    first.append(split)
+                    end.append(end[b])
+                    end[b] = split
+                marked.append(0)
+                for q in elems[first[new_block]:end[new_block]]:
+                    block_of[q] = new_block
+                smaller = new_block if end[new_block] - first[new_block] <= end[b] - first[b] else b
+                for c in range(len(symbols)):
+                    if (b, c) in in_waiting:
+                        pair = (new_block, c)
                     else:
-                        new_P.add(Y)
-                P = new_P
+                        pair = (smaller, c)
+                    if pair not in in_waiting:
+                        waiting.append(pair)
+                        in_waiting.add(pair)
 
-        state_map = {}
-        new_states = set()
+        # Name blocks breadth-first from the start, then any unreachable ones
+        names = {}
+        order = [block_of[index[self.start]]]
+        names[order[0]] = 'S0'
+        for b in order:
+            rep = elems[first[b]]
+            for a in range(len(symbols)):
+                target = block_of[delta[a][rep]]
+                if target not in names:
+                    names[target] = f'S{len(names)}'
+                    order.append(target)
+        for q in range(sink):
+            b = block_of[q]
+            if b not in names:
+                names[b] = f'S{len(names)}'
+                order.append(b)
+
+        # The block holding the virtual sink only survives if real states are equivalent to it
+        dead = block_of[sink]
+        if end[dead] - first[dead] == 1 and dead in names:
+            order.remove(dead)
+            names = {b: f'S{i}' for i, b in enumerate(order)}
+
+        new_states = set(names.values())
         new_transitions = {}
-        new_start = None
         new_accepts = set()
-        
-        for i, group in enumerate(P):
-            rep = min(group)
-            state_map[rep] = f'S{i}'
-            new_states.add(f'S{i}')
-            if self.start in group:
-                new_start = f'S{i}'
-            if group & self.accepts:
-                new_accepts.add(f'S{i}')
-                
-        for group in P:
-            rep = min(group)
+        for b in order:
+            rep = min((q for q in elems[first[b]:end[b]] if q != sink))
             new_trans = {}
-            for symbol in self.alphabet:
-                target = self.transitions[rep].get(symbol, None)
+            for a, symbol in enumerate(symbols):
+                target = block_of[delta[a][rep]]
+                if target in names:
+                    new_trans[symbol] = names[target]
+            new_transitions[names[b]] = new_trans
+            if states[rep] in self.accepts:
+                new_accepts.add(names[b])
+        return DFA(new_states, self.alphabet, new_transitions, names[order[0]], new_accepts)
+
+    def to_regex(self, charset=None, max_length=MAX_SCANNER_PATTERN):
+        """Regex whose greedy match is the longest non-empty accepted prefix, or None
+
+        Works when every state reachable in one or more steps accepts and the only cycles
+        are self-loops. Each state then becomes `loop* (?:class next | ...)?`, with
+        disjoint classes on the alternatives, so `re` follows the DFA without
+        backtracking and stops where the DFA dies, i.e. at the maximal munch. Returns
+        None for other DFAs or when the unrolled pattern exceeds `max_length`.
+        `charset(symbols)` renders a set of alphabet symbols as a regex character set.
+        """
+        charset = charset or _symbol_charset
+        out = {}
+        for state in self.states:
+            by_target = {}
+            for symbol, target in self.transitions.get(state, {}).items():
+                if symbol in self.alphabet and target is not None:
+                    by_target.setdefault(target, set()).add(symbol)
+            out[state] = sorted(((target, frozenset(symbols)) for target, symbols in by_target.items()),
+                                key=lambda edge: str(edge[0]))
+
+        # Depth-first over the states reachable in one or more steps, ignoring self-loops;
+        # `order` lists each state after all of its successors
+        order = []
+        finished = set()
+        for root, _ in out[self.start]:
+            if root in finished:
+                continue
+            on_path = {root}
+            stack = [(root, iter(out[root]))]
+            while stack:
+                state, successors = stack[-1]
+                for target, _ in successors:
+                    if target == state or target in finished:
+                        continue
+                    if target in on_path:
+                        return None  # a cycle longer than a self-loop
+                    on_path.add(target)
+                    stack.append((target, iter(out[target])))
+                    break
+                else:
+                    stack.pop()
+                    on_path.discard(state)
+                    finished.add(state)
+                    order.append(state)
+        if not order or any(state not in self.accepts for state in order):
+            return None
+
+        patterns = {}
+        for state in order:
+            loop = ''
+            alternatives = []
+            for target, symbols in out[state]:
+                if target == state:
+                    loop = charset(symbols) + '*'
+                else:
+                    alternatives.append(charset(symbols) + patterns[target])
+            pattern = loop + (f"(?:{'|'.join(alternatives)})?" if alternatives else '')
+            if len(pattern) > max_length:
+                return None
+            patterns[state] = pattern
+        return '(?:' + '|'.join(charset(symbols) + patterns[target] for target, symbols in out[self.start]) + ')'
+
+
+def _regex_set(chars):
+    """Regex character set matching exactly `chars`, written as code point ranges"""
+    codes = sorted(set(map(ord, chars)))
+    parts = []
+    i = 0
+    while i < len(codes):
+        j = i
+        while j + 1 < len(codes) and codes[j + 1] == codes[j] + 1:
+            j += 1
+        lo, hi = (_regex_escape(code) for code in (codes[i], codes[j]))
+        parts.append(lo if i == j else f"{lo}-{hi}")
+        i = j + 1
+    return '[' + ''.join(parts) + ']'
+
+
+def _regex_escape(code):
+    if code < 0x100:
+        return f"\\x{code:02x}"
+    if code < 0x10000:
+        return f"\\u{code:04x}"
+    return f"\\U{code:08x}"
+
+
+def _symbol_charset(symbols):
+    return _regex_set(symbols)
+
+
+def _case_aliases_of(symbol):
+    """Characters above Latin-1 whose lower() is `symbol`"""
+    if ord(symbol) < 256:
+        return _LATIN1_CASE_ALIASES.get(symbol, ())
+    return _all_case_aliases().get(symbol, ())
+
+
+def _all_case_aliases():
+    """Characters above Latin-1 whose lower() is a different single character, keyed by that character
+
+    Walks every code point (~0.2s), so it only runs once a DFA has a symbol above Latin-1.
+    """
+    global _case_aliases
+    if _case_aliases is None:
+        _case_aliases = {}
+        for code in range(256, 0x110000):
+            char = chr(code)
+            lower = char.lower()
+            if lower != char and len(lower) == 1:
+                _case_aliases.setdefault(lower, []).append(char)
+    return _case_aliases
+
+
+# ======================
+# Compiled DFA Class
+# ======================
+class _CharClassMap(dict):
+    # str.translate table: code point -> class character, filled in lazily above Latin-1
+    def __init__(self, compiled):
+        super().__init__((code, chr(cls)) for code, cls in enumerate(compiled.char_classes))
+        self.compiled = compiled
+
+    def __missing__(self, code):
+        value = self[code] = chr(self.compiled.class_of(chr(code)))
+        return value
+
+
+class CompiledDFA:
+    """Table-driven form of a DFA for scanning
+
+    States become integers and alphabet symbols with identical transitions share a
+    character class; class 0 is every character with no transition. The dense
+    transition table is one flat list with each state stored premultiplied by the
+    class count, so a step is a single index: next = table[state + class], and -1 is
+    the dead state. Characters map to classes through a 256-entry table, with a cached
+    lookup above Latin-1; like the lexer, lookup goes through char.lower().
+    """
+
+    def __init__(self, dfa):
+        states = [dfa.start] + sorted(dfa.states - {dfa.start})
+        columns = {}
+        self.symbol_class = {}
+        for symbol in sorted(dfa.alphabet):
+            column = tuple(dfa.transitions.get(state, {}).get(symbol) for state in states)
+            if any(target is not None for target in column):
+                self.symbol_class[symbol] = columns.setdefault(column, len(columns) + 1)
+        self.n_classes = len(columns) + 1
+        if self.n_classes > 256:
+            raise ValueError(f"{self.n_classes} character classes do not fit in a byte")
+
+        offsets = {state: i * self.n_classes for i, state in enumerate(states)}
+        self.table = [-1] * (len(states) * self.n_classes)
+        for column, cls in columns.items():
+            for i, target in enumerate(column):
                 if target is not None:
-                    for g in P:
-                        if target in g:
-                            new_trans[symbol] = state_map[min(g)]
-                            break
-            new_transitions[state_map[rep]] = new_trans
-            
-        return DFA(new_states, self.alphabet, new_transitions, new_start, new_accepts)
+                    self.table[i * self.n_classes + cls] = offsets[target]
+        self.accepting = [False] * len(self.table)
+        for state in dfa.accepts:
+            self.accepting[offsets[state]] = True
+        self.states = states
+        self.start = offsets[dfa.start]
+        self.char_classes = bytes(self.class_of(chr(code)) for code in range(256))
+        self._class_map = _CharClassMap(self)
+
+    def class_of(self, char):
+        return self.symbol_class.get(char.lower(), 0)
+
+    def charset(self, symbols):
+        """Regex set of every character the lexer maps onto one of `symbols`, via char.lower()"""
+        chars = [chr(code) for code in range(256) if chr(code).lower() in symbols]
+        for symbol in symbols:
+            chars.extend(_case_aliases_of(symbol))
+            if ord(symbol) >= 256 and symbol.lower() == symbol:
+                chars.append(symbol)
+        return _regex_set(chars)
+
+    def classify(self, source):
+        """Character class of every character of `source`, as bytes"""
+        return source.translate(self._class_map).encode('latin-1')
 
 # ======================
 # CFG Class
 # ======================
 class CFG:
-    def __init__(self, productions):
+    def __init__(self, productions, start=None):
         self.productions = productions
-        
+        self.start = start if start is not None else next(iter(productions))
+
+    def terminals(self):
+        return {symbol for rhs_list in self.productions.values() for rhs in rhs_list
+                for symbol in rhs if symbol not in self.productions}
+
     def to_cnf(self):
-        # Convert CFG to Chomsky Normal Form (CNF)
-        optimized_productions = {
-            'E': [['T', "E'"]],
-            "E'": [['+', 'T', "E'"], []],
-            'T': [['F', "T'"]],
-            "T'": [['*', 'F', "T'"], []],
-            'F': [['(', 'E', ')'], ['id'], ['num']]
-        }
-        return optimized_productions
+        """Equivalent grammar in Chomsky Normal Form, as a productions dict whose first key is the start
+
+        Every production becomes [B, C] or [terminal]; only the start may also have [] when
+        the language contains the empty string. Applies START, TERM, BIN, DEL and UNIT in
+        that order, then drops nonterminals that derive nothing or cannot be reached.
+        """
+        productions = {head: [list(rhs) for rhs in rhs_list] for head, rhs_list in self.productions.items()}
+        used = set(productions) | self.terminals()
+        fresh = lambda base: _fresh_name(base, used)
+
+        # START: a new start symbol that never appears on a right-hand side
+        start = self.start
+        if any(start in rhs for rhs_list in productions.values() for rhs in rhs_list):
+            start = fresh(f"{self.start}0")
+            productions = {start: [[self.start]], **productions}
+
+        # TERM: terminals inside longer right-hand sides get a nonterminal of their own
+        terminal_heads = {}
+        for head in list(productions):
+            for rhs in productions[head]:
+                if len(rhs) < 2:
+                    continue
+                for k, symbol in enumerate(rhs):
+                    if symbol not in productions:
+                        if symbol not in terminal_heads:
+                            terminal_heads[symbol] = fresh(f"T_{symbol}")
+                        rhs[k] = terminal_heads[symbol]
+        for symbol, head in terminal_heads.items():
+            productions[head] = [[symbol]]
+
+        # BIN: split right-hand sides longer than two into chains of fresh nonterminals
+        for head in list(productions):
+            binary = []
+            for rhs in productions[head]:
+                current_list = binary
+                while len(rhs) > 2:
+                    rest = fresh(f"{head}_")
+                    current_list.append([rhs[0], rest])
+                    productions[rest] = current_list = []
+                    rhs = rhs[1:]
+                current_list.append(rhs)
+            productions[head] = binary
+
+        # DEL: drop empty productions, adding every variant without the nullable symbols
+        nullable = CFG(productions, start).nullable_symbols()
+        for head, rhs_list in productions.items():
+            variants = []
+            for rhs in rhs_list:
+                options = [[]]
+                for symbol in rhs:
+                    options = [o + [symbol] for o in options] + (options if symbol in nullable else [])
+                for option in options:
+                    if option and option not in variants:
+                        variants.append(option)
+            productions[head] = variants
+
+        # UNIT: replace A -> B by B's productions, following chains of unit rules
+        for head in list(productions):
+            seen = [head]
+            result = []
+            for symbol in seen:
+                for rhs in productions[symbol]:
+                    if len(rhs) == 1 and rhs[0] in productions:
+                        if rhs[0] not in seen:
+                            seen.append(rhs[0])
+                    elif rhs not in result:
+                        result.append(rhs)
+            productions[head] = result
+
+        # Keep nonterminals that derive some terminal string and are reachable from the start
+        productive = set()
+        changed = True
+        while changed:
+            changed = False
+            for head, rhs_list in productions.items():
+                if head not in productive and any(
+                        all(s in productive or s not in productions for s in rhs) for rhs in rhs_list):
+                    productive.add(head)
+                    changed = True
+        reachable = [start]
+        for head in reachable:
+            for rhs in productions[head]:
+                if all(s in productive or s not in productions for s in rhs):
+                    for symbol in rhs:
+                        if symbol in productions and symbol not in reachable:
+                            reachable.append(symbol)
+        cnf = {}
+        for head in reachable:
+            cnf[head] = [rhs for rhs in productions[head]
+                         if all(s in productive or s not in productions for s in rhs)]
+        if start in nullable:
+            cnf[start].append([])
+        return cnf
+
+    def eliminate_left_recursion(self):
+        """Equivalent productions with no left recursion, the start still first
+
+        Paull's algorithm: nonterminals are taken in order, productions starting with an
+        earlier one are expanded, and immediate recursion A -> A a | b becomes A -> b A',
+        A' -> a A' | []. Each A' follows its A. Assumes no cycles A =>+ A and no empty
+        productions in the input, as the algorithm requires.
+        """
+        used = set(self.productions) | self.terminals()
+        result = {}
+        for head, rhs_list in self.productions.items():
+            expanded = []
+            for rhs in rhs_list:
+                if rhs and rhs[0] in result and rhs[0] != head:
+                    expanded.extend(list(prefix) + list(rhs[1:]) for prefix in result[rhs[0]])
+                else:
+                    expanded.append(list(rhs))
+            recursive = [rhs[1:] for rhs in expanded if rhs and rhs[0] == head and len(rhs) > 1]
+            others = [rhs for rhs in expanded if not rhs or rhs[0] != head]
+            if recursive:
+                tail = _fresh_name(f"{head}'", used)
+                result[head] = [rhs + [tail] for rhs in others]
+                result[tail] = [rhs + [tail] for rhs in recursive] + [[]]
+            else:
+                result[head] = others
+        return result
+
+    def nullable_symbols(self):
+        nullable = set()
+        changed = True
+        while changed:
+            changed = False
+            for head, rhs_list in self.productions.items():
+                if head not in nullable and any(all(s in nullable for s in rhs) for rhs in rhs_list):
+                    nullable.add(head)
+                    changed = True
+        return nullable
+
+    def first_of(self, symbols, first, nullable):
+        """FIRST of a symbol sequence, and whether the whole sequence is nullable"""
+        result = set()
+        for symbol in symbols:
+            if symbol not in self.productions:
+                result.add(symbol)
+                return result, False
+            result |= first[symbol]
+            if symbol not in nullable:
+                return result, False
+        return result, True
+
+    def first_sets(self, nullable=None):
+        nullable = self.nullable_symbols() if nullable is None else nullable
+        first = {head: set() for head in self.productions}
+        changed = True
+        while changed:
+            changed = False
+            for head, rhs_list in self.productions.items():
+                for rhs in rhs_list:
+                    symbols, _ = self.first_of(rhs, first, nullable)
+                    if not symbols <= first[head]:
+                        first[head] |= symbols
+                        changed = True
+        return first
+
+    def follow_sets(self, first=None, nullable=None):
+        nullable = self.nullable_symbols() if nullable is None else nullable
+        first = self.first_sets(nullable) if first is None else first
+        follow = {head: set() for head in self.productions}
+        follow[self.start].add(END)
+        changed = True
+        while changed:
+            changed = False
+            for head, rhs_list in self.productions.items():
+                for rhs in rhs_list:
+                    for k, symbol in enumerate(rhs):
+                        if symbol not in self.productions:
+                            continue
+                        symbols, rest_nullable = self.first_of(rhs[k + 1:], first, nullable)
+                        if rest_nullable:
+                            symbols |= follow[head]
+                        if not symbols <= follow[symbol]:
+                            follow[symbol] |= symbols
+                            changed = True
+        return follow
+
+
+def _fresh_name(base, used):
+    """`base`, or `base` plus the smallest suffix not in `used`; the name is added to `used`"""
+    name = base
+    suffix = 1
+    while name in used:
+        name = f"{base}{suffix}"
+        suffix += 1
+    used.add(name)
+    return name
+
 
 # ======================
 # Optimized Lexer Class
@@ -125,108 +602,734 @@ class OptimizedLexer:
         
         original_dfa = DFA(states, alphabet, transitions, start_state, accepting_states)
         self.dfa = original_dfa.minimize()
+        self.compiled = CompiledDFA(self.dfa)
+        pattern = self.dfa.to_regex(self.compiled.charset)
+        self.scanner = re.compile(pattern) if pattern is not None else None
+
+    def to_tables(self):
+        """The minimized DFA and scanner regex, JSON-serializable for from_tables"""
+        return {'dfa': self.dfa.to_dict(), 'scanner': self.scanner.pattern if self.scanner else None}
+
+    @classmethod
+    def from_tables(cls, tables):
+        """Lexer from to_tables() output, skipping minimization and the scanner regex build"""
+        lexer = cls.__new__(cls)
+        lexer.dfa = DFA.from_dict(tables['dfa'])
+        lexer.compiled = CompiledDFA(lexer.dfa)
+        lexer.scanner = re.compile(tables['scanner']) if tables['scanner'] is not None else None
+        return lexer
         
     def tokenize(self, source):
+        tokens, _ = self._scan(source, final=True)
+        return tokens
+
+    def iter_tokens(self, source, chunk_size=STREAM_CHUNK_SIZE):
+        """Yield the same tokens as tokenize() lazily from a string, a text file or an iterable of chunks
+
+        Input is consumed `chunk_size` characters at a time. A token that reaches the end of
+        a chunk is held back until the next one shows where it ends, so memory stays
+        bounded by the chunk size plus the longest token.
+        """
+        pending = ''
+        for chunk in _iter_chunks(source, chunk_size):
+            if not chunk:
+                continue
+            buffer = pending + chunk
+            tokens, resume = self._scan(buffer, final=False)
+            yield from tokens
+            pending = buffer[resume:]
+        tokens, _ = self._scan(pending, final=True)
+        yield from tokens
+
+    def _scan(self, source, final):
+        """Tokens of `source` plus the position to resume from
+
+        Unless `final`, a token or skipped run that could continue past the end of `source`
+        is not emitted and the returned position points at its start.
+        """
+        if self.scanner is not None:
+            return self._scan_regex(source, final)
+        return self._scan_table(source, final)
+
+    def _scan_regex(self, source, final):
+        # The regex path only exists when no scan can reach past a failed character, so
+        # skipped characters are always final and only a match touching the end is held back
+        tokens = []
+        end = len(source)
+        for match in self.scanner.finditer(source):
+            if not final and match.end() == end:
+                return tokens, match.start()
+            tokens.append(_token(match.group()))
+        return tokens, end
+
+    def _scan_table(self, source, final):
+        # Maximal munch over the compiled table; see CompiledDFA
+        table = self.compiled.table
+        accepting = self.compiled.accepting
+        start = self.compiled.start
+        codes = self.compiled.classify(source)
+        n = len(codes)
         tokens = []
         pos = 0
-        while pos < len(source):
-            current_state = self.dfa.start
-            start_pos = pos
-            last_accept_pos = None
-            
-            while pos < len(source):
-                char = source[pos].lower()
-                if char not in self.dfa.alphabet:
+        while pos < n:
+            state = start
+            i = pos
+            last_accept_pos = -1
+
+            while i < n:
+                state = table[state + codes[i]]
+                if state < 0:
                     break
-                current_state = self.dfa.transitions[current_state].get(char, None)
-                if current_state is None:
+                if accepting[state]:
+                    last_accept_pos = i
+                i += 1
+
+            if i == n and not final:
+                return tokens, pos  # more input could extend this token
+            if last_accept_pos >= 0:
+                tokens.append(_token(source[pos:last_accept_pos+1]))
+                pos = last_accept_pos + 1
+            else:
+                pos = i + 1  # Skip invalid characters
+
+        return tokens, n
+
+    def count_steps(self, source):
+        """Transitions the table scanner takes to tokenize `source`, failed lookups included
+
+        A separate pass over the compiled table, so the scanners themselves carry no
+        counter; used by compiler_metrics when sampling a call.
+        """
+        table = self.compiled.table
+        accepting = self.compiled.accepting
+        start = self.compiled.start
+        codes = self.compiled.classify(source)
+        n = len(codes)
+        steps = 0
+        pos = 0
+        while pos < n:
+            state = start
+            i = pos
+            last_accept_pos = -1
+            while i < n:
+                steps += 1
+                state = table[state + codes[i]]
+                if state < 0:
                     break
-                if current_state in self.dfa.accepts:
-                    last_accept_pos = pos
+                if accepting[state]:
+                    last_accept_pos = i
+                i += 1
+            pos = last_accept_pos + 1 if last_accept_pos >= 0 else i + 1
+        return steps
+
+
+def _token(token_value):
+    if token_value in {'+', '*', '(', ')'}:
+        return (token_value, token_value)
+    elif token_value[0].isalpha():
+        return ('id', token_value)
+    else:
+        return ('num', token_value)
+
+
+def _iter_chunks(source, chunk_size):
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    else:
+        yield from source
+
+# ======================
+# Bitset CYK Class
+# ======================
+class BitsetCYK:
+    """CYK recognizer for a CNF grammar with nonterminals as bits of an integer
+
+    Binary rules are grouped by their (B, C) pair into one mask of heads. For every
+    nonterminal the chart keeps two positional bitsets per position: ends[A][i] has bit
+    j when A derives tokens[i:j], and starts[A][j] has bit i. Whether some split point k
+    joins B over [i, k) with C over [k, j) is then a single AND,
+    ends[B][i] & starts[C][j], instead of a loop over k.
+    """
+
+    def __init__(self, cnf_productions, start=None):
+        self.nonterminals = list(cnf_productions)
+        index = {head: i for i, head in enumerate(self.nonterminals)}
+        start = start if start is not None else self.nonterminals[0]
+        self.start = index[start]
+        self.accepts_empty = [] in cnf_productions[start]
+        self.terminal_masks = {}
+        pair_heads = {}
+        for head, rhs_list in cnf_productions.items():
+            bit = 1 << index[head]
+            for rhs in rhs_list:
+                if len(rhs) == 1:
+                    self.terminal_masks[rhs[0]] = self.terminal_masks.get(rhs[0], 0) | bit
+                elif len(rhs) == 2:
+                    pair = (index[rhs[0]], index[rhs[1]])
+                    pair_heads[pair] = pair_heads.get(pair, 0) | bit
+        self.pairs = [(b, c, heads) for (b, c), heads in pair_heads.items()]
+
+    def _bits(self, mask):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
+
+    def chart(self, token_types):
+        """(ends, starts) positional bitsets for every nonterminal; see the class docstring"""
+        n = len(token_types)
+        m = len(self.nonterminals)
+        ends = [[0] * (n + 1) for _ in range(m)]
+        starts = [[0] * (n + 1) for _ in range(m)]
+        return self.fill(token_types, ends, starts)
+
+    def fill(self, token_types, ends, starts):
+        """Fill zeroed (ends, starts) tables of n + 1 entries per nonterminal, and return them"""
+        n = len(token_types)
+        for i, token_type in enumerate(token_types):
+            for a in self._bits(self.terminal_masks.get(token_type, 0)):
+                ends[a][i] |= 1 << (i + 1)
+                starts[a][i + 1] |= 1 << i
+
+        pairs = [(ends[b], starts[c], heads) for b, c, heads in self.pairs]
+        for length in range(2, n + 1):
+            for i in range(n - length + 1):
+                j = i + length
+                cell = 0
+                for b_ends, c_starts, heads in pairs:
+                    if heads & ~cell and b_ends[i] & c_starts[j]:
+                        cell |= heads
+                for a in self._bits(cell):
+                    ends[a][i] |= 1 << j
+                    starts[a][j] |= 1 << i
+        return ends, starts
+
+    def recognize(self, token_types, stats=None):
+        """Whether the tokens parse; with a `stats` dict, also stores the non-empty cell count there"""
+        if not token_types:
+            if stats is not None:
+                stats['cyk_cells'] = 0
+            return self.accepts_empty
+        ends, _ = self.chart(token_types)
+        if stats is not None:
+            stats['cyk_cells'] = sum(bin(_or_all(column)).count('1') for column in zip(*ends))
+        return bool(ends[self.start][0] >> len(token_types) & 1)
+
+
+def _or_all(masks):
+    result = 0
+    for mask in masks:
+        result |= mask
+    return result
+
+
+class CYKSession:
+    """BitsetCYK chart for a token list that is edited in place
+
+    The ends/starts tables are kept between calls and their rows reused. edit() replaces
+    a range of tokens and recomputes only cells that can have changed. Cells left or
+    right of the edit are kept, shifted by the change in length. Cells with an endpoint
+    inside the new tokens are always computed. A cell spanning the edit keeps its old
+    value unless one of its sub-spans changed, or it had a split point inside the
+    replaced tokens.
+    """
+
+    def __init__(self, cyk, tokens=()):
+        self.cyk = cyk
+        m = len(cyk.nonterminals)
+        self.ends = [[0] for _ in range(m)]
+        self.starts = [[0] for _ in range(m)]
+        # The table rows are updated in place, so these references stay valid
+        self._pairs = [(self.ends[b], self.starts[c], heads) for b, c, heads in cyk.pairs]
+        self.tokens = []
+        self.token_types = []
+        self.accepted = cyk.accepts_empty
+        self.cells_computed = 0
+        if tokens:
+            self.parse(tokens)
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def parse(self, tokens):
+        """Parse `tokens` from scratch, reusing the table; returns whether they parse"""
+        self.tokens[:] = tokens
+        self.token_types[:] = [t[0] for t in self.tokens]
+        n = len(self.tokens)
+        zeros = [0] * (n + 1)
+        for row in self.ends:
+            row[:] = zeros
+        for row in self.starts:
+            row[:] = zeros
+        self.cyk.fill(self.token_types, self.ends, self.starts)
+        self.cells_computed = n * (n + 1) // 2
+        return self._result()
+
+    def _result(self):
+        n = len(self.token_types)
+        self.accepted = bool(self.ends[self.cyk.start][0] >> n & 1) if n else self.cyk.accepts_empty
+        return self.accepted
+
+    def _compute(self, i, j):
+        if j == i + 1:
+            return self.cyk.terminal_masks.get(self.token_types[i], 0)
+        cell = 0
+        for b_ends, c_starts, heads in self._pairs:
+            if heads & ~cell and b_ends[i] & c_starts[j]:
+                cell |= heads
+        return cell
+
+    def _read(self, i, j):
+        cell = 0
+        for a, row in enumerate(self.ends):
+            if row[i] >> j & 1:
+                cell |= 1 << a
+        return cell
+
+    def _toggle(self, i, j, diff):
+        for a in self.cyk._bits(diff):
+            self.ends[a][i] ^= 1 << j
+            self.starts[a][j] ^= 1 << i
+
+    def edit(self, start, stop, tokens):
+        """Replace self.tokens[start:stop] with `tokens` and reparse; returns whether they parse
+
+        self.cells_computed is set to the number of cells evaluated.
+        """
+        lo, hi = start, stop
+        n_old = len(self.tokens)
+        if not 0 <= lo <= hi <= n_old:
+            raise IndexError(f"Edit range {lo}:{hi} outside 0:{n_old}")
+        tokens = list(tokens)
+        k = len(tokens)
+        n = n_old + k - (hi - lo)
+        if not n_old or not n:
+            return self.parse(self.tokens[:lo] + tokens + self.tokens[hi:])
+        if hi == lo and not k:
+            self.cells_computed = 0
+            return self.accepted
+        self.tokens[lo:hi] = tokens
+        self.token_types[lo:hi] = [t[0] for t in tokens]
+        delta = k - (hi - lo)
+
+        # Rows below L and columns up to lo keep their index. Rows from lo + k on are
+        # old rows from hi on, and columns from P on are old columns from P - delta on.
+        # Row lo keeps its index only when a token is replaced; after an insertion the
+        # old row lo is the first row right of the new tokens.
+        L = lo + 1 if k and hi > lo else lo
+        P = lo + k if k else lo + 1
+        old_P = P - delta
+        keep_cols = (1 << (lo + 1)) - 1
+        dropped_cols = ((1 << old_P) - 1) & ~keep_cols
+        keep_rows = (1 << L) - 1
+        dropped_rows = ((1 << hi) - 1) & ~keep_rows
+
+        # forced: kept rows with a non-empty old cell ending inside the replaced tokens,
+        # plus, after a deletion, rows with a cell ending at lo, which now meets the
+        # tokens that followed the deleted ones. forced_cols: the same for cells
+        # starting inside the replaced tokens, by new column.
+        forced = forced_cols = 0
+        for row in self.ends:
+            for i in range(L):
+                v = row[i]
+                if v >> lo:
+                    if v & dropped_cols or (not k and v >> lo & 1):
+                        forced |= 1 << i
+                    row[i] = (v & keep_cols) | (v >> old_P << P)
+            tail = row[hi:]
+            if delta > 0:
+                tail = [v << delta for v in tail]
+            elif delta < 0:
+                tail = [v >> -delta for v in tail]
+            row[L:] = [0] * (lo + k - L) + tail
+        for column in self.starts:
+            tail = column[old_P:]
+            for jj, v in enumerate(tail):
+                if v >> L:
+                    if v & dropped_rows:
+                        forced_cols |= 1 << (P + jj)
+                    tail[jj] = (v & keep_rows) | (v >> hi << (lo + k))
+            column[lo + 1:] = [0] * (P - lo - 1) + tail
+
+        # The one kept cell that is a single token on one side of the edit and not the
+        # other, so its old value is not built from sub-spans: the replaced tokens' own
+        # span, or, after an insertion, the token before them together with them
+        if k and hi > lo:
+            special = lo
+        else:
+            special = lo - 1 if k else -1
+
+        compute = self._compute
+        computed = 0
+        # Rows with a changed cell in an earlier column
+        dirty_rows = 0
+        for j in range(lo + 1, n + 1):
+            changed = 0
+            if j < P:
+                # Column inside the new tokens: every cell is new
+                for i in range(j - 1, -1, -1):
+                    cell = compute(i, j)
+                    if cell:
+                        self._toggle(i, j, cell)
+                        changed |= 1 << i
+                computed += j
+            else:
+                for i in range(lo + k - 1, L - 1, -1):
+                    cell = compute(i, j)
+                    if cell:
+                        self._toggle(i, j, cell)
+                        changed |= 1 << i
+                computed += lo + k - L
+
+                candidates = dirty_rows | forced
+                if j == P and special >= 0:
+                    candidates |= 1 << special
+                every_row = forced_cols >> j & 1
+                i = L - 1
+                while i >= 0:
+                    if not (every_row or changed >> (i + 1)):
+                        below = candidates & ((1 << (i + 1)) - 1)
+                        if not below:
+                            break
+                        i = below.bit_length() - 1
+                    cell = compute(i, j)
+                    old = self._read(i, j)
+                    computed += 1
+                    if cell != old:
+                        self._toggle(i, j, cell ^ old)
+                        changed |= 1 << i
+                    i -= 1
+            dirty_rows |= changed
+            if j >= P and not (dirty_rows or forced or forced_cols >> (j + 1)) and L == lo + k:
+                break  # nothing left that can change
+        self.cells_computed = computed
+        return self._result()
+
+
+# ======================
+# Parse Tree Class
+# ======================
+class ParseNode:
+    """Parse tree node; leaves are terminals and carry the matched token's text"""
+    __slots__ = ('symbol', 'children', 'token')
+
+    def __init__(self, symbol, children=None, token=None):
+        self.symbol = symbol
+        self.children = children or []
+        self.token = token
+
+    def __repr__(self):
+        if self.token is not None:
+            return f"ParseNode({self.symbol!r}, token={self.token!r})"
+        return f"ParseNode({self.symbol!r}, {self.children!r})"
+
+    def leaves(self):
+        """Tokens under this node, left to right"""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node.token is not None:
+                yield node.token
+            stack.extend(reversed(node.children))
+
+
+# ======================
+# LL(1) Parser Class
+# ======================
+class LL1Parser:
+    """Table-driven predictive parser; one table lookup per token, so parsing is O(n)
+
+    The table maps (nonterminal, lookahead) to the production to expand. Pairs that
+    would need two productions are kept in `conflicts`; a grammar with any is not LL(1)
+    and `parse` refuses it.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.nullable = cfg.nullable_symbols()
+        self.first = cfg.first_sets(self.nullable)
+        self.follow = cfg.follow_sets(self.first, self.nullable)
+        self.table = {}
+        self.conflicts = []
+        for head, rhs_list in cfg.productions.items():
+            for rhs in rhs_list:
+                lookaheads, rhs_nullable = cfg.first_of(rhs, self.first, self.nullable)
+                if rhs_nullable:
+                    lookaheads |= self.follow[head]
+                for lookahead in lookaheads:
+                    if (head, lookahead) in self.table:
+                        self.conflicts.append((head, lookahead))
+                    else:
+                        self.table[head, lookahead] = rhs
+
+    @property
+    def is_ll1(self):
+        return not self.conflicts
+
+    def parse(self, tokens):
+        """ParseNode tree for the token list, or None if it is not in the language"""
+        if self.conflicts:
+            raise ValueError(f"Grammar is not LL(1): conflicts at {self.conflicts}")
+        productions = self.cfg.productions
+        root = ParseNode(self.cfg.start)
+        stack = [root]
+        pos = 0
+        while stack:
+            node = stack.pop()
+            lookahead = tokens[pos][0] if pos < len(tokens) else END
+            if node.symbol in productions:
+                rhs = self.table.get((node.symbol, lookahead))
+                if rhs is None:
+                    return None
+                node.children = [ParseNode(symbol) for symbol in rhs]
+                stack.extend(reversed(node.children))
+            elif node.symbol == lookahead:
+                node.token = tokens[pos][1]
                 pos += 1
-                
-            if last_accept_pos is not None:
-                token_value = source[start_pos:last_accept_pos+1]
-                if token_value in {'+', '*', '(', ')'}:
-                    tokens.append((token_value, token_value))
-                elif token_value[0].isalpha():
-                    tokens.append(('id', token_value))
-                else:
-                    tokens.append(('num', token_value))
-                pos = last_accept_pos + 1
             else:
-                pos += 1  # Skip invalid characters
-                
-        return tokens
+                return None
+        return root if pos == len(tokens) else None
+
+
+# ======================
+# Earley Parser Class
+# ======================
+class EarleyParser:
+    """General context-free parser for grammars that are not LL(1)
+
+    Items are (production, dot, origin). Each item remembers how it was first added,
+    which is enough to rebuild one parse tree after recognition. Empty productions are
+    handled by advancing over a nonterminal already completed at the same position.
+    """
+
+    def __init__(self, cfg):
+        self.cfg = cfg
+        self.rules = [(head, tuple(rhs)) for head, rhs_list in cfg.productions.items() for rhs in rhs_list]
+        self.rules_of = {head: [] for head in cfg.productions}
+        for r, (head, _) in enumerate(self.rules):
+            self.rules_of[head].append(r)
+
+    def chart(self, token_types):
+        """(chart, completed): per position, item -> (previous position, child) back pointers,
+        and (nonterminal, start, end) -> the item that first completed it
+        """
+        productions = self.cfg.productions
+        n = len(token_types)
+        chart = [{} for _ in range(n + 1)]
+        waiting = [{} for _ in range(n + 1)]
+        completed = {}
+        for r in self.rules_of[self.cfg.start]:
+            chart[0][r, 0, 0] = None
+
+        for i in range(n + 1):
+            items = chart[i]
+            agenda = list(items)
+
+            def add(item, back):
+                if item not in items:
+                    items[item] = back
+                    agenda.append(item)
+
+            k = 0
+            while k < len(agenda):
+                r, dot, origin = item = agenda[k]
+                k += 1
+                head, rhs = self.rules[r]
+                if dot == len(rhs):
+                    key = (head, origin, i)
+                    if key in completed:
+                        continue
+                    completed[key] = item
+                    for r2, dot2, origin2 in list(waiting[origin].get(head, ())):
+                        add((r2, dot2 + 1, origin2), (origin, key))
+                    continue
+                symbol = rhs[dot]
+                if symbol in productions:
+                    waiting[i].setdefault(symbol, []).append(item)
+                    for r2 in self.rules_of[symbol]:
+                        add((r2, 0, i), None)
+                    if (symbol, i, i) in completed:
+                        add((r, dot + 1, origin), (i, (symbol, i, i)))
+                elif i < n and token_types[i] == symbol:
+                    chart[i + 1].setdefault((r, dot + 1, origin), (i, i))
+        return chart, completed
+
+    def parse(self, tokens, stats=None):
+        """ParseNode tree for the token list, or None if it is not in the language
+
+        With a `stats` dict, the number of chart items is stored there.
+        """
+        chart, completed = self.chart([t[0] for t in tokens])
+        if stats is not None:
+            stats['earley_items'] = sum(len(items) for items in chart)
+        root_key = (self.cfg.start, 0, len(tokens))
+        if root_key not in completed:
+            return None
+        root = ParseNode(self.cfg.start)
+        stack = [(root, root_key)]
+        while stack:
+            node, (head, start, end) = stack.pop()
+            r, dot, origin = completed[head, start, end]
+            pos = end
+            children = []
+            while dot:
+                pos, child = chart[pos][r, dot, origin]
+                dot -= 1
+                if isinstance(child, int):
+                    children.append(ParseNode(tokens[child][0], token=tokens[child][1]))
+                else:
+                    child_node = ParseNode(child[0])
+                    children.append(child_node)
+                    stack.append((child_node, child))
+            children.reverse()
+            node.children = children
+        return root
+
 
 # ======================
 # Optimized Parser Class
 # ======================
 class OptimizedParser:
-    def __init__(self):
-        original_productions = {
-            'E': [['E', '+', 'T'], ['T']],
-            'T': [['T', '*', 'F'], ['F']],
-            'F': [['(', 'E', ')'], ['id'], ['num']]
+    """Expression parser with three modes
+
+    'cyk' answers only whether the tokens parse, using BitsetCYK on the CNF grammar.
+    'll1' returns a ParseNode tree in linear time from the grammar with left recursion
+    removed (so E' and T' nodes appear); grammars that are still not LL(1) go to Earley.
+    'earley' returns a tree for the original grammar. Both tree modes return None on a
+    syntax error.
+    """
+
+    def __init__(self, productions=None, mode='cyk'):
+        if mode not in PARSER_MODES:
+            raise ValueError(f"Unknown parser mode: {mode!r}")
+        self.cfg = CFG(productions or EXPRESSION_PRODUCTIONS)
+        self.mode = mode
+        self.cnf_productions = self.cfg.to_cnf()
+        self.cyk = BitsetCYK(self.cnf_productions)
+        self._ll1 = None
+        self._earley = None
+
+    def to_tables(self):
+        """The grammar, its CNF and its left-recursion-free form, JSON-serializable for from_tables"""
+        return {
+            'productions': self.cfg.productions,
+            'start': self.cfg.start,
+            'mode': self.mode,
+            'cnf': self.cnf_productions,
+            'll1': self.ll1.cfg.productions,
         }
-        
-        cfg_converter = CFG(original_productions)
-        self.cnf_productions = cfg_converter.to_cnf()
-        
-    def parse(self, tokens):
-        token_types = [t[0] for t in tokens]
-        n_tokens = len(token_types)
-        
-        # CYK Table Initialization
-        table = [[set() for _ in range(n_tokens+1)] for _ in range(n_tokens+1)]
-        
-        # Fill table with single-token matches
-        for i in range(n_tokens):
-            for non_terminal, productions in self.cnf_productions.items():
-                for production in productions:
-                    if len(production) == 1 and production[0] == token_types[i]:
-                        table[i][i+1].add(non_terminal)
-                        
-        # Fill table with multi-token matches using CYK algorithm
-        for length in range(2, n_tokens+1):
-            for i in range(n_tokens - length + 1):
-                j = i + length
-                for k in range(i+1, j):
-                    for B in table[i][k]:
-                        for C in table[k][j]:
-                            for non_terminal, productions in self.cnf_productions.items():
-                                for production in productions:
-                                    if len(production) == 2 and production[0] == B and production[1] == C:
-                                        table[i][j].add(non_terminal)
-                                        
-        return 'E' in table[0][n_tokens]
+
+    @classmethod
+    def from_tables(cls, tables, mode=None):
+        """Parser from to_tables() output, skipping the grammar transformations"""
+        parser = cls.__new__(cls)
+        parser.cfg = CFG(tables['productions'], tables['start'])
+        parser.mode = mode or tables['mode']
+        parser.cnf_productions = tables['cnf']
+        parser.cyk = BitsetCYK(parser.cnf_productions)
+        parser._ll1 = LL1Parser(CFG(tables['ll1'], tables['start']))
+        parser._earley = None
+        return parser
+
+    @property
+    def ll1(self):
+        if self._ll1 is None:
+            self._ll1 = LL1Parser(CFG(self.cfg.eliminate_left_recursion(), self.cfg.start))
+        return self._ll1
+
+    @property
+    def earley(self):
+        if self._earley is None:
+            self._earley = EarleyParser(self.cfg)
+        return self._earley
+
+    def resolve_mode(self, mode=None):
+        """The engine a mode actually runs on: 'll1' becomes 'earley' if the grammar is not LL(1)"""
+        mode = mode or self.mode
+        if mode not in PARSER_MODES:
+            raise ValueError(f"Unknown parser mode: {mode!r}")
+        if mode == 'll1' and not self.ll1.is_ll1:
+            return 'earley'
+        return mode
+
+    def session(self, tokens=()):
+        """A CYKSession for reparsing `tokens` incrementally as they are edited"""
+        return CYKSession(self.cyk, tokens)
+
+    def parse(self, tokens, mode=None, stats=None):
+        """Parse result for `mode`; a `stats` dict receives the engine's work counts, if any"""
+        mode = self.resolve_mode(mode)
+        if mode == 'cyk':
+            return self.cyk.recognize([t[0] for t in tokens], stats)
+        if mode == 'll1':
+            return self.ll1.parse(tokens)
+        return self.earley.parse(tokens, stats)
 
 # ======================
 # Compiler Class (Completed)
 # ======================
 class Compiler:
-    def __init__(self):
+    def __init__(self, mode='cyk', metrics=None):
         self.lexer = OptimizedLexer()
-        self.parser = OptimizedParser()
+        self.parser = OptimizedParser(mode=mode)
+        self.metrics = metrics
+
+    def to_tables(self):
+        return {'lexer': self.lexer.to_tables(), 'parser': self.parser.to_tables()}
+
+    @classmethod
+    def from_tables(cls, tables, mode=None, metrics=None):
+        """Compiler from to_tables() output; nothing is minimized or converted again"""
+        compiler = cls.__new__(cls)
+        compiler.lexer = OptimizedLexer.from_tables(tables['lexer'])
+        compiler.parser = OptimizedParser.from_tables(tables['parser'], mode)
+        compiler.metrics = metrics
+        return compiler
         
-    def compile(self, source_code):
+    def compile(self, source_code, mode=None):
+        """(tokens, parse result, metrics); `mode` overrides the parser mode for this call
+
+        With a compiler_metrics.CompilerMetrics in self.metrics, every call is also
+        recorded there; with none, the only cost is the check for it.
+        """
+        mode = self.parser.resolve_mode(mode)
+        recorder = self.metrics
+        if recorder is not None and recorder.capture:
+            with recorder.capturing():
+                return self._compile(source_code, mode, recorder)
+        return self._compile(source_code, mode, recorder)
+
+    def _compile(self, source_code, mode, recorder):
+        stats = {} if recorder is not None else None
+
         # Lexing phase
-        start_time_lexing = time.time()
+        start_lexing = time.perf_counter_ns()
         tokens = self.lexer.tokenize(source_code)
-        lex_time = time.time() - start_time_lexing
+        lex_ns = time.perf_counter_ns() - start_lexing
 
         # Parsing phase
-        start_time_parsing = time.time()
-        parse_result = self.parser.parse(tokens)
-        parse_time = time.time() - start_time_parsing
+        start_parsing = time.perf_counter_ns()
+        parse_result = self.parser.parse(tokens, mode, stats)
+        parse_ns = time.perf_counter_ns() - start_parsing
 
         # Collect metrics
         metrics = {
             'lex_states': len(self.lexer.dfa.states),
             'parse_prods': sum(len(prods) for prods in self.parser.cnf_productions.values()),
-            'lex_time': lex_time,
-            'parse_time': parse_time
+            'parse_mode': mode,
+            'lex_time': lex_ns / 1e9,
+            'parse_time': parse_ns / 1e9,
+            'lex_ns': lex_ns,
+            'parse_ns': parse_ns,
         }
+        if recorder is not None:
+            recorder.observe(self, source_code, tokens, parse_result, metrics, stats)
 
         return tokens, parse_result, metrics
 
@@ -245,5 +1348,6 @@ if __name__ == "__main__":
     print("Optimization Results:")
     print(f"Lexer states: {metrics['lex_states']}")
     print(f"Productions: {metrics['parse_prods']}")
+    print(f"Parser mode: {metrics['parse_mode']}")
     print(f"Lex time: {metrics['lex_time']:.6f}s")
     print(f"Parse time: {metrics['parse_time']:.6f}s")
\ No newline at end of file
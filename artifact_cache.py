@@ -0,0 +1,164 @@
+# artifact_cache.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 512 * 2**20
+DEFAULT_RESCAN_FRACTION = 0.05
+
+
+def artifact_key(grammar, seed, max_depth, fmt):
+    """Content address of a rendered artifact: SHA-256 over the grammar, seed, max_depth and format"""
+    payload = json.dumps({'grammar': grammar, 'seed': seed, 'max_depth': max_depth, 'format': fmt},
+                         sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ArtifactCache:
+    """Size-bounded on-disk cache of rendered MIDI/MusicXML/PNG bytes with LRU eviction
+
+    Entries are files named by their key. Recency is the file mtime, refreshed on every
+    hit, so several processes can share one directory; each keeps its own hit, miss and
+    eviction counters for scraping through metrics_text().
+
+    put() keeps the index up to date by itself and rescans the directory, to see other
+    processes' files, once it has written `rescan_fraction` * max_bytes since the last
+    scan. A full rescan is O(entries), so this keeps puts O(1) amortized, and each other
+    process can take the directory past max_bytes by at most that much. Call trim() once
+    the writers are done (music_batch does) to bring it back under.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES, rescan_fraction=DEFAULT_RESCAN_FRACTION):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.rescan_fraction = rescan_fraction
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._rescan()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key)
+
+    def _rescan(self):
+        """Rebuild the LRU index from the directory, oldest entry first"""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:  # evicted by another process mid-scan
+                        continue
+                    entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((name, size) for _, name, size in entries)
+        self._size = sum(self._index.values())
+        self._unscanned = 0  # bytes this process has written since the scan
+
+    def get(self, key):
+        """Stored bytes for `key`, or None on a miss"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                if key in self._index:
+                    self._size -= self._index.pop(key)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # evicted by another process since the read; the data is still good
+            pass
+        with self._lock:
+            self.hits += 1
+            self._index[key] = len(data)
+            self._index.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        """Store `data` under `key`, evicting least recently used entries to stay under max_bytes"""
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._unscanned += len(data)
+            if self._unscanned >= self.max_bytes * self.rescan_fraction:
+                # Other processes write to the same directory, so our own index undercounts it
+                self._rescan()
+            self._evict()
+
+    def trim(self):
+        """Rescan the directory and evict until all processes' entries fit in max_bytes"""
+        with self._lock:
+            self._rescan()
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+            self._size -= size
+            self.evictions += 1
+
+    def get_or_render(self, key, render):
+        """Cached bytes for `key`, calling render() and storing its bytes on a miss"""
+        data = self.get(key)
+        if data is None:
+            data = render()
+            self.put(key, data)
+        return data
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._index), 'bytes': self._size, 'max_bytes': self.max_bytes}
+
+    def metrics_text(self, prefix='music_artifact_cache'):
+        """Counters and gauges in the Prometheus text exposition format"""
+        return format_cache_metrics(self.stats(), prefix)
+
+    def write_metrics(self, path, prefix='music_artifact_cache'):
+        """Atomically write metrics_text() to `path`, e.g. for a node_exporter textfile collector"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.metrics_text(prefix))
+        os.replace(tmp_path, path)
+
+
+_METRICS = (
+    ('hits', 'counter', 'Artifact requests served from the cache'),
+    ('misses', 'counter', 'Artifact requests that had to be rendered'),
+    ('evictions', 'counter', 'Entries removed to stay under the size limit'),
+    ('entries', 'gauge', 'Entries currently in the cache'),
+    ('bytes', 'gauge', 'Bytes currently stored in the cache'),
+    ('max_bytes', 'gauge', 'Configured cache size limit in bytes'),
+)
+
+
+def format_cache_metrics(stats, prefix='music_artifact_cache'):
+    """Render a stats() dict (or a sum of several) in the Prometheus text exposition format"""
+    lines = []
+    for field, kind, help_text in _METRICS:
+        if field not in stats:
+            continue
+        name = f"{prefix}_{field}_total" if kind == 'counter' else f"{prefix}_{field}"
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name} {stats[field]}")
+    return '\n'.join(lines) + '\n'
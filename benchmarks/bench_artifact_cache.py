@@ -0,0 +1,88 @@
+# benchmarks/bench_artifact_cache.py
+"""Put cost as the cache grows, and several processes filling one ArtifactCache directory
+
+The first table times puts into one cache of growing size, which fills up halfway and
+then evicts on every put; the cost per put should stay flat. Then each of several
+workers puts random-sized entries under the same small limit, as music_batch workers
+do. Before trim() the bytes on disk may exceed max_bytes only by what the other workers
+wrote since their last rescan; after it they must be within max_bytes. The exit status
+is 1 if either bound is broken.
+
+Run from the repository root:  python benchmarks/bench_artifact_cache.py
+"""
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifact_cache import ArtifactCache
+
+ENTRY_COUNTS = [1_000, 10_000, 50_000]
+WORKERS = 4
+PUTS = 200
+MAX_BYTES = 64 * 1024
+RESCAN_FRACTION = 0.05
+ENTRY_BYTES = (256, 4096)
+
+
+def fill(directory, worker):
+    rng = random.Random(worker)
+    cache = ArtifactCache(directory, MAX_BYTES, rescan_fraction=RESCAN_FRACTION)
+    for i in range(PUTS):
+        cache.put(f"{worker:02d}-{i:05d}", os.urandom(rng.randint(*ENTRY_BYTES)))
+    return cache.evictions
+
+
+def disk_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def time_puts(n_entries):
+    """Seconds per put while filling an empty cache with `n_entries` small entries"""
+    directory = tempfile.mkdtemp(prefix='artifact_cache_')
+    try:
+        data = b'x' * 256
+        cache = ArtifactCache(directory, max_bytes=n_entries * len(data) // 2)  # full halfway through
+        start = time.perf_counter()
+        for i in range(n_entries):
+            cache.put(f"{i:08d}", data)
+        return (time.perf_counter() - start) / n_entries
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    for n_entries in ENTRY_COUNTS:
+        print(f"{n_entries:>7} entries: {time_puts(n_entries) * 1e6:8.1f} us/put")
+
+    directory = tempfile.mkdtemp(prefix='artifact_cache_')
+    try:
+        start = time.perf_counter()
+        with multiprocessing.Pool(WORKERS) as pool:
+            evictions = pool.starmap(fill, [(directory, worker) for worker in range(WORKERS)])
+        elapsed = time.perf_counter() - start
+        before_trim = disk_bytes(directory)
+        ArtifactCache(directory, MAX_BYTES).trim()
+        after_trim = disk_bytes(directory)
+    finally:
+        shutil.rmtree(directory)
+
+    puts = WORKERS * PUTS
+    # Each other worker may have written up to one rescan interval, plus one entry, unseen
+    allowed = int(MAX_BYTES + (WORKERS - 1) * (MAX_BYTES * RESCAN_FRACTION + ENTRY_BYTES[1]))
+    print(f"{WORKERS} processes, {puts} puts in {elapsed:.3f}s ({puts / elapsed:,.0f} puts/s), "
+          f"{sum(evictions)} evictions")
+    print(f"{before_trim} bytes on disk before trim (bound {allowed}), {after_trim} after, limit {MAX_BYTES}")
+    if before_trim > allowed or after_trim > MAX_BYTES:
+        print("FAIL: the shared directory exceeds its size bound")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
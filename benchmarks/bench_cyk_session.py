@@ -0,0 +1,70 @@
+# benchmarks/bench_cyk_session.py
+"""CYKSession.edit against a full reparse, for small edits to long expressions
+
+Each edit is applied to a fresh session on the same expression. The resulting chart
+is checked against BitsetCYK.chart on the edited tokens. Edits that unbalance the
+parentheses change every span around them, so they gain least.
+
+Run from the repository root:  python benchmarks/bench_cyk_session.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Optimizer import OptimizedLexer, OptimizedParser
+
+from bench_parser import make_expression
+
+LENGTHS = [500, 1_000, 2_000]
+
+
+def edits(tokens, unbalanced=True):
+    """(name, start, stop, new tokens) edits around the middle and at both ends
+
+    With `unbalanced`, the list ends with an edit that leaves a parenthesis unmatched.
+    """
+    mid = len(tokens) // 2
+    operand = next(i for i in range(mid, len(tokens)) if tokens[i][0] in ('id', 'num'))
+    operator = next(i for i in range(mid, len(tokens)) if tokens[i][0] in ('+', '*'))
+    swapped = '*' if tokens[operator][0] == '+' else '+'
+    result = [
+        ('rename operand', operand, operand + 1, [('id', 'y')]),
+        ('swap + and *', operator, operator + 1, [(swapped, swapped)]),
+        ('insert "+ x"', operand + 1, operand + 1, [('+', '+'), ('id', 'x')]),
+        ('append "+ x"', len(tokens), len(tokens), [('+', '+'), ('id', 'x')]),
+        ('replace first', 0, 1, [('num', '1')]),
+    ]
+    if unbalanced:
+        result.append(('insert "("', operand, operand, [('(', '(')]))
+    return result
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    lexer = OptimizedLexer()
+    parser = OptimizedParser()
+    for n_tokens in LENGTHS:
+        tokens = lexer.tokenize(make_expression(random.Random(n_tokens), n_tokens))
+        _, full_time = timed(parser.parse, tokens)
+        print(f"\n{len(tokens)} tokens, full parse {full_time:.3f}s")
+        print(f"  {'edit':<16} {'edit s':>8} {'speedup':>8} {'cells':>8}  accepted  match")
+        session = parser.session()
+        for name, start, stop, new in edits(tokens):
+            session.parse(tokens)
+            accepted, edit_time = timed(session.edit, start, stop, new)
+            edited = tokens[:start] + new + tokens[stop:]
+            match = (session.ends, session.starts) == parser.cyk.chart([t[0] for t in edited])
+            print(f"  {name:<16} {edit_time:>8.4f} {full_time / edit_time:>7.0f}x {session.cells_computed:>8}"
+                  f"  {str(accepted):<8}  {match}")
+
+
+if __name__ == "__main__":
+    main()
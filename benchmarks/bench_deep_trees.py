@@ -0,0 +1,62 @@
+# benchmarks/bench_deep_trees.py
+"""Time and peak memory of the explicit-stack expansion and traversals as depth grows
+
+Covers generate_parse_tree, the compiled expander, and three walks over the same deep
+tree: the MIDI event flattener, parse_tree_to_music (the music21 Score) and the graphviz
+export. Uses MUSIC_CFG with Phrase reduced to its self-recursive 'Note Phrase' rule, so a piece
+is one chain whose length is set by max_depth, far past Python's recursion limit.
+
+Run from the repository root:  python benchmarks/bench_deep_trees.py
+"""
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grammar_compiler import build_parse_tree, compile_grammar, expand_preorder
+from midi_writer import parse_tree_to_events
+from music_env import MUSIC_CFG, generate_parse_tree, parse_tree_to_dot, parse_tree_to_music
+
+DEPTHS = [100, 1_000, 10_000, 50_000]
+
+CHAIN_CFG = dict(MUSIC_CFG, Song=[['Phrase']], Phrase=[['Note', 'Phrase']])
+
+
+def measure(fn):
+    """Returns (result, seconds, peak MiB); timed on its own run, as tracemalloc slows allocation"""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 2**20
+
+
+def main():
+    compiled = compile_grammar(CHAIN_CFG)
+    print(f"recursion limit: {sys.getrecursionlimit()}")
+    print(f"{'depth':>6} {'nodes':>7} {'events':>7} | {'expand s':>8} {'MiB':>6} | {'compiled s':>10} {'MiB':>6} "
+          f"| {'events s':>8} {'MiB':>6} | {'music21 s':>9} {'MiB':>6} | {'dot s':>6} {'MiB':>6}")
+    for depth in DEPTHS:
+        tree, t_expand, m_expand = measure(
+            lambda: generate_parse_tree(CHAIN_CFG, max_depth=depth, rng=random.Random(depth)))
+        _, t_compiled, m_compiled = measure(
+            lambda: build_parse_tree(compiled.symbols,
+                                     *expand_preorder(compiled, max_depth=depth, rng=random.Random(depth))))
+        events, t_events, m_events = measure(lambda: parse_tree_to_events(tree, rng=random.Random(0)))
+        _, t_music, m_music = measure(lambda: parse_tree_to_music(tree, rng=random.Random(0)))
+        dot, t_dot, m_dot = measure(lambda: parse_tree_to_dot(tree))
+        nodes = dot.source.count('label=')
+        print(f"{depth:>6} {nodes:>7} {len(events):>7} | {t_expand:>8.3f} {m_expand:>6.1f} | {t_compiled:>10.3f} "
+              f"{m_compiled:>6.1f} | {t_events:>8.3f} {m_events:>6.1f} | {t_music:>9.3f} {m_music:>6.1f} "
+              f"| {t_dot:>6.3f} {m_dot:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_grammar.py
+"""Expansion throughput of generate_parse_tree against the compiled grammar expander
+
+The speedup column compares bare expansion into preorder arrays. The last column adds
+building ParseTreeNode objects, which takes back most of that gain, so the drop-in
+generate_parse_tree_compiled is only about 1.2x faster. music_batch keeps the arrays
+as a CompactParseTree instead.
+
+Run from the repository root:  python benchmarks/bench_grammar.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grammar_compiler import build_parse_tree, compile_grammar, expand_preorder
+from music_env import MUSIC_CFG, generate_parse_tree
+
+DEPTHS = [5, 10, 20, 50]
+SONGS = 2000
+
+
+def tree_signature(node):
+    """Preorder symbol list, used to check both expanders build the same trees"""
+    out = []
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        out.append((n.symbol, len(n.children)))
+        stack.extend(reversed(n.children))
+    return out
+
+
+def timed(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    compiled = compile_grammar(MUSIC_CFG)
+
+    for depth in DEPTHS:
+        for seed in range(100):
+            expected = tree_signature(generate_parse_tree(MUSIC_CFG, max_depth=depth, rng=random.Random(seed)))
+            sym_ids, counts = expand_preorder(compiled, max_depth=depth, rng=random.Random(seed))
+            actual = tree_signature(build_parse_tree(compiled.symbols, sym_ids, counts))
+            assert expected == actual, f"trees differ at depth={depth} seed={seed}"
+    print("compiled expander reproduces generate_parse_tree for identical RNG streams")
+
+    print(f"{'depth':>5} {'nodes':>8} {'dict (s)':>9} {'compiled (s)':>13} {'speedup':>8} {'+ build nodes (s)':>18}")
+    for depth in DEPTHS:
+        rng = random.Random(depth)
+        nodes = sum(len(expand_preorder(compiled, max_depth=depth, rng=rng)[0]) for _ in range(SONGS))
+
+        def dict_path():
+            rng = random.Random(depth)
+            for _ in range(SONGS):
+                generate_parse_tree(MUSIC_CFG, max_depth=depth, rng=rng)
+
+        def compiled_path():
+            rng = random.Random(depth)
+            for _ in range(SONGS):
+                expand_preorder(compiled, max_depth=depth, rng=rng)
+
+        def compiled_with_nodes():
+            rng = random.Random(depth)
+            for _ in range(SONGS):
+                build_parse_tree(compiled.symbols, *expand_preorder(compiled, max_depth=depth, rng=rng))
+
+        slow, fast, full = timed(dict_path), timed(compiled_path), timed(compiled_with_nodes)
+        print(f"{depth:>5} {nodes:>8} {slow:>9.3f} {fast:>13.3f} {slow / fast:>7.1f}x {full:>18.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_harmony.py
+"""One song in all 12 keys: twelve separate renders against one tree walk plus a broadcast transposition
+
+The baseline renders the song once per key with parse_tree_to_events and shifts the
+pitch column, which is what a caller had to do before harmony.py. Every key's MIDI
+bytes are checked against that baseline. Both sides still encode twelve files; the
+last column is the one-pass time without MIDI encoding.
+
+Run from the repository root:  python benchmarks/bench_harmony.py
+"""
+import contextlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from harmony import events_in_all_keys, key_offsets
+from midi_writer import PITCH, events_to_midi_bytes, parse_tree_to_events
+from music_env import MUSIC_CFG, generate_parse_tree
+
+DEPTHS = [5, 10, 15]
+SONGS = 50
+
+
+def render_each_key(tree, rng, state):
+    files = []
+    for offset in key_offsets().tolist():
+        rng.setstate(state)
+        events = parse_tree_to_events(tree, rng)
+        events[:, PITCH] += offset
+        files.append(events_to_midi_bytes(events))
+    return files
+
+
+def all_events(tree, rng, state):
+    rng.setstate(state)
+    return events_in_all_keys(tree, rng)
+
+
+def render_all_keys(tree, rng, state):
+    return [events_to_midi_bytes(events) for events in all_events(tree, rng, state)]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence stdout: parse_tree_to_events warns about depth-limited Harmony nodes"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def main():
+    print(f"{'depth':>5} {'notes/song':>10} {'12 renders s':>13} {'one pass s':>11} {'speedup':>8} {'events only s':>14}")
+    for depth in DEPTHS:
+        rng = random.Random(depth)
+        songs = []
+        times = {}
+        outputs = {}
+        with quiet():
+            for _ in range(SONGS):
+                tree = generate_parse_tree(MUSIC_CFG, max_depth=depth, rng=rng)
+                songs.append((tree, rng.getstate()))
+            for name, render in (('each', render_each_key), ('all', render_all_keys)):
+                start = time.perf_counter()
+                outputs[name] = [render(tree, rng, state) for tree, state in songs]
+                times[name] = time.perf_counter() - start
+            notes = sum(len(all_events(tree, rng, state)[0]) for tree, state in songs) / SONGS
+            start = time.perf_counter()
+            for tree, state in songs:
+                all_events(tree, rng, state)
+            events_time = time.perf_counter() - start
+        assert outputs['each'] == outputs['all'], "transposed MIDI differs from per-key renders"
+        print(f"{depth:>5} {notes:>10.0f} {times['each']:>13.3f} {times['all']:>11.3f} "
+              f"{times['each'] / times['all']:>7.1f}x {events_time:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
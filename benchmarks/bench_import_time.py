@@ -0,0 +1,50 @@
+# benchmarks/bench_import_time.py
+"""Import time of music_env now that graphviz, tkinter and PIL.ImageGrab load lazily
+
+Each measurement runs in a fresh interpreter. The eager row imports the GUI and
+graphviz modules alongside music_env, which is what importing it used to cost.
+
+Run from the repository root:  python benchmarks/bench_import_time.py
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 7
+
+LAZY_MODULES = ('graphviz', 'tkinter', 'PIL.ImageGrab')
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+{imports}
+elapsed = time.perf_counter() - start
+print(elapsed, ','.join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def import_time(imports):
+    code = PROBE.format(imports=imports, lazy=LAZY_MODULES)
+    times = []
+    loaded = ''
+    for _ in range(RUNS):
+        out = subprocess.run([sys.executable, '-c', code], cwd=REPO_ROOT, check=True,
+                             capture_output=True, text=True).stdout.split()
+        times.append(float(out[0]))
+        loaded = out[1] if len(out) > 1 else ''
+    return statistics.median(times), loaded
+
+
+def main():
+    lazy, lazy_loaded = import_time('import music_env')
+    eager, _ = import_time('import music_env, graphviz, tkinter, PIL.ImageGrab')
+    print(f"median of {RUNS} fresh interpreters")
+    print(f"import music_env (lazy GUI/graphviz): {lazy * 1000:7.1f} ms  loaded: {lazy_loaded or 'none'}")
+    print(f"with eager GUI/graphviz imports:      {eager * 1000:7.1f} ms")
+    print(f"saved per import:                     {(eager - lazy) * 1000:7.1f} ms ({(eager - lazy) / eager:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/bench_lexer.py
+"""Tokens/sec of OptimizedLexer's table-driven and regex scanners against the original tokenizer
+
+reference_tokenize is the tokenizer as it was before CompiledDFA, kept here verbatim
+(as a function of the minimized DFA) to compare against. Sources mix identifiers,
+numbers, operators, whitespace, upper case and characters outside the alphabet.
+A file is also streamed through iter_tokens to show peak RSS stays flat.
+
+Run from the repository root:  python benchmarks/bench_lexer.py
+"""
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Optimizer import OptimizedLexer
+
+SOURCE_SIZES = [1_000_000, 4_000_000, 16_000_000]
+STREAM_MB = 256
+
+
+def reference_tokenize(dfa, source):
+    tokens = []
+    pos = 0
+    while pos < len(source):
+        current_state = dfa.start
+        start_pos = pos
+        last_accept_pos = None
+
+        while pos < len(source):
+            char = source[pos].lower()
+            if char not in dfa.alphabet:
+                break
+            current_state = dfa.transitions[current_state].get(char, None)
+            if current_state is None:
+                break
+            if current_state in dfa.accepts:
+                last_accept_pos = pos
+            pos += 1
+
+        if last_accept_pos is not None:
+            token_value = source[start_pos:last_accept_pos+1]
+            if token_value in {'+', '*', '(', ')'}:
+                tokens.append((token_value, token_value))
+            elif token_value[0].isalpha():
+                tokens.append(('id', token_value))
+            else:
+                tokens.append(('num', token_value))
+            pos = last_accept_pos + 1
+        else:
+            pos += 1  # Skip invalid characters
+
+    return tokens
+
+
+def make_source(size, seed=0):
+    rng = random.Random(seed)
+    pieces = []
+    length = 0
+    while length < size:
+        kind = rng.random()
+        if kind < 0.35:
+            piece = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyzXYZ') for _ in range(rng.randint(1, 8)))
+        elif kind < 0.6:
+            piece = str(rng.randint(0, 10**rng.randint(1, 6)))
+        elif kind < 0.9:
+            piece = rng.choice('+*()')
+        else:
+            piece = rng.choice(['-', ';', 'é', 'K', 'İ', '\t'])
+        pieces.append(piece)
+        pieces.append(rng.choice(['', ' ', ' ', '\n']))
+        length += len(piece) + 1
+    return ''.join(pieces)[:size]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def stream_file(lexer, megabytes):
+    with tempfile.NamedTemporaryFile('w', suffix='.src', delete=False) as f:
+        piece = make_source(1_000_000)
+        for _ in range(megabytes):
+            f.write(piece)
+        path = f.name
+    try:
+        before = peak_rss_mb()
+        start = time.perf_counter()
+        with open(path) as f:
+            count = sum(1 for _ in lexer.iter_tokens(f))
+        elapsed = time.perf_counter() - start
+        return count, elapsed, before, peak_rss_mb()
+    finally:
+        os.remove(path)
+
+
+def main():
+    lexer = OptimizedLexer()
+    # Streaming runs first so the peak RSS is not inflated by the in-memory runs below
+    count, elapsed, before, after = stream_file(lexer, STREAM_MB)
+    print(f"streamed {STREAM_MB} MB file: {count:,} tokens at {count / elapsed:,.0f} tok/s, "
+          f"peak RSS {before:.0f} MB before, {after:.0f} MB after\n")
+
+    print(f"{'source MB':>9} {'tokens':>9} {'original tok/s':>15} {'table tok/s':>13} {'regex tok/s':>13}  same")
+    for size in SOURCE_SIZES:
+        source = make_source(size)
+        expected, original_time = timed(reference_tokenize, lexer.dfa, source)
+        (table_tokens, _), table_time = timed(lexer._scan_table, source, True)
+        tokens, regex_time = timed(lexer.tokenize, source)
+        print(f"{size / 1e6:>9.0f} {len(tokens):>9} {len(expected) / original_time:>15,.0f} "
+              f"{len(tokens) / table_time:>13,.0f} {len(tokens) / regex_time:>13,.0f}  "
+              f"{tokens == expected and table_tokens == expected}")
+
+
+if __name__ == "__main__":
+    main()
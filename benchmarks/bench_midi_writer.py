@@ -0,0 +1,74 @@
+# benchmarks/bench_midi_writer.py
+"""Compare music21 Score construction + score.write('midi') with the direct event-based MIDI writer
+
+Run from the repository root:  python benchmarks/bench_midi_writer.py
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music21.midi.translate import music21ObjectToMidiFile
+
+from midi_writer import parse_tree_to_midi_bytes
+from music_env import MUSIC_CFG, ParseTreeNode, generate_parse_tree, parse_tree_to_music
+
+TARGET_SIZES = [100, 1_000, 10_000, 50_000]
+
+
+def count_nodes(node):
+    count = 0
+    stack = [node]
+    while stack:
+        n = stack.pop()
+        count += 1
+        stack.extend(n.children)
+    return count
+
+
+def build_tree(target_nodes, seed):
+    """Concatenate generated songs under one root until the tree has about `target_nodes` nodes"""
+    rng = random.Random(seed)
+    root = ParseTreeNode('Song')
+    size = 1
+    while size < target_nodes:
+        song = generate_parse_tree(MUSIC_CFG, rng=rng)
+        root.children.append(song)
+        size += count_nodes(song)
+    return root, size
+
+
+def best_of(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    print(f"{'nodes':>8} {'music21 (s)':>12} {'direct (s)':>11} {'speedup':>8}  identical")
+    for target in TARGET_SIZES:
+        tree, size = build_tree(target, seed=target)
+        repeat = 3 if target <= 10_000 else 1
+
+        def via_music21():
+            return music21ObjectToMidiFile(parse_tree_to_music(tree, rng=random.Random(0))).writestr()
+
+        def via_events():
+            return parse_tree_to_midi_bytes(tree, rng=random.Random(0))
+
+        with contextlib.redirect_stdout(io.StringIO()):  # depth-limited Harmony leaves print errors
+            slow, expected = best_of(via_music21, repeat)
+            fast, actual = best_of(via_events, repeat)
+        print(f"{size:>8} {slow:>12.4f} {fast:>11.4f} {slow / fast:>7.1f}x  {expected == actual}")
+
+
+if __name__ == "__main__":
+    main()
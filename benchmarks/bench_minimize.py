@@ -0,0 +1,152 @@
+# benchmarks/bench_minimize.py
+"""DFA.minimize (indexed Hopcroft) against the original set-based implementation
+
+reference_minimize is DFA.minimize as it was before, kept here verbatim. Test DFAs
+are complete and redundant: a random core DFA whose states are each copied several
+times, with every transition pointing at a random copy of its target, so the
+minimized size is known to be at most the core size. Results are compared up to
+isomorphism where the original finishes in reasonable time.
+
+Run from the repository root:  python benchmarks/bench_minimize.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Optimizer import DFA
+
+COMPARE_SIZES = [100, 300, 1_000]
+LARGE_SIZES = [10_000, 30_000, 100_000]
+ALPHABET = set('abcd')
+COPIES = 4
+
+
+def reference_minimize(self):
+    # Hopcroft's algorithm implementation for DFA minimization
+    P = set([frozenset(self.accepts), frozenset(self.states - self.accepts)])
+    W = set([frozenset(self.accepts)])
+
+    while W:
+        A = W.pop()
+        for c in self.alphabet:
+            X = set()
+            for state in self.states:
+                if self.transitions[state].get(c, None) in A:
+                    X.add(state)
+            if not X:
+                continue
+
+            new_P = set()
+            for Y in P:
+                intersect = X & Y
+                difference = Y - X
+                if intersect and difference:
+                    new_P.add(frozenset(intersect))
+                    new_P.add(frozenset(difference))
+                    if Y in W:
+                        W.remove(Y)
+                        W.add(frozenset(intersect))
+                        W.add(frozenset(difference))
+                    else:
+                        if len(intersect) <= len(difference):
+                            W.add(frozenset(intersect))
+                        else:
+                            W.add(frozenset(difference))
+                else:
+                    new_P.add(Y)
+            P = new_P
+
+    state_map = {}
+    new_states = set()
+    new_transitions = {}
+    new_start = None
+    new_accepts = set()
+
+    for i, group in enumerate(P):
+        rep = min(group)
+        state_map[rep] = f'S{i}'
+        new_states.add(f'S{i}')
+        if self.start in group:
+            new_start = f'S{i}'
+        if group & self.accepts:
+            new_accepts.add(f'S{i}')
+
+    for group in P:
+        rep = min(group)
+        new_trans = {}
+        for symbol in self.alphabet:
+            target = self.transitions[rep].get(symbol, None)
+            if target is not None:
+                for g in P:
+                    if target in g:
+                        new_trans[symbol] = state_map[min(g)]
+                        break
+        new_transitions[state_map[rep]] = new_trans
+
+    return DFA(new_states, self.alphabet, new_transitions, new_start, new_accepts)
+
+
+def redundant_dfa(n_states, seed=0):
+    rng = random.Random(seed)
+    core = n_states // COPIES
+    symbols = sorted(ALPHABET)
+    core_delta = [{c: rng.randrange(core) for c in symbols} for _ in range(core)]
+    core_accepts = {q for q in range(core) if rng.random() < 0.5} or {0}
+    name = lambda q, copy: f'q{q * COPIES + copy}'
+    transitions = {}
+    for q in range(core):
+        for copy in range(COPIES):
+            transitions[name(q, copy)] = {c: name(core_delta[q][c], rng.randrange(COPIES)) for c in symbols}
+    accepts = {name(q, copy) for q in core_accepts for copy in range(COPIES)}
+    return DFA(set(transitions), set(ALPHABET), transitions, name(0, 0), accepts)
+
+
+def isomorphic(a, b):
+    """True if the DFAs have the same size and their start-reachable parts match state for state"""
+    if len(a.states) != len(b.states):
+        return False
+    mapping = {a.start: b.start}
+    stack = [a.start]
+    while stack:
+        p = stack.pop()
+        q = mapping[p]
+        if (p in a.accepts) != (q in b.accepts):
+            return False
+        pt, qt = a.transitions.get(p, {}), b.transitions.get(q, {})
+        if pt.keys() != qt.keys():
+            return False
+        for symbol, target in pt.items():
+            if target in mapping:
+                if mapping[target] != qt[symbol]:
+                    return False
+            else:
+                mapping[target] = qt[symbol]
+                stack.append(target)
+    return len(set(mapping.values())) == len(mapping)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(f"{'states':>8} {'minimal':>8} {'original s':>11} {'hopcroft s':>11}  isomorphic")
+    for n_states in COMPARE_SIZES:
+        dfa = redundant_dfa(n_states)
+        expected, original_time = timed(reference_minimize, dfa)
+        result, new_time = timed(dfa.minimize)
+        print(f"{n_states:>8} {len(result.states):>8} {original_time:>11.3f} {new_time:>11.3f}  "
+              f"{isomorphic(result, expected)}")
+    for n_states in LARGE_SIZES:
+        dfa = redundant_dfa(n_states)
+        result, new_time = timed(dfa.minimize)
+        print(f"{n_states:>8} {len(result.states):>8} {'-':>11} {new_time:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
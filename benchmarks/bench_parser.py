@@ -0,0 +1,145 @@
+# benchmarks/bench_parser.py
+"""OptimizedParser's modes against the original set-based CYK loop
+
+reference_parse is OptimizedParser.parse as it was before BitsetCYK, kept here
+verbatim apart from taking the CNF grammar and start symbol as arguments. Valid and
+invalid expressions are checked against it in every mode first, then long token
+streams are timed: CYK is cubic, while the LL(1) and Earley tree modes stay linear
+on this grammar.
+
+Run from the repository root:  python benchmarks/bench_parser.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from Optimizer import PARSER_MODES, OptimizedLexer, OptimizedParser
+
+CHECK_EXPRESSIONS = 300
+REFERENCE_LENGTHS = [50, 100, 200, 400]
+BITSET_LENGTHS = [800, 1_600]
+TREE_LENGTHS = [1_000, 10_000, 100_000]
+
+
+def reference_parse(cnf_productions, start, token_types):
+    n_tokens = len(token_types)
+
+    # CYK Table Initialization
+    table = [[set() for _ in range(n_tokens+1)] for _ in range(n_tokens+1)]
+
+    # Fill table with single-token matches
+    for i in range(n_tokens):
+        for non_terminal, productions in cnf_productions.items():
+            for production in productions:
+                if len(production) == 1 and production[0] == token_types[i]:
+                    table[i][i+1].add(non_terminal)
+
+    # Fill table with multi-token matches using CYK algorithm
+    for length in range(2, n_tokens+1):
+        for i in range(n_tokens - length + 1):
+            j = i + length
+            for k in range(i+1, j):
+                for B in table[i][k]:
+                    for C in table[k][j]:
+                        for non_terminal, productions in cnf_productions.items():
+                            for production in productions:
+                                if len(production) == 2 and production[0] == B and production[1] == C:
+                                    table[i][j].add(non_terminal)
+
+    return start in table[0][n_tokens]
+
+
+def make_expression(rng, n_tokens):
+    """A random valid expression of roughly `n_tokens` tokens"""
+    parts = []
+    budget = [n_tokens]
+
+    def expr(depth):
+        term(depth)
+        while budget[0] > 0 and rng.random() < 0.6:
+            parts.append(rng.choice('+*'))
+            budget[0] -= 1
+            term(depth)
+
+    def term(depth):
+        budget[0] -= 1
+        if depth < 20 and budget[0] > 4 and rng.random() < 0.3:
+            parts.append('(')
+            expr(depth + 1)
+            parts.append(')')
+            budget[0] -= 1
+        else:
+            parts.append(rng.choice(['x', 'y', '42', '7']))
+
+    while budget[0] > 0:
+        if parts:
+            parts.append('+')
+            budget[0] -= 1
+        expr(0)
+    return ' '.join(parts)
+
+
+def mutate(rng, source):
+    """Delete, duplicate or insert one token, which usually makes the expression invalid"""
+    tokens = source.split()
+    k = rng.randrange(len(tokens))
+    choice = rng.randrange(3)
+    if choice == 0:
+        del tokens[k]
+    elif choice == 1:
+        tokens.insert(k, tokens[k])
+    else:
+        tokens.insert(k, rng.choice(['+', '*', '(', ')']))
+    return ' '.join(tokens)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    rng = random.Random(0)
+    lexer = OptimizedLexer()
+    parser = OptimizedParser()
+    start = next(iter(parser.cnf_productions))
+
+    valid = mismatches = 0
+    for _ in range(CHECK_EXPRESSIONS):
+        source = make_expression(rng, rng.randint(1, 30))
+        if rng.random() < 0.5:
+            source = mutate(rng, source)
+        tokens = lexer.tokenize(source)
+        expected = reference_parse(parser.cnf_productions, start, [t[0] for t in tokens])
+        valid += expected
+        for mode in PARSER_MODES:
+            mismatches += bool(parser.parse(tokens, mode)) != expected
+    print(f"{CHECK_EXPRESSIONS} expressions ({valid} valid): {mismatches} mismatches")
+
+    print(f"{'tokens':>7} {'original s':>11} {'bitset s':>9} {'speedup':>8}  accepted")
+    for n_tokens in REFERENCE_LENGTHS + BITSET_LENGTHS:
+        tokens = lexer.tokenize(make_expression(rng, n_tokens))
+        accepted, bitset_time = timed(parser.parse, tokens)
+        if n_tokens in REFERENCE_LENGTHS:
+            expected, original_time = timed(reference_parse, parser.cnf_productions, start,
+                                            [t[0] for t in tokens])
+            print(f"{len(tokens):>7} {original_time:>11.3f} {bitset_time:>9.3f} "
+                  f"{original_time / bitset_time:>7.0f}x  {accepted == expected and accepted}")
+        else:
+            print(f"{len(tokens):>7} {'-':>11} {bitset_time:>9.3f} {'-':>8}  {accepted}")
+
+    print(f"\n{'tokens':>7} {'ll1 s':>8} {'earley s':>9}  trees")
+    for n_tokens in TREE_LENGTHS:
+        tokens = lexer.tokenize(make_expression(rng, n_tokens))
+        ll1_tree, ll1_time = timed(parser.parse, tokens, 'll1')
+        earley_tree, earley_time = timed(parser.parse, tokens, 'earley')
+        same_leaves = list(ll1_tree.leaves()) == list(earley_tree.leaves()) == [t[1] for t in tokens]
+        print(f"{len(tokens):>7} {ll1_time:>8.3f} {earley_time:>9.3f}  {same_leaves}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# benchmarks/bench_stdp.py
+"""Compare the per-timestep STDP loop in BPNA.py with the vectorized spike-index engine
+
+Both engines run on the same spike trains and their weight traces are checked with
+np.allclose; the vectorized engine is then timed alone on much longer simulations.
+
+Run from the repository root:  python benchmarks/bench_stdp.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BPNA import generate_spike_trains, stdp_reference, stdp_vectorized
+
+COMPARE_STEPS = [1_000, 10_000, 100_000]
+LONG_STEPS = [3_600_000, 36_000_000]  # one and ten hours at dt = 1 ms
+RATES = [(0.01, 0.01), (0.05, 0.05)]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    print(f"{'steps':>11} {'p':>5} {'loop s':>9} {'vector s':>9} {'speedup':>9}  match")
+    for p_pre, p_post in RATES:
+        for n_steps in COMPARE_STEPS:
+            pre, post = generate_spike_trains(n_steps, p_pre, p_post)
+            w_loop, loop_time = timed(stdp_reference, pre, post)
+            w_vec, vec_time = timed(stdp_vectorized, pre, post)
+            match = np.allclose(w_loop, w_vec, rtol=0, atol=1e-9)
+            print(f"{n_steps:>11} {p_pre:>5} {loop_time:>9.3f} {vec_time:>9.4f} "
+                  f"{loop_time / vec_time:>8.0f}x  {match}")
+
+    for n_steps in LONG_STEPS:
+        pre, post = generate_spike_trains(n_steps)
+        w_vec, vec_time = timed(stdp_vectorized, pre, post)
+        print(f"{n_steps:>11} {0.01:>5} {'-':>9} {vec_time:>9.3f}  ({n_steps / vec_time / 1e6:.1f}M steps/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_stdp_events.py
+"""Dense per-timestep STDP against the event-driven simulators at BPNA.py's ~10 Hz rates
+
+The dense rows draw a Bernoulli raster for every step; the event rows draw geometric
+inter-spike intervals and only touch spikes. Both trajectories are compared on the
+same spikes before timing.
+
+Run from the repository root:  python benchmarks/bench_stdp_events.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BPNA import generate_spike_trains, stdp_vectorized
+from stdp_events import simulate_network_events, simulate_pair_events, weights_at
+from stdp_network import simulate_network
+
+PAIR_STEPS = [1_000_000, 10_000_000, 100_000_000]
+DENSE_LIMIT = 10_000_000
+NETWORK = (20, 20)
+NETWORK_STEPS = [100_000, 1_000_000]
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def check_match(n_steps=200_000):
+    pre, post, steps, weights = simulate_pair_events(n_steps)
+    pre_raster = np.zeros(n_steps, dtype=bool)
+    post_raster = np.zeros(n_steps, dtype=bool)
+    pre_raster[pre] = True
+    post_raster[post] = True
+    dense = stdp_vectorized(pre_raster, post_raster)
+    return np.array_equal(dense, weights_at(np.arange(n_steps), steps, weights))
+
+
+def main():
+    print(f"event trajectory equals dense trajectory on the same spikes: {check_match()}")
+    print(f"\nsingle synapse, window rule\n{'steps':>12} {'dense s':>9} {'events s':>9} {'spikes':>9}")
+    for n_steps in PAIR_STEPS:
+        dense_time = '-'
+        if n_steps <= DENSE_LIMIT:
+            _, seconds = timed(lambda: stdp_vectorized(*generate_spike_trains(n_steps)))
+            dense_time = f"{seconds:.3f}"
+        (pre, post, _, _), event_time = timed(simulate_pair_events, n_steps)
+        print(f"{n_steps:>12} {dense_time:>9} {event_time:>9.3f} {len(pre) + len(post):>9}")
+
+    n_pre, n_post = NETWORK
+    print(f"\n{n_pre} x {n_post} network, trace rule\n{'steps':>12} {'dense s':>9} {'events s':>9}")
+    for n_steps in NETWORK_STEPS:
+        _, dense_time = timed(simulate_network, n_pre, n_post, n_steps)
+        _, event_time = timed(simulate_network_events, n_pre, n_post, n_steps)
+        print(f"{n_steps:>12} {dense_time:>9.3f} {event_time:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+# benchmarks/bench_stdp_network.py
+"""Throughput and memory of the trace-based STDPNetwork at several sizes, float64 against float32
+
+Run from the repository root:  python benchmarks/bench_stdp_network.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stdp_network import STDPNetwork, simulate_network
+
+SIZES = [(100, 100), (300, 300), (1000, 100)]
+STEPS = 20_000
+
+
+def main():
+    print(f"{STEPS} steps at the BPNA.py firing rates")
+    print(f"{'pre x post':>11} {'synapses':>9} {'dtype':>8} {'state MB':>9} {'seconds':>8} {'mean w':>8}")
+    for n_pre, n_post in SIZES:
+        for dtype in (np.float64, np.float32):
+            state = STDPNetwork(n_pre, n_post, dtype=dtype).nbytes
+            start = time.perf_counter()
+            stats = simulate_network(n_pre, n_post, STEPS, dtype=dtype)
+            elapsed = time.perf_counter() - start
+            print(f"{n_pre:>5} x {n_post:<4} {n_pre * n_post:>9} {np.dtype(dtype).name:>8} "
+                  f"{state / 2**20:>9.2f} {elapsed:>8.2f} {stats['mean_weight']:>8.4f}")
+
+
+if __name__ == "__main__":
+    main()
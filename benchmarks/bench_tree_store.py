@@ -0,0 +1,68 @@
+# benchmarks/bench_tree_store.py
+"""Memory per node of ParseTreeNode trees against CompactParseTree, plus batch save/mmap load time
+
+Run from the repository root:  python benchmarks/bench_tree_store.py
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grammar_compiler import compile_grammar, expand_preorder, generate_compact_tree, generate_parse_tree_compiled
+from music_env import MUSIC_CFG
+from parse_tree_store import load_batch, save_batch
+
+SONGS = 5000
+MAX_DEPTH = 8
+
+
+def traced_bytes(build):
+    """Bytes still allocated after build() returns, with the result kept alive"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = build()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    compiled = compile_grammar(MUSIC_CFG)
+    rng = random.Random(0)
+    nodes = sum(len(expand_preorder(compiled, max_depth=MAX_DEPTH, rng=rng)[0]) for _ in range(SONGS))
+
+    rng = random.Random(0)
+    _, object_bytes = traced_bytes(
+        lambda: [generate_parse_tree_compiled(compiled, max_depth=MAX_DEPTH, rng=rng) for _ in range(SONGS)])
+    rng = random.Random(0)
+    compact, compact_bytes = traced_bytes(
+        lambda: [generate_compact_tree(compiled, max_depth=MAX_DEPTH, rng=rng) for _ in range(SONGS)])
+    array_bytes = sum(tree.nbytes for tree in compact)
+
+    print(f"{SONGS} songs, {nodes} nodes")
+    print(f"ParseTreeNode trees:   {object_bytes / nodes:8.1f} bytes/node")
+    print(f"CompactParseTree:      {compact_bytes / nodes:8.1f} bytes/node including per-tree overhead")
+    print(f"  node arrays only:    {array_bytes / nodes:8.1f} bytes/node")
+
+    path = tempfile.mkdtemp(prefix='tree_batch_')
+    try:
+        start = time.perf_counter()
+        save_batch(path, compact)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        batch = load_batch(path)
+        loaded = time.perf_counter() - start
+        on_disk = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print(f"batch save {saved:.3f}s, mmap load {loaded * 1000:.2f}ms, {len(batch)} trees, "
+              f"{on_disk / nodes:.1f} bytes/node on disk")
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == "__main__":
+    main()
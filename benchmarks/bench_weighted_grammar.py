@@ -0,0 +1,89 @@
+# benchmarks/bench_weighted_grammar.py
+"""Alias-table sampling against the uniform compiled expander, and the size prediction against sampling
+
+With MUSIC_CFG_WEIGHTS uniform, sample_preorder draws from the same distribution as
+expand_preorder, so both throughput and mean tree size are comparable. The expected
+node count from expected_counts is checked against the sampled mean at each depth, and
+estimate_song's notes and chords against what parse_tree_to_events renders for sampled songs.
+
+Run from the repository root:  python benchmarks/bench_weighted_grammar.py
+"""
+import contextlib
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from grammar_compiler import build_parse_tree, compile_grammar, expand_preorder
+from midi_writer import parse_tree_to_events
+from music_env import MUSIC_CFG
+from weighted_grammar import (AliasTable, RandomBuffer, WeightedGrammar, estimate_song, expected_counts,
+                              sample_preorder)
+
+DEPTHS = [5, 10, 20]
+SONGS = 5000
+ALIAS_DRAWS = 1_000_000
+RENDERED_SONGS = 2000
+
+
+def rendered_notes_and_chords(events):
+    """(notes, chords) in a parse_tree_to_events array: chords are the onsets with several pitches"""
+    _, voices = np.unique(events[:, 0], return_counts=True)
+    return int((voices == 1).sum()), int((voices > 1).sum())
+
+
+def mean_and_error(values):
+    return np.mean(values), np.std(values) / np.sqrt(len(values))
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    table = AliasTable([5, 1, 1, 3, 0, 10])
+    counts = np.bincount(table.sample(np.random.default_rng(0), ALIAS_DRAWS), minlength=table.n)
+    print(f"alias table, {ALIAS_DRAWS} draws: max frequency error "
+          f"{np.abs(counts / ALIAS_DRAWS - table.probabilities).max():.4f}")
+
+    compiled = compile_grammar(MUSIC_CFG)
+    weighted = WeightedGrammar()
+    print(f"{'depth':>5} {'predicted':>10} {'sampled':>14} {'uniform Mnodes/s':>17} {'alias Mnodes/s':>15}")
+    for depth in DEPTHS:
+        rng = random.Random(depth)
+        uniform_sizes, uniform_time = timed(
+            lambda: [len(expand_preorder(compiled, max_depth=depth, rng=rng)[0]) for _ in range(SONGS)])
+        buffer = RandomBuffer(np.random.default_rng(depth))
+        sizes, alias_time = timed(
+            lambda: [len(sample_preorder(weighted, max_depth=depth, rng=buffer)[0]) for _ in range(SONGS)])
+        predicted = expected_counts(weighted, max_depth=depth).sum()
+        print(f"{depth:>5} {predicted:>10.1f} {np.mean(sizes):>7.1f} +- {np.std(sizes) / np.sqrt(SONGS):<4.1f} "
+              f"{sum(uniform_sizes) / uniform_time / 1e6:>17.2f} {sum(sizes) / alias_time / 1e6:>15.2f}")
+
+    print(f"{'depth':>5} {'notes predicted':>15} {'rendered':>15} {'chords predicted':>16} {'rendered':>15}")
+    for depth in DEPTHS:
+        buffer = RandomBuffer(np.random.default_rng(depth))
+        render_rng = random.Random(depth)
+        counts = []
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            for _ in range(RENDERED_SONGS):
+                tree = build_parse_tree(weighted.symbols, *sample_preorder(weighted, max_depth=depth, rng=buffer))
+                counts.append(rendered_notes_and_chords(parse_tree_to_events(tree, render_rng)))
+        song = estimate_song(weighted, max_depth=depth)
+        line = f"{depth:>5}"
+        for predicted, values in zip((song['notes'], song['chords']), zip(*counts)):
+            mean, error = mean_and_error(values)
+            flag = '!' if abs(predicted - mean) > 5 * error else ' '
+            line += f" {predicted:>15.2f} {mean:>7.2f} +- {error:<4.2f}{flag}"
+        print(line)
+    print("! marks a prediction more than 5 standard errors from the rendered mean")
+
+
+if __name__ == "__main__":
+    main()
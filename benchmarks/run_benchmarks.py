@@ -0,0 +1,356 @@
+# benchmarks/run_benchmarks.py
+"""Seeded regression suite for the hot paths in music_env, Optimizer and BPNA
+
+Every case is a fixed, seeded workload that returns how many units (nodes, notes,
+characters, tokens, states, timesteps) it processed. The runner records the best
+throughput over --repeat runs and the peak traced memory of one extra run, writes
+them to JSON, and compares them with a stored baseline. A case regresses when its
+throughput drops, or its peak memory grows, by more than the tolerance; the exit
+status is then 1, so the suite can gate CI.
+
+When the suite as a whole runs slower than the baseline, throughput ratios are divided by
+their median before they are checked, so a machine that is 15% slower today does not fail
+every case, while one path that slows down against the rest still does. The median speed
+is printed too.
+
+The committed baseline.json was recorded on one machine with --rounds 7; after
+changing hardware, record a new one with --update-baseline before comparing.
+
+Run from the repository root:  python benchmarks/run_benchmarks.py
+"""
+import argparse
+import contextlib
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from BPNA import generate_spike_trains, stdp_reference, stdp_vectorized
+from Optimizer import OptimizedLexer, OptimizedParser
+from midi_writer import parse_tree_to_events, parse_tree_to_midi_bytes
+from music21.midi.translate import streamToMidiFile
+from music_env import MUSIC_CFG, generate_parse_tree, parse_tree_to_music
+
+from bench_lexer import make_source
+from bench_midi_writer import count_nodes
+from bench_minimize import redundant_dfa
+from bench_cyk_session import edits as session_edits
+from bench_parser import make_expression
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_TOLERANCE = 0.25
+# Cases whose median-of-5 throughput still moved by about a third between identical runs
+CASE_TOLERANCES = {
+    'parse_tree_to_music+midi_write': 0.4,
+    'parse_tree_to_midi_bytes': 0.4,
+    'lexer.tokenize/chars=1000000': 0.4,
+    'parser.parse/ll1/tokens=1000': 0.4,
+    'stdp_reference/T=1000': 0.4,
+}
+NORMALIZE_MIN_CASES = 5  # fewer than this and the median speed is mostly the cases themselves
+DEFAULT_ROUNDS = 5
+DEFAULT_MEMORY_TOLERANCE = 0.25
+MIN_SECONDS = 0.5  # keep timing a case until this much has been spent on it
+MEMORY_SLACK_BYTES = 64 * 1024  # ignore growth this small, e.g. in the tiny STDP-loop cases
+
+TREE_DEPTHS = [5, 10, 20]
+TREE_SONGS = 500
+MUSIC21_SONGS = 20
+RENDER_SONGS = 500
+LEXER_SIZES = [100_000, 1_000_000]
+PARSER_LENGTHS = {'cyk': [100, 400], 'll1': [1_000, 10_000], 'earley': [1_000, 10_000]}
+SESSION_LENGTHS = [1_000]
+DFA_SIZES = [1_000, 10_000]
+STDP_LOOP_STEPS = [1_000, 10_000]
+STDP_VECTOR_STEPS = [100_000, 1_000_000]
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence stdout, e.g. the warnings music_env prints for depth-limited Harmony nodes"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def _songs(count, depth=5, seed=0):
+    rng = random.Random(seed)
+    songs = []
+    for _ in range(count):
+        tree = generate_parse_tree(MUSIC_CFG, max_depth=depth, rng=rng)
+        songs.append((tree, rng.getstate()))
+    return songs
+
+
+def _count_notes(songs):
+    rng = random.Random()
+    total = 0
+    for tree, state in songs:
+        rng.setstate(state)
+        total += len(parse_tree_to_events(tree, rng))
+    return total
+
+
+def build_cases():
+    """[(case id, unit, workload)]: each workload is seeded and returns the units it processed
+
+    Inputs are built here, outside the timed calls.
+    """
+    cases = []
+
+    for depth in TREE_DEPTHS:
+        def generate(depth=depth):
+            rng = random.Random(depth)
+            return sum(count_nodes(generate_parse_tree(MUSIC_CFG, max_depth=depth, rng=rng))
+                       for _ in range(TREE_SONGS))
+        cases.append((f'generate_parse_tree/depth={depth}', 'nodes', generate))
+
+    music21_songs = _songs(MUSIC21_SONGS)
+    music21_notes = _count_notes(music21_songs)
+    render_songs = _songs(RENDER_SONGS)
+    render_notes = _count_notes(render_songs)
+
+    def music21_midi():
+        rng = random.Random()
+        for tree, state in music21_songs:
+            rng.setstate(state)
+            # What Score.write('midi') does, without the file
+            streamToMidiFile(parse_tree_to_music(tree, rng)).writestr()
+        return music21_notes
+
+    def direct_midi():
+        rng = random.Random()
+        for tree, state in render_songs:
+            rng.setstate(state)
+            parse_tree_to_midi_bytes(tree, rng)
+        return render_notes
+
+    cases.append(('parse_tree_to_music+midi_write', 'notes', music21_midi))
+    cases.append(('parse_tree_to_midi_bytes', 'notes', direct_midi))
+
+    lexer = OptimizedLexer()
+    for size in LEXER_SIZES:
+        source = make_source(size)
+
+        def tokenize(source=source):
+            lexer.tokenize(source)
+            return len(source)
+        cases.append((f'lexer.tokenize/chars={size}', 'chars', tokenize))
+
+    parser = OptimizedParser()
+    for mode, lengths in PARSER_LENGTHS.items():
+        for n_tokens in lengths:
+            tokens = lexer.tokenize(make_expression(random.Random(n_tokens), n_tokens))
+
+            def parse(tokens=tokens, mode=mode):
+                if not parser.parse(tokens, mode):
+                    raise RuntimeError(f"{mode} parser rejected a valid benchmark expression")
+                return len(tokens)
+            cases.append((f'parser.parse/{mode}/tokens={n_tokens}', 'tokens', parse))
+
+    for n_tokens in SESSION_LENGTHS:
+        tokens = lexer.tokenize(make_expression(random.Random(n_tokens), n_tokens))
+        session = parser.session(tokens)
+        edits = [(start, stop, new, tokens[start:stop]) for _, start, stop, new in session_edits(tokens, unbalanced=False)]
+
+        def edit_and_undo(session=session, edits=edits):
+            for start, stop, new, old in edits:
+                session.edit(start, stop, new)
+                session.edit(start, start + len(new), old)
+            return 2 * len(edits)
+        cases.append((f'cyk_session.edit/tokens={n_tokens}', 'edits', edit_and_undo))
+
+    for n_states in DFA_SIZES:
+        dfa = redundant_dfa(n_states)
+
+        def minimize(dfa=dfa):
+            dfa.minimize()
+            return len(dfa.states)
+        cases.append((f'dfa.minimize/states={n_states}', 'states', minimize))
+
+    for n_steps in STDP_LOOP_STEPS:
+        pre, post = generate_spike_trains(n_steps)
+        cases.append((f'stdp_reference/T={n_steps}', 'steps',
+                      lambda pre=pre, post=post: len(stdp_reference(pre, post))))
+    for n_steps in STDP_VECTOR_STEPS:
+        pre, post = generate_spike_trains(n_steps)
+        cases.append((f'stdp_vectorized/T={n_steps}', 'steps',
+                      lambda pre=pre, post=post: len(stdp_vectorized(pre, post))))
+    return cases
+
+
+def measure(workload, repeat):
+    """(units, best seconds over at least `repeat` runs, peak traced bytes of one more run)
+
+    Short cases are repeated until MIN_SECONDS have passed, so their best time is stable.
+    As in timeit, the garbage collector is off while timing; otherwise a case's time
+    depends on how many objects earlier cases left alive.
+    """
+    best = float('inf')
+    runs = spent = 0
+    gc.collect()
+    gc.disable()
+    try:
+        while runs < repeat or spent < MIN_SECONDS:
+            start = time.perf_counter()
+            units = workload()
+            elapsed = time.perf_counter() - start
+            best = min(best, elapsed)
+            runs += 1
+            spent += elapsed
+    finally:
+        gc.enable()
+    # Traced separately: tracemalloc slows allocation-heavy code several times over
+    tracemalloc.start()
+    try:
+        workload()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return units, best, peak
+
+
+def run(cases, repeat=3, rounds=DEFAULT_ROUNDS, progress=print):
+    """{case id: result} with each case's median over `rounds` passes of the whole suite
+
+    Passes are interleaved rather than run back to back per case, so a slow spell on
+    the machine lands in one pass of several cases instead of every pass of one.
+    """
+    samples = {case_id: [] for case_id, _, _ in cases}
+    for round_index in range(rounds):
+        if progress and rounds > 1:
+            progress(f"round {round_index + 1}/{rounds}")
+        for case_id, _, workload in cases:
+            with quiet():
+                samples[case_id].append(measure(workload, repeat))
+
+    results = {}
+    for case_id, unit, _ in cases:
+        units, seconds, peak = sorted(samples[case_id], key=lambda sample: sample[1])[rounds // 2]
+        results[case_id] = {'unit': unit, 'units': units, 'seconds': seconds,
+                            'throughput': units / seconds if seconds > 0 else float('inf'),
+                            'peak_bytes': peak}
+        if progress:
+            progress(f"{case_id:<40} {results[case_id]['throughput']:>14,.0f} {unit}/s "
+                     f"{peak / 2**20:>9.2f} MiB")
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'platform': platform.platform(),
+        'recorded': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+    }
+
+
+def machine_speed(results, baseline):
+    """Median throughput ratio against the baseline, capped at 1.0
+
+    Only a slower machine is divided out: on a faster one, cases that gain less than the
+    median would otherwise look like regressions. Also 1.0 when too few cases overlap.
+    """
+    ratios = sorted(current['throughput'] / baseline[case_id]['throughput']
+                    for case_id, current in results.items() if case_id in baseline)
+    if len(ratios) < NORMALIZE_MIN_CASES:
+        return 1.0
+    middle = len(ratios) // 2
+    median = ratios[middle] if len(ratios) % 2 else (ratios[middle - 1] + ratios[middle]) / 2
+    return min(median, 1.0)
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE, memory_tolerance=DEFAULT_MEMORY_TOLERANCE,
+            speed=1.0):
+    """[(case id, metric, baseline value, current value, ratio)] for every regression
+
+    Throughput ratios are divided by `speed` (see machine_speed) and checked against the
+    case's CASE_TOLERANCES entry, if it is looser than `tolerance`. Cases missing from
+    either side are skipped, so adding a case does not fail the run.
+    """
+    regressions = []
+    for case_id, current in results.items():
+        previous = baseline.get(case_id)
+        if previous is None:
+            continue
+        ratio = current['throughput'] / previous['throughput'] / speed
+        if ratio < 1 - max(tolerance, CASE_TOLERANCES.get(case_id, 0)):
+            regressions.append((case_id, 'throughput', previous['throughput'], current['throughput'], ratio))
+        if current['peak_bytes'] > previous['peak_bytes'] * (1 + memory_tolerance) + MEMORY_SLACK_BYTES:
+            ratio = current['peak_bytes'] / max(previous['peak_bytes'], 1)
+            regressions.append((case_id, 'peak_bytes', previous['peak_bytes'], current['peak_bytes'], ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the seeded benchmark suite and compare it with a baseline.")
+    parser.add_argument('-k', '--only', default=None, help="run only cases whose id contains this text")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per case; the best is kept")
+    parser.add_argument('--rounds', type=int, default=DEFAULT_ROUNDS,
+                        help="passes over the whole suite; each case reports its median pass (default %(default)s)")
+    parser.add_argument('-o', '--out', default=None, help="write this run's results as JSON here")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true', help="save this run as the baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed fractional throughput drop relative to the rest of the suite "
+                             "(default %(default)s; noisy cases use CASE_TOLERANCES)")
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE,
+                        help="allowed fractional peak memory growth (default %(default)s)")
+    parser.add_argument('--absolute', action='store_true',
+                        help="compare raw throughput, without dividing by the suite's median speed")
+    parser.add_argument('--no-recheck', action='store_true',
+                        help="report regressions without measuring the flagged cases a second time")
+    args = parser.parse_args(argv)
+
+    with quiet():
+        cases = build_cases()
+    cases = [case for case in cases if args.only is None or args.only in case[0]]
+    report = {'environment': environment(), 'results': run(cases, args.repeat, args.rounds)}
+    text = json.dumps(report, indent=2) + '\n'
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)['results']
+        # A filtered run only replaces the cases it ran
+        report['results'] = {**baseline, **report['results']}
+        with open(args.baseline, 'w') as f:
+            f.write(json.dumps(report, indent=2) + '\n')
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; rerun with --update-baseline to record one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    speed = 1.0 if args.absolute else machine_speed(report['results'], baseline['results'])
+    regressions = compare(report['results'], baseline['results'], args.tolerance, args.memory_tolerance, speed)
+    if regressions and not args.no_recheck:
+        # A real regression survives a second measurement; a slow spell on the machine usually does not
+        flagged = {case_id for case_id, *_ in regressions}
+        print(f"Re-measuring {len(flagged)} flagged case(s)")
+        rechecked = run([case for case in cases if case[0] in flagged], args.repeat, args.rounds)
+        regressions = compare(rechecked, baseline['results'], args.tolerance, args.memory_tolerance, speed)
+    for case_id, metric, previous, current, ratio in regressions:
+        print(f"REGRESSION {case_id} {metric}: {previous:,.0f} -> {current:,.0f} ({ratio:.2f}x)")
+    print(f"{len(report['results'])} cases, {len(regressions)} regressions against the baseline "
+          f"from {baseline['environment']['recorded']} (machine speed {speed:.2f}x)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+# compile_service.py
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import Optimizer
+from Optimizer import PARSER_MODES, Compiler
+
+TABLES_VERSION = 1
+DEFAULT_CHUNKSIZE = 64
+
+_compilers = {}
+_worker_config = {}
+
+
+def tables_key():
+    """Cache key for the compiler tables: the table format version and a digest of Optimizer.py
+
+    The lexer DFA and the grammar are defined in Optimizer.py, so any edit there
+    invalidates tables saved by an older version.
+    """
+    with open(Optimizer.__file__, 'rb') as f:
+        source_digest = hashlib.sha256(f.read()).hexdigest()
+    payload = json.dumps({'version': TABLES_VERSION, 'source': source_digest}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def load_compiler(mode='cyk', cache_dir=None):
+    """(compiler, how it was obtained) with the tables built at most once per process
+
+    With `cache_dir`, tables are read from a JSON file there when present ('disk'),
+    which skips DFA minimization, the scanner regex build and the grammar
+    transformations; otherwise they are built ('built') and saved for the next process.
+    Later calls in the same process return the same Compiler ('memory').
+    """
+    key = tables_key()
+    if (key, mode) in _compilers:
+        return _compilers[key, mode], 'memory'
+    source = 'built'
+    compiler = None
+    path = os.path.join(cache_dir, f"compiler-{key}.json") if cache_dir else None
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                compiler = Compiler.from_tables(json.load(f), mode)
+            source = 'disk'
+        except (OSError, ValueError, KeyError):
+            compiler = None  # unreadable or stale file; rebuild and overwrite it
+    if compiler is None:
+        compiler = Compiler(mode)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            _write_atomic(path, json.dumps(compiler.to_tables()))
+    _compilers[key, mode] = compiler
+    return compiler, source
+
+
+def _init_worker(mode, cache_dir):
+    compiler, _ = load_compiler(mode, cache_dir)
+    _worker_config.update(compiler=compiler, mode=mode)
+
+
+def _compile_chunk(sources):
+    compiler = _worker_config['compiler']
+    return [compiler.compile(source, _worker_config['mode']) for source in sources]
+
+
+def _chunks(sources, size):
+    chunk = []
+    for source in sources:
+        chunk.append(source)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_compile(sources, mode='cyk', workers=None, chunksize=DEFAULT_CHUNKSIZE, cache_dir=None):
+    """Compile every source string, yielding (tokens, parse result, metrics) in input order
+
+    Sources are sent to the workers `chunksize` at a time. Each worker loads the tables
+    once through load_compiler; the parent loads them first, so with `cache_dir` the
+    workers start warm from disk.
+    """
+    if mode not in PARSER_MODES:
+        raise ValueError(f"Unknown parser mode: {mode!r}")
+    load_compiler(mode, cache_dir)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(mode, cache_dir)
+        for chunk in _chunks(sources, chunksize):
+            yield from _compile_chunk(chunk)
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(mode, cache_dir)) as pool:
+        # imap keeps input order, unlike imap_unordered
+        for results in pool.imap(_compile_chunk, _chunks(sources, chunksize)):
+            yield from results
+
+
+def compile_batch(sources, mode='cyk', workers=None, chunksize=DEFAULT_CHUNKSIZE, cache_dir=None):
+    """(results in input order, aggregate stats) for a whole batch of source strings"""
+    start_time = time.perf_counter()
+    _, table_source = load_compiler(mode, cache_dir)
+    table_seconds = time.perf_counter() - start_time
+
+    results = []
+    stats = {'sources': 0, 'accepted': 0, 'tokens': 0, 'lex_time': 0.0, 'parse_time': 0.0}
+    for tokens, result, metrics in iter_compile(sources, mode, workers, chunksize, cache_dir):
+        results.append((tokens, result, metrics))
+        stats['sources'] += 1
+        stats['accepted'] += bool(result)
+        stats['tokens'] += len(tokens)
+        stats['lex_time'] += metrics['lex_time']
+        stats['parse_time'] += metrics['parse_time']
+    elapsed = time.perf_counter() - start_time
+    stats.update(
+        rejected=stats['sources'] - stats['accepted'],
+        mode=results[0][2]['parse_mode'] if results else mode,
+        tables=table_source,
+        table_seconds=table_seconds,
+        seconds=elapsed,
+        sources_per_sec=stats['sources'] / elapsed if elapsed > 0 else float('inf'),
+    )
+    return results, stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile many expressions, one per line, in parallel")
+    parser.add_argument('input', nargs='?', default='-', help="file of expressions (default: stdin)")
+    parser.add_argument('--mode', choices=PARSER_MODES, default='cyk')
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE, help="expressions per task")
+    parser.add_argument('--cache-dir', default=None, help="save and reuse the lexer/parser tables here")
+    parser.add_argument('-o', '--out', default=None, help="write one JSON line per expression here")
+    args = parser.parse_args(argv)
+
+    if args.input == '-':
+        sources = sys.stdin.read().splitlines()
+    else:
+        with open(args.input) as f:
+            sources = f.read().splitlines()
+
+    results, stats = compile_batch(sources, args.mode, args.workers, args.chunksize, args.cache_dir)
+    if args.out:
+        with open(args.out, 'w') as f:
+            for source, (tokens, result, _) in zip(sources, results):
+                f.write(json.dumps({'source': source, 'accepted': bool(result), 'tokens': tokens}) + '\n')
+    print(f"Compiled {stats['sources']} expressions in {stats['seconds']:.2f}s "
+          f"({stats['sources_per_sec']:.0f}/sec, {stats['mode']} parser): "
+          f"{stats['accepted']} accepted, {stats['rejected']} rejected")
+    print(f"Tables: {stats['tables']} in {stats['table_seconds']:.3f}s; "
+          f"lex {stats['lex_time']:.3f}s, parse {stats['parse_time']:.3f}s across workers")
+
+
+if __name__ == "__main__":
+    main()
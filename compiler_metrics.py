@@ -0,0 +1,254 @@
+# compiler_metrics.py
+import argparse
+import bisect
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+
+CAPTURE_MODES = (None, 'cprofile', 'tracemalloc')
+
+
+def exponential_buckets(start, factor, count):
+    """Upper bounds start, start*factor, ... (`count` of them), as in Prometheus clients"""
+    return [start * factor ** k for k in range(count)]
+
+
+DURATION_BUCKETS_NS = exponential_buckets(1_000, 2, 24)  # 1 us .. about 8 s
+COUNT_BUCKETS = exponential_buckets(1, 2, 24)             # 1 .. about 8M
+BYTES_BUCKETS = exponential_buckets(1024, 2, 22)          # 1 KiB .. 2 GiB
+
+# (name, bucket bounds, help text); parser stats keys are histogram names
+_HISTOGRAMS = [
+    ('lex_ns', DURATION_BUCKETS_NS, "Time spent in the lexer per compile, in nanoseconds"),
+    ('parse_ns', DURATION_BUCKETS_NS, "Time spent in the parser per compile, in nanoseconds"),
+    ('compile_ns', DURATION_BUCKETS_NS, "Lexer plus parser time per compile, in nanoseconds"),
+    ('tokens', COUNT_BUCKETS, "Tokens emitted per compile"),
+    ('dfa_steps', COUNT_BUCKETS, "Lexer DFA transitions per sampled compile"),
+    ('cyk_cells', COUNT_BUCKETS, "Non-empty CYK cells per compile in cyk mode"),
+    ('earley_items', COUNT_BUCKETS, "Earley chart items per compile in earley mode"),
+    ('peak_alloc_bytes', BYTES_BUCKETS, "Peak traced memory per compile in tracemalloc mode"),
+]
+
+_COUNTERS = [
+    ('compiles', "Calls to Compiler.compile"),
+    ('accepted', "Compiles whose tokens parsed"),
+    ('rejected', "Compiles whose tokens did not parse"),
+    ('sampled', "Compiles whose DFA steps were counted"),
+]
+
+
+class Histogram:
+    """Fixed-bucket histogram: a count per upper bound, plus the total count, sum, min and max"""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # the last bucket is +Inf
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        if other.bounds != self.bounds:
+            raise ValueError("Cannot merge histograms with different buckets")
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile; exact to within one bucket"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min,
+            'max': self.max,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': [[bound, count] for bound, count in zip(self.bounds + ['+Inf'], self.counts) if count],
+        }
+
+
+class CompilerMetrics:
+    """Per-phase histograms over many Compiler.compile calls
+
+    Attach one with Compiler(metrics=CompilerMetrics()) or compiler.metrics = ...; a
+    compiler without one skips all of this. Timings, tokens and the parser's work
+    counts (CYK cells, Earley items) are recorded on every call. DFA steps need a
+    second scan of the source, so they are counted on every `sample_every`-th call
+    only. `capture` adds cProfile ('cprofile') or tracemalloc ('tracemalloc') around
+    each compile; both are slow and meant for investigation, not production.
+    """
+
+    def __init__(self, sample_every=1, capture=None):
+        if capture not in CAPTURE_MODES:
+            raise ValueError(f"Unknown capture mode: {capture!r}")
+        self.sample_every = sample_every
+        self.capture = capture
+        self.histograms = {name: Histogram(bounds) for name, bounds, _ in _HISTOGRAMS}
+        self.counters = {name: 0 for name, _ in _COUNTERS}
+        self.profiler = cProfile.Profile() if capture == 'cprofile' else None
+        self._tracing = False
+
+    def observe(self, compiler, source, tokens, result, metrics, stats):
+        """Record one compile; called by Compiler.compile"""
+        histograms = self.histograms
+        counters = self.counters
+        counters['compiles'] += 1
+        counters['accepted' if result else 'rejected'] += 1
+        histograms['lex_ns'].observe(metrics['lex_ns'])
+        histograms['parse_ns'].observe(metrics['parse_ns'])
+        histograms['compile_ns'].observe(metrics['lex_ns'] + metrics['parse_ns'])
+        histograms['tokens'].observe(len(tokens))
+        for name, value in stats.items():
+            histograms[name].observe(value)
+        if self.sample_every and counters['compiles'] % self.sample_every == 0:
+            counters['sampled'] += 1
+            histograms['dfa_steps'].observe(compiler.lexer.count_steps(source))
+
+    @contextlib.contextmanager
+    def capturing(self):
+        """Profile or trace allocations for the duration of one compile, per `capture`"""
+        if self.capture == 'cprofile':
+            self.profiler.enable()
+            try:
+                yield
+            finally:
+                self.profiler.disable()
+            return
+
+        # Tracing stays on from the first traced compile until close(), so that
+        # profile_report can show what is still allocated across calls
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            self.histograms['peak_alloc_bytes'].observe(tracemalloc.get_traced_memory()[1])
+
+    def close(self):
+        """Stop tracemalloc if this instance started it"""
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def merge(self, other):
+        """Add another instance's counts, e.g. one gathered in a worker process"""
+        for name, histogram in other.histograms.items():
+            self.histograms[name].merge(histogram)
+        for name, value in other.counters.items():
+            self.counters[name] += value
+        return self
+
+    def profile_report(self, sort='cumulative', limit=25):
+        """pstats text of the cProfile capture, or the largest live traced allocations by line"""
+        if self.profiler is not None:
+            out = io.StringIO()
+            pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+        if self._tracing:
+            snapshot = tracemalloc.take_snapshot()
+            return '\n'.join(str(stat) for stat in snapshot.statistics('lineno')[:limit])
+        return ''
+
+    def to_dict(self):
+        return {
+            'counters': dict(self.counters),
+            'histograms': {name: h.to_dict() for name, h in self.histograms.items() if h.count},
+        }
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def prometheus_text(self, prefix='compiler'):
+        """All counters and non-empty histograms in the Prometheus text exposition format"""
+        lines = []
+        for field, help_text in _COUNTERS:
+            name = f"{prefix}_{field}_total"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name} {self.counters[field]}")
+        for field, _, help_text in _HISTOGRAMS:
+            histogram = self.histograms[field]
+            if not histogram.count:
+                continue
+            name = f"{prefix}_{field}"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in zip(histogram.bounds, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{le="+Inf"}} {histogram.count}')
+            lines.append(f"{name}_sum {histogram.sum}")
+            lines.append(f"{name}_count {histogram.count}")
+        return '\n'.join(lines) + '\n'
+
+
+def main(argv=None):
+    # Imported here so the metrics classes can be used without loading the compiler
+    from Optimizer import PARSER_MODES, Compiler
+
+    parser = argparse.ArgumentParser(description="Compile expressions, one per line, and report metrics")
+    parser.add_argument('input', help="file of expressions")
+    parser.add_argument('--mode', choices=PARSER_MODES, default='cyk')
+    parser.add_argument('--sample-every', type=int, default=1, help="count DFA steps on every Nth compile")
+    parser.add_argument('--capture', choices=['cprofile', 'tracemalloc'], default=None)
+    parser.add_argument('--format', choices=['json', 'prometheus'], default='json')
+    parser.add_argument('-o', '--out', default=None, help="write the metrics here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with open(args.input) as f:
+        sources = f.read().splitlines()
+    metrics = CompilerMetrics(args.sample_every, args.capture)
+    compiler = Compiler(args.mode, metrics=metrics)
+    start_time = time.perf_counter()
+    for source in sources:
+        compiler.compile(source)
+    elapsed = time.perf_counter() - start_time
+
+    text = metrics.to_json(indent=2) + '\n' if args.format == 'json' else metrics.prometheus_text()
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text)
+        print(f"Compiled {len(sources)} expressions in {elapsed:.2f}s -> {args.out}")
+    else:
+        print(text, end='')
+    if args.capture:
+        print(metrics.profile_report())
+        metrics.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# grammar_compiler.py
+import random
+
+from music_env import HARMONIC_PROGRESSIONS, STAR_CONTINUE, ParseTreeNode
+
+
+class CompiledGrammar:
+    """MUSIC_CFG-style grammar with symbols interned to integer ids and flat production tables
+
+    For symbol id `s`:
+      productions[s]  tuple of productions, each a tuple of child symbol ids
+      choice_bits[s]  bit width used to draw a production index, as random.Random.choice does
+      is_terminal[s]  True when the symbol has no productions
+      star_base[s]    id of the repeated symbol for Kleene-star items like 'Section*', else -1
+    """
+
+    def __init__(self, grammar, progressions=HARMONIC_PROGRESSIONS):
+        self.symbols = []
+        self.symbol_ids = {}
+        for lhs in grammar:
+            self.intern(lhs)
+        raw_productions = {self.symbol_ids[lhs]: [[self.intern(sym) for sym in production]
+                                                   for production in rhs]
+                           for lhs, rhs in grammar.items()}
+
+        # Kleene-star items get their own id pointing at the symbol they repeat
+        for name in list(self.symbols):
+            if name.endswith('*'):
+                self.intern(name[:-1])
+        # Harmony nodes store the chosen progression name as their only child
+        self.progression_ids = tuple(self.intern(name) for name in progressions)
+        self.harmony_id = self.intern('Harmony')
+        self.chord_phrase_id = self.intern('ChordPhrase')
+
+        self.star_base = tuple(self.symbol_ids[name[:-1]] if name.endswith('*') else -1
+                               for name in self.symbols)
+        self.productions = tuple(tuple(tuple(p) for p in raw_productions.get(sym_id, ()))
+                                 for sym_id in range(len(self.symbols)))
+        self.choice_bits = tuple(len(p).bit_length() for p in self.productions)
+        self.is_terminal = tuple(not p and sym_id != self.harmony_id
+                                 for sym_id, p in enumerate(self.productions))
+        self.terminals = frozenset(sym_id for sym_id, terminal in enumerate(self.is_terminal) if terminal)
+
+    def intern(self, symbol):
+        """Return the id of `symbol`, assigning the next free id on first sight"""
+        sym_id = self.symbol_ids.get(symbol)
+        if sym_id is None:
+            sym_id = len(self.symbols)
+            self.symbol_ids[symbol] = sym_id
+            self.symbols.append(symbol)
+        return sym_id
+
+
+def compile_grammar(grammar, progressions=HARMONIC_PROGRESSIONS):
+    return CompiledGrammar(grammar, progressions)
+
+
+def expand_preorder(compiled, start_symbol='Song', max_depth=5, rng=None):
+    """Expand the grammar into flat preorder lists of symbol ids and child counts
+
+    Indices are drawn with the same getrandbits rejection sampling random.Random.choice
+    uses, in the same order as generate_parse_tree, so a given RNG state yields the same
+    tree on both paths. generate_parse_tree never hands a Harmony progression on to
+    sibling nodes, so ChordPhrase always takes its grammar productions, as it does here.
+    Expansion runs on an explicit stack, so tree depth is bounded only by `max_depth`.
+    """
+    rng = rng or random
+    getrandbits = rng.getrandbits
+    rand = rng.random
+    productions = compiled.productions
+    choice_bits = compiled.choice_bits
+    is_terminal = compiled.is_terminal
+    star_base = compiled.star_base
+    harmony_id = compiled.harmony_id
+    chord_phrase_id = compiled.chord_phrase_id
+    progression_ids = compiled.progression_ids
+    n_progressions = len(progression_ids)
+    progression_bits = n_progressions.bit_length()
+
+    sym_ids = []
+    child_counts = []
+    push_sym = sym_ids.append
+    push_count = child_counts.append
+
+    def open_node(sym_id, depth):
+        """Emit `sym_id` and return its chosen production, or None for leaves"""
+        push_sym(sym_id)
+        push_count(0)
+        if depth > max_depth:
+            return None
+
+        if sym_id == harmony_id:
+            r = getrandbits(progression_bits)
+            while r >= n_progressions:
+                r = getrandbits(progression_bits)
+            push_sym(progression_ids[r])
+            push_count(0)
+            child_counts[-2] = 1
+            return None
+
+        if is_terminal[sym_id]:
+            return None
+
+        options = productions[sym_id]
+        n, k = len(options), choice_bits[sym_id]
+        r = getrandbits(k)
+        while r >= n:
+            r = getrandbits(k)
+        return options[r]
+
+    if start_symbol not in compiled.symbol_ids:
+        raise KeyError(f"Unknown start symbol: {start_symbol!r}")
+    start_id = compiled.symbol_ids[start_symbol]
+    production = open_node(start_id, 0)
+    if not production:
+        return sym_ids, child_counts
+
+    # Pending items are (symbol id, parent index, depth, expand Kleene stars), popped in
+    # the order a recursive expansion would visit them. A starred item draws its
+    # continuation when popped and, on success, is pushed again beneath the new child.
+    stars = start_id != chord_phrase_id
+    stack = [(child_id, 0, 1, stars) for child_id in reversed(production)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item = pop()
+        sym_id, parent, depth, stars = item
+        if stars:
+            base_id = star_base[sym_id]
+            if base_id >= 0:
+                if rand() >= STAR_CONTINUE:
+                    continue
+                push(item)
+                sym_id = base_id
+
+        child_counts[parent] += 1
+        if is_terminal[sym_id]:
+            # Leaves are emitted in place, skipping open_node for most nodes of a song
+            push_sym(sym_id)
+            push_count(0)
+            continue
+        index = len(sym_ids)
+        production = open_node(sym_id, depth)
+        if production:
+            stars = sym_id != chord_phrase_id
+            depth += 1
+            for child_id in reversed(production):
+                push((child_id, index, depth, stars))
+    return sym_ids, child_counts
+
+
+def build_parse_tree(symbols, sym_ids, child_counts):
+    """Link flat preorder (symbol id, child count) lists into ParseTreeNode objects"""
+    nodes = [ParseTreeNode(symbols[sym_id]) for sym_id in sym_ids]
+    stack = []  # [node, children still to attach]
+    for node, count in zip(nodes, child_counts):
+        if stack:
+            top = stack[-1]
+            top[0].children.append(node)
+            top[1] -= 1
+            if not top[1]:
+                stack.pop()
+        if count:
+            stack.append([node, count])
+    return nodes[0]
+
+
+def generate_parse_tree_compiled(compiled, start_symbol='Song', max_depth=5, rng=None):
+    """Drop-in replacement for generate_parse_tree that expands over a CompiledGrammar"""
+    sym_ids, child_counts = expand_preorder(compiled, start_symbol, max_depth, rng)
+    return build_parse_tree(compiled.symbols, sym_ids, child_counts)
+
+
+def generate_compact_tree(compiled, start_symbol='Song', max_depth=5, rng=None):
+    """Like generate_parse_tree_compiled, but returns an array-backed CompactParseTree"""
+    from parse_tree_store import CompactParseTree
+
+    sym_ids, child_counts = expand_preorder(compiled, start_symbol, max_depth, rng)
+    return CompactParseTree.from_preorder(compiled.symbols, sym_ids, child_counts)
@@ -0,0 +1,149 @@
+# harmony.py
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+
+from midi_writer import (DEFAULT_VELOCITY, DURATION, ONSET, PITCH, TICKS_PER_QUARTER, VELOCITY,
+                         events_to_midi_bytes, note_name_to_midi)
+from music_env import CHORD_MAP, HARMONIC_PROGRESSIONS, MUSIC_CFG, ProgressionCursor, generate_parse_tree, tree_accessors
+
+VOICINGS = ('nearest', 'up')
+PAD = -1
+
+# Chords as rows of MIDI pitches in music21's voice order, padded with PAD;
+# row order is CHORD_MAP's, so rng.choice(CHORD_NAMES) draws what the other renderers draw
+CHORD_NAMES = tuple(CHORD_MAP)
+CHORD_INDEX = {name: row for row, name in enumerate(CHORD_NAMES)}
+CHORD_SIZES = np.array([len(CHORD_MAP[name]) for name in CHORD_NAMES], dtype=np.int64)
+CHORD_MATRIX = np.full((len(CHORD_NAMES), CHORD_SIZES.max()), PAD, dtype=np.int64)
+for _row, _name in enumerate(CHORD_NAMES):
+    CHORD_MATRIX[_row, :CHORD_SIZES[_row]] = [note_name_to_midi(p) for p in CHORD_MAP[_name]]
+
+# Progressions as rows of CHORD_MATRIX indices, padded with PAD
+PROGRESSION_NAMES = tuple(HARMONIC_PROGRESSIONS)
+PROGRESSION_INDEX = {name: row for row, name in enumerate(PROGRESSION_NAMES)}
+PROGRESSION_LENGTHS = np.array([len(HARMONIC_PROGRESSIONS[name]) for name in PROGRESSION_NAMES], dtype=np.int64)
+PROGRESSION_MATRIX = np.full((len(PROGRESSION_NAMES), PROGRESSION_LENGTHS.max()), PAD, dtype=np.int64)
+for _row, _name in enumerate(PROGRESSION_NAMES):
+    PROGRESSION_MATRIX[_row, :PROGRESSION_LENGTHS[_row]] = [CHORD_INDEX[c] for c in HARMONIC_PROGRESSIONS[_name]]
+# Plain tuples for the tree walk, where indexing numpy rows per chord would be slower
+_PROGRESSION_ROWS = {name: tuple(PROGRESSION_MATRIX[row, :PROGRESSION_LENGTHS[row]].tolist())
+                     for name, row in PROGRESSION_INDEX.items()}
+
+
+def parse_tree_to_slots(node, rng=None):
+    """(chord index, pitch) arrays with one entry per quarter-note slot of the song
+
+    A slot holds a CHORD_MATRIX row (pitch PAD), a single MIDI pitch (chord PAD), or a rest
+    (both PAD). The tree is read with the same rules and RNG draws as parse_tree_to_events,
+    so slots_to_events(...)[0] with offset 0 gives the same events.
+    """
+    rng = rng or random
+    chords = []
+    pitches = []
+    root, symbol_of, children_of = tree_accessors(node)
+    stack = [(root, None)]
+    while stack:
+        n, harmony_progression = stack.pop()
+        symbol = symbol_of(n)
+        children = children_of(n)
+        if symbol == 'Harmony':
+            if not children:
+                # Cut off by max_depth; leave the progression unset so ChordPhrases draw random chords
+                continue
+            harmony_progression = ProgressionCursor(_PROGRESSION_ROWS[symbol_of(children[0])])
+
+        if symbol == 'ChordPhrase':
+            chord_index = harmony_progression.next_chord() if harmony_progression else None
+            if chord_index is None:
+                chord_index = CHORD_INDEX[rng.choice(CHORD_NAMES)]
+            chords.append(chord_index)
+            pitches.append(PAD)
+        elif symbol in CHORD_INDEX:
+            chords.append(CHORD_INDEX[symbol])
+            pitches.append(PAD)
+        elif symbol == 'r1':
+            chords.append(PAD)
+            pitches.append(PAD)
+        elif len(symbol) == 2 and symbol[1] == '4':
+            chords.append(PAD)
+            pitches.append(note_name_to_midi(symbol))
+        stack.extend((child, harmony_progression) for child in reversed(children))
+
+    return np.array(chords, dtype=np.int64), np.array(pitches, dtype=np.int64)
+
+
+def key_offsets(keys=range(12), voicing='nearest'):
+    """Semitone shift for each key, 0 = C
+
+    'up' moves every key upwards (0..11 semitones); 'nearest' takes the smaller move
+    either way (-5..+6), so all twelve versions stay in the original register.
+    """
+    if voicing not in VOICINGS:
+        raise ValueError(f"Unknown voicing: {voicing!r}")
+    keys = np.asarray(keys, dtype=np.int64) % 12
+    return (keys + 5) % 12 - 5 if voicing == 'nearest' else keys
+
+
+def slots_to_events(chords, pitches, offsets=(0,), velocity=DEFAULT_VELOCITY):
+    """(len(offsets), n, 4) int64 event arrays, one per transposition, in parse_tree_to_events order
+
+    Chord slots are expanded through CHORD_MATRIX and every voice is shifted by all the
+    offsets at once with broadcasting; no per-key Python loop.
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    is_chord = chords >= 0
+    voices = np.where(is_chord, CHORD_SIZES[chords], pitches >= 0)
+    slot = np.repeat(np.arange(len(chords)), voices)
+    # Position of each event within its slot's voices
+    rank = np.arange(len(slot)) - np.repeat(np.cumsum(voices) - voices, voices)
+    base = np.where(is_chord[slot], CHORD_MATRIX[chords[slot], rank], pitches[slot])
+    shifted = base + offsets[:, None]
+    if shifted.size and (shifted.min() < 0 or shifted.max() > 127):
+        raise ValueError("Transposition moves a pitch outside the MIDI range 0..127")
+
+    events = np.empty((len(offsets), len(slot), 4), dtype=np.int64)
+    events[:, :, ONSET] = slot * TICKS_PER_QUARTER
+    events[:, :, DURATION] = TICKS_PER_QUARTER
+    events[:, :, PITCH] = shifted
+    events[:, :, VELOCITY] = velocity
+    return events
+
+
+def events_in_all_keys(node, rng=None, keys=range(12), voicing='nearest', velocity=DEFAULT_VELOCITY):
+    """Walk the tree once and return its events transposed to every key in `keys`"""
+    chords, pitches = parse_tree_to_slots(node, rng)
+    return slots_to_events(chords, pitches, key_offsets(keys, voicing), velocity)
+
+
+def midi_bytes_in_all_keys(node, rng=None, keys=range(12), voicing='nearest'):
+    """{key: Standard MIDI File bytes} for the song in every key in `keys`"""
+    keys = list(keys)
+    events = events_in_all_keys(node, rng, keys, voicing)
+    return {key: events_to_midi_bytes(key_events) for key, key_events in zip(keys, events)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate one song and write it in all 12 keys.")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--max-depth', type=int, default=5)
+    parser.add_argument('--voicing', choices=VOICINGS, default='nearest')
+    parser.add_argument('-o', '--out-dir', default='keys', help="directory for song_kNN.mid files")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    start_time = time.perf_counter()
+    tree = generate_parse_tree(MUSIC_CFG, max_depth=args.max_depth, rng=rng)
+    files = midi_bytes_in_all_keys(tree, rng, voicing=args.voicing)
+    os.makedirs(args.out_dir, exist_ok=True)
+    for key, data in files.items():
+        with open(os.path.join(args.out_dir, f"song_k{key:02d}.mid"), 'wb') as f:
+            f.write(data)
+    print(f"Wrote {len(files)} keys to {args.out_dir} in {time.perf_counter() - start_time:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
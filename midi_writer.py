@@ -0,0 +1,216 @@
+# midi_writer.py
+import random
+import struct
+
+import numpy as np
+
+from music_env import CHORD_MAP, HARMONIC_PROGRESSIONS, ProgressionCursor, tree_accessors
+
+# Same resolution, tempo and note velocity music21 uses when it writes a Score,
+# so both paths produce byte-identical files
+TICKS_PER_QUARTER = 10080
+DEFAULT_TEMPO_BPM = 120
+DEFAULT_VELOCITY = 90
+END_OF_TRACK_DELAY = TICKS_PER_QUARTER
+
+# Column layout of the event arrays returned by parse_tree_to_events
+ONSET, DURATION, PITCH, VELOCITY = range(4)
+
+_STEP_TO_SEMITONE = {'C': 0, 'D': 2, 'E': 4, 'F': 5, 'G': 7, 'A': 9, 'B': 11}
+_ACCIDENTALS = {'#': 1, '-': -1, 'b': -1}
+
+
+def note_name_to_midi(name):
+    """Convert a music21-style pitch name such as 'C4', 'F#3' or 'B-2' to a MIDI number"""
+    semitone = _STEP_TO_SEMITONE[name[0].upper()]
+    i = 1
+    while i < len(name) and name[i] in _ACCIDENTALS:
+        semitone += _ACCIDENTALS[name[i]]
+        i += 1
+    octave = int(name[i:])
+    return 12 * (octave + 1) + semitone
+
+
+# Chords are expanded to MIDI pitch sets once, keeping music21's voice order
+CHORD_PITCHES = {name: tuple(note_name_to_midi(p) for p in pitches) for name, pitches in CHORD_MAP.items()}
+_CHORD_NAMES = list(CHORD_MAP.keys())
+
+
+def parse_tree_to_events(node, rng=None, velocity=DEFAULT_VELOCITY):
+    """Flatten a parse tree (ParseTreeNode or CompactParseTree) to an (n, 4) int64 array of (onset, duration, pitch, velocity) rows
+
+    Onsets and durations are in ticks (TICKS_PER_QUARTER per quarter note). The tree is read
+    with the same rules as parse_tree_to_music, including the random fallback chord for
+    ChordPhrase nodes, so the same tree and RNG state give the same music on both paths.
+    """
+    rng = rng or random
+    events = []
+    onset = 0
+
+    def add_chord(chord_symbol):
+        for pitch in CHORD_PITCHES[chord_symbol]:
+            events.append((onset, TICKS_PER_QUARTER, pitch, velocity))
+
+    root, symbol_of, children_of = tree_accessors(node)
+    stack = [(root, None)]
+    while stack:
+        n, harmony_progression = stack.pop()
+        symbol = symbol_of(n)
+        children = children_of(n)
+        if symbol == 'Harmony':
+            if not children:
+                print(f"Error: Harmony node has no children! Node: {symbol}")
+                continue
+            harmony_progression = ProgressionCursor(HARMONIC_PROGRESSIONS[symbol_of(children[0])])
+
+        if symbol == 'ChordPhrase':
+            chord_symbol = harmony_progression.next_chord() if harmony_progression else None
+            add_chord(rng.choice(_CHORD_NAMES) if chord_symbol is None else chord_symbol)
+            onset += TICKS_PER_QUARTER
+        elif symbol in CHORD_PITCHES:
+            add_chord(symbol)
+            onset += TICKS_PER_QUARTER
+        elif symbol == 'r1':
+            onset += TICKS_PER_QUARTER
+        elif len(symbol) == 2 and symbol[1] == '4':
+            events.append((onset, TICKS_PER_QUARTER, note_name_to_midi(symbol), velocity))
+            onset += TICKS_PER_QUARTER
+        stack.extend((child, harmony_progression) for child in reversed(children))
+
+    return np.array(events, dtype=np.int64).reshape(-1, 4)
+
+
+def _var_len(value):
+    """Encode an int as a MIDI variable-length quantity"""
+    out = bytearray([value & 0x7F])
+    value >>= 7
+    while value:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.reverse()
+    return bytes(out)
+
+
+def _chunk(chunk_type, data):
+    return chunk_type + struct.pack('>I', len(data)) + data
+
+
+def conductor_track(bpm=DEFAULT_TEMPO_BPM):
+    """Track 0: tempo and a 4/4 time signature, as music21 writes it"""
+    microseconds_per_quarter = round(60_000_000 / bpm)
+    data = (b'\x00\xff\x51\x03' + microseconds_per_quarter.to_bytes(3, 'big')
+            + b'\x00\xff\x58\x04\x04\x02\x18\x08'
+            + _var_len(END_OF_TRACK_DELAY) + b'\xff\x2f\x00')
+    return _chunk(b'MTrk', data)
+
+
+# Empty track-name meta event that opens every music21 note track
+TRACK_NAME_EVENT = b'\x00\xff\x03\x00'
+
+
+def note_track_body(events, channel=0):
+    """Encode an event array as note-on/note-off messages, without the track header
+
+    At equal ticks note-offs come before note-ons and each group keeps event order,
+    which is how music21 serializes consecutive notes and chords.
+    """
+    note_on = 0x90 | channel
+    note_off = 0x80 | channel
+    messages = []
+    for index, (onset, duration, pitch, velocity) in enumerate(events.tolist()):
+        messages.append((onset, 1, index, bytes((note_on, pitch, velocity))))
+        messages.append((onset + duration, 0, index, bytes((note_off, pitch, 0))))
+    messages.sort()
+
+    out = bytearray(TRACK_NAME_EVENT)
+    if messages:
+        # music21 centres the pitch bend before the first note of a non-empty track
+        out += bytes((0x00, 0xE0 | channel, 0x00, 0x40))
+    last_tick = 0
+    for tick, _, _, message in messages:
+        out += _var_len(tick - last_tick)
+        out += message
+        last_tick = tick
+    out += _var_len(END_OF_TRACK_DELAY) + b'\xff\x2f\x00'
+    return bytes(out)
+
+
+def events_to_midi_bytes(events, bpm=DEFAULT_TEMPO_BPM):
+    """Serialize an event array to a format-1 Standard MIDI File"""
+    header = _chunk(b'MThd', struct.pack('>HHH', 1, 2, TICKS_PER_QUARTER))
+    return header + conductor_track(bpm) + _chunk(b'MTrk', note_track_body(events))
+
+
+def write_midi(events, fp, bpm=DEFAULT_TEMPO_BPM):
+    """Write an event array to `fp` (a path) as a Standard MIDI File"""
+    with open(fp, 'wb') as f:
+        f.write(events_to_midi_bytes(events, bpm))
+    return fp
+
+
+def parse_tree_to_midi_bytes(node, rng=None):
+    """Parse tree straight to MIDI bytes, skipping music21 Score construction"""
+    return events_to_midi_bytes(parse_tree_to_events(node, rng))
+
+
+class MidiStreamWriter:
+    """Write notes, chords and rests to a Standard MIDI File as they arrive
+
+    Events are sequential (each starts when the previous one ends), as in the songs
+    parse_tree_to_music builds, and the bytes match events_to_midi_bytes for the same
+    music. The note-track length is patched in by close(), so the file must be seekable.
+    """
+
+    def __init__(self, f, bpm=DEFAULT_TEMPO_BPM, channel=0):
+        self.f = f
+        self.channel = channel
+        f.write(_chunk(b'MThd', struct.pack('>HHH', 1, 2, TICKS_PER_QUARTER)) + conductor_track(bpm))
+        self._length_pos = f.tell() + 4
+        f.write(b'MTrk\x00\x00\x00\x00')
+        self._track_length = 0
+        self._pending_ticks = 0
+        self._has_notes = False
+        self._write(TRACK_NAME_EVENT)
+
+    def _write(self, data):
+        self.f.write(data)
+        self._track_length += len(data)
+
+    def add_notes(self, pitches, duration=TICKS_PER_QUARTER, velocity=DEFAULT_VELOCITY):
+        """Sound `pitches` together for `duration` ticks; an empty tuple is a rest"""
+        if not pitches:
+            self._pending_ticks += duration
+            return
+        note_on = 0x90 | self.channel
+        note_off = 0x80 | self.channel
+        out = bytearray()
+        if not self._has_notes:
+            out += bytes((0x00, 0xE0 | self.channel, 0x00, 0x40))
+            self._has_notes = True
+        delta = self._pending_ticks
+        for pitch in pitches:
+            out += _var_len(delta) + bytes((note_on, pitch, velocity))
+            delta = 0
+        delta = duration
+        for pitch in pitches:
+            out += _var_len(delta) + bytes((note_off, pitch, 0))
+            delta = 0
+        self._pending_ticks = 0
+        self._write(bytes(out))
+
+    def add_rest(self, duration=TICKS_PER_QUARTER):
+        self._pending_ticks += duration
+
+    def close(self):
+        """Finish the note track and patch its length; trailing rests are dropped, as music21 does"""
+        self._write(_var_len(END_OF_TRACK_DELAY) + b'\xff\x2f\x00')
+        end = self.f.tell()
+        self.f.seek(self._length_pos)
+        self.f.write(struct.pack('>I', self._track_length))
+        self.f.seek(end)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
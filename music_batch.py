@@ -0,0 +1,233 @@
+# music_batch.py
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import time
+
+from music21.musicxml.m21ToXml import GeneralObjectExporter
+
+from artifact_cache import DEFAULT_MAX_BYTES, ArtifactCache, artifact_key, format_cache_metrics
+from grammar_compiler import compile_grammar, generate_compact_tree
+from midi_writer import parse_tree_to_midi_bytes
+from music_env import MUSIC_CFG, parse_tree_to_dot, parse_tree_to_music
+
+FILE_EXTENSIONS = {'midi': '.mid', 'musicxml': '.mxml', 'png': '.png'}
+
+# Worker-process state, set once per process by _init_worker
+_worker_config = {}
+# id(grammar) -> (grammar, CompiledGrammar); the grammar is kept so its id stays unique
+_compiled_grammars = {}
+
+
+def song_seed(base_seed, index):
+    """Seed of song `index` in a batch seeded with `base_seed`"""
+    # String seeds are hashed with SHA-512, so neighbouring songs get uncorrelated streams
+    return f"{base_seed}:{index}"
+
+
+def song_rng(base_seed, index):
+    """Independent, reproducible RNG stream for song `index` of a batch seeded with `base_seed`"""
+    return random.Random(song_seed(base_seed, index))
+
+
+def song_basename(index):
+    return f"song_{index:06d}"
+
+
+def _compiled(grammar):
+    """CompiledGrammar for `grammar`, compiled once per process"""
+    entry = _compiled_grammars.get(id(grammar))
+    if entry is None:
+        entry = _compiled_grammars[id(grammar)] = (grammar, compile_grammar(grammar))
+    return entry[1]
+
+
+def _musicxml_bytes(score):
+    """Serialize a score to MusicXML, dropping the fields music21 fills with dates and random ids"""
+    data = GeneralObjectExporter(score).parse().decode('utf-8')
+    data = re.sub(r'\s*<encoding-date>[^<]*</encoding-date>', '', data)
+    part_ids = {}
+    for part_id in re.findall(r'<score-part id="([^"]+)"', data):
+        part_ids.setdefault(part_id, f'P{len(part_ids) + 1}')
+    for part_id, stable_id in part_ids.items():
+        data = data.replace(f'id="{part_id}"', f'id="{stable_id}"')
+    return data.encode('utf-8')
+
+
+def _write_atomic(path, data):
+    """Write bytes to `path` so readers never see a half-written file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _render_format(parse_tree, rng, fmt):
+    if fmt == 'midi':
+        return parse_tree_to_midi_bytes(parse_tree, rng=rng)
+    if fmt == 'musicxml':
+        return _musicxml_bytes(parse_tree_to_music(parse_tree, rng=rng))
+    return parse_tree_to_dot(parse_tree).pipe(format='png')
+
+
+def render_song_bytes(seed, grammar=MUSIC_CFG, max_depth=5, formats=('midi', 'musicxml'), cache=None):
+    """Render the song for `seed` to {format: bytes}; returns (artifacts, cache hits)
+
+    The tree is expanded over a CompiledGrammar straight into a CompactParseTree, which
+    gives the same tree as generate_parse_tree for the same seed without building
+    ParseTreeNode objects. MIDI goes through the direct event writer, which matches
+    music21's bytes; a music21 Score is only built when MusicXML is requested. With an
+    ArtifactCache, formats already stored for this grammar/seed/max_depth are returned
+    without generating anything.
+    """
+    artifacts = {}
+    keys = {}
+    if cache is not None:
+        for fmt in formats:
+            keys[fmt] = artifact_key(grammar, seed, max_depth, fmt)
+            data = cache.get(keys[fmt])
+            if data is not None:
+                artifacts[fmt] = data
+    hits = len(artifacts)
+
+    missing = [fmt for fmt in formats if fmt not in artifacts]
+    if missing:
+        rng = random.Random(seed)
+        parse_tree = generate_compact_tree(_compiled(grammar), max_depth=max_depth, rng=rng)
+        render_state = rng.getstate()
+        for fmt in missing:
+            # Both score renderers draw fallback chords from rng, so each starts from the same state
+            rng.setstate(render_state)
+            artifacts[fmt] = _render_format(parse_tree, rng, fmt)
+            if cache is not None:
+                cache.put(keys[fmt], artifacts[fmt])
+    return artifacts, hits
+
+
+def render_song(index, base_seed, out_dir, grammar=MUSIC_CFG, max_depth=5, formats=('midi', 'musicxml'),
+                cache=None):
+    """Generate song `index` of a batch and write it to `out_dir`; returns (index, written paths, cache hits)"""
+    artifacts, hits = render_song_bytes(song_seed(base_seed, index), grammar, max_depth, formats, cache)
+    paths = []
+    for fmt in formats:
+        path = os.path.join(out_dir, song_basename(index) + FILE_EXTENSIONS[fmt])
+        _write_atomic(path, artifacts[fmt])
+        paths.append(path)
+    return index, paths, hits
+
+
+def _init_worker(base_seed, out_dir, grammar, max_depth, formats, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES):
+    cache = ArtifactCache(cache_dir, cache_max_bytes) if cache_dir else None
+    _worker_config.update(base_seed=base_seed, out_dir=out_dir, grammar=grammar,
+                          max_depth=max_depth, formats=formats, cache=cache)
+
+
+def _render_in_worker(index):
+    return render_song(index, **_worker_config)
+
+
+def iter_batch(n_songs, base_seed=0, workers=None, out_dir='songs', grammar=MUSIC_CFG,
+               max_depth=5, formats=('midi', 'musicxml'), chunksize=8, cache_dir=None,
+               cache_max_bytes=DEFAULT_MAX_BYTES):
+    """Generate `n_songs` songs over a process pool, yielding (index, paths, cache hits) as each song is finished
+
+    Songs arrive in completion order, not index order. Every song draws from its own
+    RNG stream derived from `base_seed`, so the files do not depend on `workers` or
+    scheduling. With `cache_dir`, workers share an ArtifactCache there and skip songs
+    already rendered; the cache is trimmed back to `cache_max_bytes` once all songs are done.
+    """
+    unknown = set(formats) - set(FILE_EXTENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown output format(s): {', '.join(sorted(unknown))}")
+    os.makedirs(out_dir, exist_ok=True)
+    config = (base_seed, out_dir, grammar, max_depth, tuple(formats), cache_dir, cache_max_bytes)
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(*config)
+        for index in range(n_songs):
+            yield _render_in_worker(index)
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=config) as pool:
+            yield from pool.imap_unordered(_render_in_worker, range(n_songs), chunksize=chunksize)
+    if cache_dir:
+        # Each worker rescans the shared directory only now and then, so settle the total here
+        ArtifactCache(cache_dir, cache_max_bytes).trim()
+
+
+def generate_batch(n_songs, base_seed=0, workers=None, out_dir='songs', grammar=MUSIC_CFG,
+                   max_depth=5, formats=('midi', 'musicxml'), progress=None, cache_dir=None,
+                   cache_max_bytes=DEFAULT_MAX_BYTES):
+    """Run a whole batch and return throughput stats; `progress(done, n_songs)` is called per song"""
+    start_time = time.perf_counter()
+    done = 0
+    cache_hits = 0
+    for _, _, hits in iter_batch(n_songs, base_seed, workers, out_dir, grammar, max_depth, formats,
+                                 cache_dir=cache_dir, cache_max_bytes=cache_max_bytes):
+        done += 1
+        cache_hits += hits
+        if progress:
+            progress(done, n_songs)
+    elapsed = time.perf_counter() - start_time
+    stats = {
+        'songs': done,
+        'seconds': elapsed,
+        'songs_per_sec': done / elapsed if elapsed > 0 else float('inf'),
+        'out_dir': out_dir,
+    }
+    if cache_dir:
+        stats['cache_hits'] = cache_hits
+        stats['cache_misses'] = done * len(formats) - cache_hits
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a batch of songs from MUSIC_CFG in parallel")
+    parser.add_argument('-n', '--songs', type=int, default=100, help="number of songs to generate")
+    parser.add_argument('--seed', type=int, default=0, help="base seed; reruns with the same seed give the same files")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument('-o', '--out', default='songs', help="output directory")
+    parser.add_argument('--max-depth', type=int, default=5)
+    parser.add_argument('--formats', default='midi,musicxml', help="comma-separated: midi, musicxml, png")
+    parser.add_argument('--cache-dir', default=None, help="reuse rendered artifacts stored in this directory")
+    parser.add_argument('--cache-max-mb', type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help="cache size limit; least recently used entries are evicted")
+    parser.add_argument('--metrics-file', default=None,
+                        help="write cache hit/miss counters here in Prometheus text format")
+    parser.add_argument('--estimate', action='store_true',
+                        help="print the expected size of the batch and exit without generating")
+    args = parser.parse_args(argv)
+
+    if args.estimate:
+        from weighted_grammar import WeightedGrammar, estimate_batch
+
+        # generate_parse_tree chooses uniformly, so model it without MUSIC_CFG_WEIGHTS
+        estimate = estimate_batch(args.songs, WeightedGrammar(MUSIC_CFG, weights=None), max_depth=args.max_depth)
+        print(f"Expected per song: {estimate['nodes_per_song']:.1f} parse tree nodes, "
+              f"{estimate['notes_per_song']:.1f} notes, {estimate['chords_per_song']:.1f} chords")
+        print(f"Expected for {args.songs} songs: {estimate['total_nodes']:.0f} nodes, "
+              f"{estimate['total_notes']:.0f} notes")
+        return
+
+    def progress(done, total):
+        if done % 100 == 0 or done == total:
+            print(f"{done}/{total} songs", flush=True)
+
+    stats = generate_batch(args.songs, args.seed, args.workers, args.out,
+                           max_depth=args.max_depth, formats=args.formats.split(','),
+                           progress=progress, cache_dir=args.cache_dir,
+                           cache_max_bytes=int(args.cache_max_mb * 2**20))
+    print(f"Generated {stats['songs']} songs in {stats['seconds']:.2f}s "
+          f"({stats['songs_per_sec']:.1f} songs/sec) -> {stats['out_dir']}")
+    if args.cache_dir:
+        print(f"Cache: {stats['cache_hits']} hits, {stats['cache_misses']} misses")
+        if args.metrics_file:
+            counters = {'hits': stats['cache_hits'], 'misses': stats['cache_misses']}
+            with open(args.metrics_file, 'w') as f:
+                f.write(format_cache_metrics(counters))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,14 @@
 # music_parse_tree.py
+import argparse
 import random
-from graphviz import Digraph
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
 from music21 import stream, note, chord, tempo, meter, dynamics, instrument
 import os
-os.environ["PATH"] += os.pathsep + r"C:\Program Files\Graphviz-12.2.1-win64\bin"
-from PIL import ImageGrab
-import tkinter as tk
-from tkinter import Canvas
+
+# graphviz, tkinter and PIL are only imported when a visualization is requested,
+# so headless batch jobs never load GUI libraries
+GRAPHVIZ_BIN_DIR = r"C:\Program Files\Graphviz-12.2.1-win64\bin"
 
 # Recursive musical grammar with self-referential rules
 MUSIC_CFG = {
@@ -28,6 +30,28 @@ MUSIC_CFG = {
     'Outro': [['C4', 'G4', 'C4'], ['C4', 'E4', 'G4', 'C4']]
 }
 
+# Relative weight of each production, in MUSIC_CFG order; read by weighted_grammar.
+# All equal, so weighted sampling matches the uniform choice of generate_parse_tree
+# until a style is tuned here. Harmony weights apply to the progression of the same name.
+MUSIC_CFG_WEIGHTS = {
+    'Song': [1],
+    'Section': [1, 1, 1, 1],
+    'Intro': [1, 1],
+    'Verse': [1, 1],
+    'Chorus': [1],
+    'Bridge': [1, 1],
+    'Phrase': [1, 1, 1],
+    'NotePhrase': [1],
+    'ChordPhrase': [1],
+    'Note': [1, 1, 1, 1, 1, 1, 1],
+    'Chord': [1, 1, 1, 1],
+    'Harmony': [1, 1],
+    'Rest': [1],
+    'Outro': [1, 1]
+}
+
+STAR_CONTINUE = 0.7  # chance that a Kleene-star item like 'Section*' repeats once more
+
 CHORD_MAP = {
     'C_maj': ['C4', 'E4', 'G4'],
     'G7': ['G4', 'B4', 'D4', 'F4'],
@@ -40,215 +64,328 @@ HARMONIC_PROGRESSIONS = {
     'SimpleProgression': ['C_maj', 'G7', 'A_min', 'F_maj'],
 }
 
+
+class ProgressionCursor:
+    """Read position in a harmonic progression, shared by the ChordPhrase nodes under one Harmony"""
+    __slots__ = ('chords', 'position')
+
+    def __init__(self, chords):
+        self.chords = chords
+        self.position = 0
+
+    def next_chord(self):
+        """The next chord of the progression, or None once it is used up"""
+        position = self.position
+        if position < len(self.chords):
+            self.position = position + 1
+            return self.chords[position]
+        return None
+
 class ParseTreeNode:
     def __init__(self, symbol, children=None):
         self.symbol = symbol
         self.children = children or []
         self.id = id(self)
 
-def generate_parse_tree(grammar, start_symbol='Song', max_depth=5):
-    """Generate parse tree with recursion and depth limiting, incorporating harmonic progressions"""
-    def expand(symbol, depth, harmony_context=None):
-        if depth > max_depth:
-            return ParseTreeNode(symbol)
+def tree_accessors(tree):
+    """Return (root, symbol_of, children_of) for a ParseTreeNode or a CompactParseTree
 
-        if symbol == 'Harmony':
-            # Choose a harmonic progression
-            progression_name = random.choice(list(HARMONIC_PROGRESSIONS.keys()))
-            progression = HARMONIC_PROGRESSIONS[progression_name]
-            harmony_context = progression # Set harmony context for children
-            return ParseTreeNode(symbol, [ParseTreeNode(progression_name)]) # Store progression name in parse tree
+    Traversals written against these work on both the object tree and the array-backed
+    store in parse_tree_store, where nodes are integer indices.
+    """
+    if isinstance(tree, ParseTreeNode):
+        return tree, attrgetter('symbol'), attrgetter('children')
+    return (0, *tree.accessors())
 
-        if symbol == 'ChordPhrase':
-            if harmony_context:
-                # Use chord from harmonic progression
-                chord_symbol = harmony_context.pop(0) # Get next chord in progression
-                return ParseTreeNode(symbol, [ParseTreeNode(chord_symbol)])
-            else:
-                # Fallback to random chord if no harmony context
-                production = random.choice(grammar[symbol])
-                node = ParseTreeNode(symbol)
-                for sym in production:
-                    node.children.append(expand(sym, depth+1, harmony_context))
-                return node
+def generate_parse_tree(grammar, start_symbol='Song', max_depth=5, rng=None):
+    """Generate parse tree with recursion and depth limiting, incorporating harmonic progressions
+
+    Pass a random.Random instance as `rng` for a reproducible, independent stream;
+    by default the global `random` module is used. Expansion runs on an explicit stack,
+    so large `max_depth` values and long self-recursive phrases never hit the recursion limit.
+    """
+    rng = rng or random
 
+    def open_node(symbol, depth):
+        """Create the node for `symbol` and pick its production (None for leaves)"""
+        if depth > max_depth:
+            return ParseTreeNode(symbol), None
+
+        if symbol == 'Harmony':
+            # Choose a harmonic progression and store its name in the parse tree
+            progression_name = rng.choice(list(HARMONIC_PROGRESSIONS.keys()))
+            return ParseTreeNode(symbol, [ParseTreeNode(progression_name)]), None
 
         if symbol not in grammar:
-            return ParseTreeNode(symbol)
-
-        production = random.choice(grammar[symbol])
-        node = ParseTreeNode(symbol)
-        for sym in production:
-            if sym.endswith('*'):  # Handle Kleene star
-                while random.random() < 0.7:  # 70% chance to continue
-                    node.children.append(expand(sym[:-1], depth+1, harmony_context))
+            return ParseTreeNode(symbol), None
+
+        return ParseTreeNode(symbol), rng.choice(grammar[symbol])
+
+    root, production = open_node(start_symbol, 0)
+    if not production:
+        return root
+
+    # Frames are [node, production, next item, child depth, expand Kleene stars].
+    # The Harmony progression is never handed on to sibling nodes, so ChordPhrase
+    # always falls back to its productions, which it expands without star handling.
+    stack = [[root, production, 0, 1, start_symbol != 'ChordPhrase']]
+    while stack:
+        frame = stack[-1]
+        node, production, i, depth, stars = frame
+        if i == len(production):
+            stack.pop()
+            continue
+
+        sym = production[i]
+        if stars and sym.endswith('*'):  # Handle Kleene star
+            if rng.random() < STAR_CONTINUE:
+                sym = sym[:-1]
             else:
-                node.children.append(expand(sym, depth+1, harmony_context))
-        return node
-
-    return expand(start_symbol, 0)
+                frame[2] += 1
+                continue
+        else:
+            frame[2] += 1
+
+        child, child_production = open_node(sym, depth)
+        node.children.append(child)
+        if child_production:
+            stack.append([child, child_production, 0, depth + 1, sym != 'ChordPhrase'])
+    return root
+
+def _load_digraph():
+    """Import graphviz on first use, adding the local Graphviz install to PATH"""
+    if GRAPHVIZ_BIN_DIR not in os.environ["PATH"].split(os.pathsep):
+        os.environ["PATH"] += os.pathsep + GRAPHVIZ_BIN_DIR
+    from graphviz import Digraph
+    return Digraph
+
+def parse_tree_to_dot(parse_tree_root):
+    """Build a graphviz Digraph of the parse tree, numbering nodes in preorder"""
+    Digraph = _load_digraph()
+    root, symbol_of, children_of = tree_accessors(parse_tree_root)
+    dot = Digraph(comment='Parse Tree', format='png')
+    dot.node('0', symbol_of(root))
+    node_id = 1
+
+    # Each edge is added once the child's subtree is complete, as a recursive walk would
+    stack = [(iter(children_of(root)), 0)]
+    while stack:
+        children, current_id = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if stack:
+                dot.edge(str(stack[-1][1]), str(current_id))
+            continue
+        dot.node(str(node_id), symbol_of(child))
+        stack.append((iter(children_of(child)), node_id))
+        node_id += 1
+    return dot
 
 def visualize_parse_tree(parse_tree_root):
     """Visualize the parse tree using graphviz and save to parse_tree.png"""
-    dot = Digraph(comment='Parse Tree', format='png')
-    node_id = 0
+    dot = parse_tree_to_dot(parse_tree_root)
+    dot.render('parse_tree', view=False)  # Save to parse_tree.png
 
-    def add_nodes_edges(tree_node):
-        nonlocal node_id
-        current_id = node_id
-        dot.node(str(current_id), tree_node.symbol)
-        node_id += 1
-        for child in tree_node.children:
-            child_id = add_nodes_edges(child)
-            dot.edge(str(current_id), str(child_id))
-        return current_id
+STRUCTURE_CANVAS_SIZE = (1200, 800)
 
-    add_nodes_edges(parse_tree_root)
-    dot.render('parse_tree', view=False)  # Save to parse_tree.png
+def music21_structure_layout(score, canvas_width=STRUCTURE_CANVAS_SIZE[0]):
+    """Lay out the music21 stream structure as a parse tree of drawing primitives
+
+    Returns ('oval', box, fill), ('text', (x, y), text, font) and ('line', coords)
+    tuples, which visualize_music21_structure draws on a Tk canvas and
+    render_music21_structure_png draws headlessly with PIL.
+    """
+    shapes = []
+    parent_x, parent_y = canvas_width / 2, 50
+
+    # Start with the Song node
+    shapes.append(('oval', (parent_x-30, parent_y-30, parent_x+30, parent_y+30), "lightblue"))
+    shapes.append(('text', (parent_x, parent_y), "Song", ("Arial", 12, "bold")))
+
+    # Create section nodes
+    sections = ["Intro", "Verse", "Chorus", "Bridge", "Outro"]
+    section_width = canvas_width / (len(sections) + 1)
+
+    # Draw section nodes based on actual content
+    y_offset = 100
+    section_nodes = {}
+
+    for i, section in enumerate(sections):
+        section_x = (i + 1) * section_width
+        section_nodes[section] = (section_x, parent_y + y_offset)
+
+        # Draw section node
+        shapes.append(('oval', (section_x-25, parent_y+y_offset-25,
+                                section_x+25, parent_y+y_offset+25), "lightblue"))
+        shapes.append(('text', (section_x, parent_y+y_offset), section, ("Arial", 10)))
+        # Connect to parent
+        shapes.append(('line', (parent_x, parent_y+30, section_x, parent_y+y_offset-25)))
+
+    # Now extract the actual notes/chords and connect them to sections
+    notes_y = parent_y + y_offset + 100
+    notes_per_row = 10
+    note_spacing = canvas_width / (notes_per_row + 1)
+
+    flat_notes = [e for e in score.recurse().notes]
+
+    for i, note_obj in enumerate(flat_notes):
+        row = i // notes_per_row
+        col = i % notes_per_row
+
+        note_x = (col + 1) * note_spacing
+        note_y = notes_y + (row * 60)
+
+        # Determine parent section (simplified logic)
+        # In a real implementation, you'd analyze the temporal position
+        parent_section = sections[min(i // 5, len(sections)-1)]
+        parent_coords = section_nodes[parent_section]
+
+        # Draw note node
+        if 'Chord' in note_obj.classes:
+            node_text = '.'.join([p.nameWithOctave for p in note_obj.pitches])
+            fill_color = "#e6ccff"  # Light purple for chords
+        else:
+            node_text = note_obj.nameWithOctave
+            fill_color = "#ccffcc"  # Light green for notes
+
+        shapes.append(('oval', (note_x-20, note_y-20, note_x+20, note_y+20), fill_color))
+        shapes.append(('text', (note_x, note_y), node_text, ("Arial", 8)))
+
+        # Connect to parent section
+        shapes.append(('line', (parent_coords[0], parent_coords[1]+25, note_x, note_y-20)))
+
+    return shapes
 
 def visualize_music21_structure(score):
-    """Create a Tkinter visualization of the music21 stream structure as a parse tree and save it to an image file"""
+    """Create a Tkinter visualization of the music21 stream structure as a parse tree
+
+    Opens a window and blocks until it is closed; use render_visualizations on
+    machines without a display.
+    """
+    import tkinter as tk
+    from tkinter import Canvas
+
     root_tk = tk.Tk()
     root_tk.title("Music21 Structure Visualization")
-    # root_tk.withdraw()  # Hide the window - now we want to show it
-
-    canvas_width = 1200
-    canvas_height = 800
 
+    canvas_width, canvas_height = STRUCTURE_CANVAS_SIZE
     canvas = Canvas(root_tk, width=canvas_width, height=canvas_height, bg="white")
     canvas.pack()
 
-    # Extract music21 structure
-    def extract_structure(element, parent_x, parent_y, level=0):
-        # Start with the Song node
-        if level == 0:
-            canvas.create_oval(parent_x-30, parent_y-30, parent_x+30, parent_y+30, fill="lightblue")
-            canvas.create_text(parent_x, parent_y, text="Song", font=("Arial", 12, "bold"))
-
-            # Create section nodes
-            sections = ["Intro", "Verse", "Chorus", "Bridge", "Outro"]
-            section_width = canvas_width / (len(sections) + 1)
-
-            # Draw section nodes based on actual content
-            y_offset = 100
-            current_section = None
-            section_nodes = {}
-
-            for i, section in enumerate(sections):
-                section_x = (i + 1) * section_width
-                section_nodes[section] = (section_x, parent_y + y_offset)
-
-                
-                section_exists = True 
-
-                if section_exists:
-                    # Draw section node
-                    canvas.create_oval(section_x-25, parent_y+y_offset-25,
-                                      section_x+25, parent_y+y_offset+25,
-                                      fill="lightblue")
-                    canvas.create_text(section_x, parent_y+y_offset,
-                                      text=section, font=("Arial", 10))
-                    # Connect to parent
-                    canvas.create_line(parent_x, parent_y+30,
-                                      section_x, parent_y+y_offset-25)
-
-            # Now extract the actual notes/chords and connect them to sections
-            notes_y = parent_y + y_offset + 100
-            notes_per_row = 10
-            note_spacing = canvas_width / (notes_per_row + 1)
-
-            flat_notes = [e for e in element.recurse().notes]
-
-            for i, note_obj in enumerate(flat_notes):
-                row = i // notes_per_row
-                col = i % notes_per_row
-
-                note_x = (col + 1) * note_spacing
-                note_y = notes_y + (row * 60)
-
-                # Determine parent section (simplified logic)
-                # In a real implementation, you'd analyze the temporal position
-                parent_section = sections[min(i // 5, len(sections)-1)]
-                parent_coords = section_nodes[parent_section]
-
-                # Draw note node
-                if 'Chord' in note_obj.classes:
-                    node_text = '.'.join([p.nameWithOctave for p in note_obj.pitches])
-                    fill_color = "#e6ccff"  # Light purple for chords
-                else:
-                    node_text = note_obj.nameWithOctave
-                    fill_color = "#ccffcc"  # Light green for notes
-
-                canvas.create_oval(note_x-20, note_y-20, note_x+20, note_y+20,
-                                  fill=fill_color)
-                canvas.create_text(note_x, note_y, text=node_text,
-                                  font=("Arial", 8))
-
-                # Connect to parent section
-                canvas.create_line(parent_coords[0], parent_coords[1]+25,
-                                  note_x, note_y-20)
-
-    # Start visualization with the score
-    extract_structure(score, canvas_width/2, 50)
-
-    
-    # try:
-    #     canvas.update()
-    #     image = ImageGrab.grab(bbox=(0, 0, canvas_width, canvas_height))
-    #     image.save("music21_structure.png")
-    #     print("Parse tree visualization saved as music21_structure.png")
-    # except Exception as e:
-    #     print(f"Error saving visualization: {str(e)}")
-
-    # root_tk.destroy() 
-    root_tk.mainloop() # Keep the window open
+    for shape in music21_structure_layout(score, canvas_width):
+        if shape[0] == 'oval':
+            canvas.create_oval(*shape[1], fill=shape[2])
+        elif shape[0] == 'text':
+            canvas.create_text(*shape[1], text=shape[2], font=shape[3])
+        else:
+            canvas.create_line(*shape[1])
 
+    root_tk.mainloop() # Keep the window open
 
-def parse_tree_to_music(node):
-    """Convert parse tree to music21 stream, incorporating harmonic progressions"""
+def render_music21_structure_png(shapes, path="music21_structure.png"):
+    """Draw a music21_structure_layout with PIL and save it as a PNG, no display needed"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    image = Image.new("RGB", STRUCTURE_CANVAS_SIZE, "white")
+    draw = ImageDraw.Draw(image)
+    fonts = {}
+    for shape in shapes:
+        if shape[0] == 'oval':
+            draw.ellipse(shape[1], fill=shape[2], outline="black")
+        elif shape[0] == 'text':
+            size = shape[3][1]
+            if size not in fonts:
+                fonts[size] = ImageFont.load_default(size=size + 4)
+            draw.text(shape[1], shape[2], fill="black", font=fonts[size], anchor="mm")
+        else:
+            draw.line(shape[1], fill="black")
+    image.save(path)
+    return path
+
+_visualization_executor = None
+
+def render_visualizations(parse_tree, score, parse_tree_path='parse_tree',
+                          structure_path='music21_structure.png', background=True):
+    """Render parse_tree.png (graphviz) and music21_structure.png (PIL) without Tk
+
+    The score is read in the calling thread; drawing and the graphviz subprocess run
+    on a background thread, so with background=True this returns a Future at once.
+    Its result is the list of written image paths.
+    """
+    global _visualization_executor
+    shapes = music21_structure_layout(score)
+
+    def render():
+        # The PIL image first: it needs no external binaries, unlike graphviz's dot
+        paths = [render_music21_structure_png(shapes, structure_path)]
+        dot = parse_tree_to_dot(parse_tree)
+        paths.append(dot.render(parse_tree_path, view=False))  # Save to parse_tree.png
+        return paths
+
+    if not background:
+        return render()
+    if _visualization_executor is None:
+        _visualization_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='visualize')
+    return _visualization_executor.submit(render)
+
+
+def parse_tree_to_music(node, rng=None):
+    """Convert parse tree (ParseTreeNode or CompactParseTree) to music21 stream, incorporating harmonic progressions"""
+    rng = rng or random
     score = stream.Score()
     score.append(tempo.MetronomeMark(number=120))
     part = stream.Part()
 
-    def traverse(n, current_stream, harmony_progression=None):
-        if n.symbol == 'Harmony':
+    # Depth-first walk on an explicit stack; every entry carries the harmony progression
+    # inherited from its ancestors, shared so ChordPhrase nodes consume it in order
+    root, symbol_of, children_of = tree_accessors(node)
+    stack = [(root, None)]
+    while stack:
+        n, harmony_progression = stack.pop()
+        symbol = symbol_of(n)
+        children = children_of(n)
+        if symbol == 'Harmony':
             # Get the progression name from the child node
-            if not n.children:
-                print(f"Error: Harmony node has no children! Node: {n.symbol}")
-                return
-            progression_name_node = n.children[0]
-            progression_name = progression_name_node.symbol
-            harmony_progression = list(HARMONIC_PROGRESSIONS[progression_name]) # Create a copy to avoid modifying original
-
-        if n.symbol == 'ChordPhrase':
-            if harmony_progression:
-                if harmony_progression: # Check again in case progression is empty
-                    chord_symbol = harmony_progression.pop(0)
-                    current_stream.append(chord.Chord(CHORD_MAP[chord_symbol]))
-            else: # Fallback to random chord if no harmony context (shouldn't happen in Chorus)
-                chord_choice = random.choice(list(CHORD_MAP.keys()))
-                current_stream.append(chord.Chord(CHORD_MAP[chord_choice]))
-        elif n.symbol in CHORD_MAP:
-            current_stream.append(chord.Chord(CHORD_MAP[n.symbol]))
-        elif n.symbol == 'r1':
-            current_stream.append(note.Rest(quarterLength=1))
-        elif len(n.symbol) == 2 and n.symbol[1] == '4':
-            current_stream.append(note.Note(n.symbol))
-        for child in n.children:
-            traverse(child, current_stream, harmony_progression)
-
-    traverse(node, part)
+            if not children:
+                print(f"Error: Harmony node has no children! Node: {symbol}")
+                continue
+            progression_name_node = children[0]
+            progression_name = symbol_of(progression_name_node)
+            # Walked by index rather than copied and popped from the front
+            harmony_progression = ProgressionCursor(HARMONIC_PROGRESSIONS[progression_name])
+
+        if symbol == 'ChordPhrase':
+            chord_symbol = harmony_progression.next_chord() if harmony_progression else None
+            if chord_symbol is None: # Fallback to random chord if no harmony context (shouldn't happen in Chorus)
+                chord_symbol = rng.choice(list(CHORD_MAP.keys()))
+            part.append(chord.Chord(CHORD_MAP[chord_symbol]))
+        elif symbol in CHORD_MAP:
+            part.append(chord.Chord(CHORD_MAP[symbol]))
+        elif symbol == 'r1':
+            part.append(note.Rest(quarterLength=1))
+        elif len(symbol) == 2 and symbol[1] == '4':
+            part.append(note.Note(symbol))
+        stack.extend((child, harmony_progression) for child in reversed(children))
+
     score.append(part)
     return score
 
-def main():
-    # Generate and visualize parse tree
-    parse_tree = generate_parse_tree(MUSIC_CFG)
-    visualize_parse_tree(parse_tree) # Visualize parse tree using graphviz
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a song from MUSIC_CFG")
+    parser.add_argument('--no-visualize', action='store_true',
+                        help="skip the parse tree and structure images")
+    parser.add_argument('--show', action='store_true',
+                        help="also open the interactive Tk structure window (needs a display)")
+    args = parser.parse_args(argv)
 
-    # Generate music
+    # Generate parse tree and music
+    parse_tree = generate_parse_tree(MUSIC_CFG)
     score = parse_tree_to_music(parse_tree)
 
+    # Images render in the background while the scores are written
+    visualization = None if args.no_visualize else render_visualizations(parse_tree, score)
+
     # Save outputs
     score.write('midi', fp='recursive_music.mid')
     score.write('musicxml', fp='recursive_score.mxml')
@@ -263,8 +400,16 @@ def main():
     print("\nMusical structure:")
     score.show('text')
 
-    visualize_music21_structure(score)
-   
+    if visualization is not None:
+        try:
+            for path in visualization.result():
+                print(f"Saved visualization: {path}")
+        except Exception as e:
+            print(f"Error rendering visualizations: {str(e)}")
+
+    if args.show:
+        visualize_music21_structure(score)
+
 
 if __name__ == "__main__":
     main()
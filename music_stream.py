@@ -0,0 +1,123 @@
+# music_stream.py
+import random
+
+from grammar_compiler import compile_grammar
+from midi_writer import CHORD_PITCHES, MidiStreamWriter, note_name_to_midi
+from music_env import CHORD_MAP, HARMONIC_PROGRESSIONS, MUSIC_CFG, STAR_CONTINUE, ProgressionCursor
+
+_CHORD_NAMES = list(CHORD_MAP.keys())
+_compiled_cache = {}
+
+
+def _terminal_event(symbol):
+    """The (kind, symbol, pitches) event a parse-tree leaf renders to, or None"""
+    if symbol in CHORD_PITCHES:
+        return ('chord', symbol, CHORD_PITCHES[symbol])
+    if symbol == 'r1':
+        return ('rest', symbol, ())
+    if len(symbol) == 2 and symbol[1] == '4':
+        return ('note', symbol, (note_name_to_midi(symbol),))
+    return None
+
+
+def _compiled_for(grammar):
+    # Grammars are plain dicts, so cache by identity; MUSIC_CFG is compiled once per process
+    entry = _compiled_cache.get(id(grammar))
+    if entry is None or entry[0] is not grammar:
+        compiled = compile_grammar(grammar)
+        events = tuple(_terminal_event(symbol) for symbol in compiled.symbols)
+        entry = _compiled_cache[id(grammar)] = (grammar, compiled, events)
+    return entry[1], entry[2]
+
+
+def iter_song_events(grammar=MUSIC_CFG, start_symbol='Song', max_depth=5, rng=None, render_rng=None):
+    """Expand `grammar` and yield each note, chord and rest as soon as its node is expanded
+
+    Events are (kind, symbol, pitches) tuples with kind 'note', 'chord' or 'rest' and a
+    quarter-note duration each. Only the current branch of the tree is kept, so memory is
+    bounded by `max_depth` however many Section* repetitions a song draws.
+
+    The grammar draws from `rng` exactly as generate_parse_tree does and fallback chords
+    from `render_rng` as parse_tree_to_music does, so with two separate generators the
+    events match parse_tree_to_music(generate_parse_tree(..., rng=rng), rng=render_rng).
+    """
+    rng = rng or random
+    render_rng = render_rng or rng
+    compiled, leaf_events = _compiled_for(grammar)
+    getrandbits = rng.getrandbits
+    rand = rng.random
+    symbols = compiled.symbols
+    productions = compiled.productions
+    choice_bits = compiled.choice_bits
+    is_terminal = compiled.is_terminal
+    star_base = compiled.star_base
+    harmony_id = compiled.harmony_id
+    chord_phrase_id = compiled.chord_phrase_id
+    progression_ids = compiled.progression_ids
+    n_progressions = len(progression_ids)
+    progression_bits = n_progressions.bit_length()
+
+    if start_symbol not in compiled.symbol_ids:
+        raise KeyError(f"Unknown start symbol: {start_symbol!r}")
+
+    # Pending items are (symbol id, depth, expand Kleene stars, harmony progression),
+    # popped in preorder; see grammar_compiler.expand_preorder for the star handling
+    stack = [(compiled.symbol_ids[start_symbol], 0, False, None)]
+    while stack:
+        item = stack.pop()
+        sym_id, depth, stars, harmony_progression = item
+        if stars:
+            base_id = star_base[sym_id]
+            if base_id >= 0:
+                if rand() >= STAR_CONTINUE:
+                    continue
+                stack.append(item)
+                sym_id = base_id
+
+        if sym_id == chord_phrase_id:
+            # ChordPhrase sounds a chord of its own before its children are expanded
+            chord_symbol = harmony_progression.next_chord() if harmony_progression else None
+            if chord_symbol is None:
+                chord_symbol = render_rng.choice(_CHORD_NAMES)
+            yield ('chord', chord_symbol, CHORD_PITCHES[chord_symbol])
+        else:
+            event = leaf_events[sym_id]
+            if event is not None:
+                yield event
+
+        if depth > max_depth or is_terminal[sym_id]:
+            continue
+
+        if sym_id == harmony_id:
+            r = getrandbits(progression_bits)
+            while r >= n_progressions:
+                r = getrandbits(progression_bits)
+            # The chosen progression applies to the Harmony subtree, its name leaf
+            progression_name = symbols[progression_ids[r]]
+            harmony_progression = ProgressionCursor(HARMONIC_PROGRESSIONS.get(progression_name, ()))
+            stack.append((progression_ids[r], depth + 1, False, harmony_progression))
+            continue
+
+        options = productions[sym_id]
+        n, k = len(options), choice_bits[sym_id]
+        r = getrandbits(k)
+        while r >= n:
+            r = getrandbits(k)
+        stars = sym_id != chord_phrase_id
+        for child_id in reversed(options[r]):
+            stack.append((child_id, depth + 1, stars, harmony_progression))
+
+
+def write_events_to_midi(events, fp):
+    """Write an event stream to MIDI file `fp` incrementally; returns the number of events written"""
+    count = 0
+    with open(fp, 'wb') as f, MidiStreamWriter(f) as writer:
+        for _, _, pitches in events:
+            writer.add_notes(pitches)
+            count += 1
+    return count
+
+
+def stream_song_to_midi(fp, grammar=MUSIC_CFG, max_depth=5, rng=None, render_rng=None):
+    """Generate a song straight into a MIDI file without building a tree or Score"""
+    return write_events_to_midi(iter_song_events(grammar, max_depth=max_depth, rng=rng, render_rng=render_rng), fp)
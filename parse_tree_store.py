@@ -0,0 +1,193 @@
+# parse_tree_store.py
+import json
+import os
+
+import numpy as np
+
+from music_env import ParseTreeNode
+
+SYMBOL_DTYPE = np.uint16
+INDEX_DTYPE = np.int32
+ARRAY_FIELDS = ('sym', 'parent', 'first_child', 'next_sibling')
+
+
+class CompactParseTree:
+    """Struct-of-arrays parse tree stored in preorder, with the root at index 0
+
+    Node i has symbol `symbols[sym[i]]`; `parent`, `first_child` and `next_sibling` hold
+    node indices, or -1 where there is none. That is 14 bytes per node plus the shared
+    symbol table, and the arrays may be read-only memory maps from a saved batch.
+    """
+
+    def __init__(self, symbols, sym, parent, first_child, next_sibling):
+        self.symbols = symbols
+        self.sym = sym
+        self.parent = parent
+        self.first_child = first_child
+        self.next_sibling = next_sibling
+
+    def __len__(self):
+        return len(self.sym)
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, field).nbytes for field in ARRAY_FIELDS)
+
+    @classmethod
+    def from_preorder(cls, symbols, sym_ids, child_counts):
+        """Build from flat preorder (symbol id, child count) lists, as grammar_compiler emits them
+
+        `symbols` is shared with the new tree, not copied, so trees generated from one
+        compiled grammar all point at its single symbol table.
+        """
+        n = len(sym_ids)
+        parent = [-1] * n
+        first_child = [-1] * n
+        next_sibling = [-1] * n
+        stack = []  # [node index, children still to attach, previous child]
+        for i, count in enumerate(child_counts):
+            if stack:
+                top = stack[-1]
+                parent[i] = top[0]
+                if top[2] < 0:
+                    first_child[top[0]] = i
+                else:
+                    next_sibling[top[2]] = i
+                top[2] = i
+                top[1] -= 1
+                if not top[1]:
+                    stack.pop()
+            if count:
+                stack.append([i, count, -1])
+        return cls(symbols,
+                   np.array(sym_ids, dtype=SYMBOL_DTYPE),
+                   np.array(parent, dtype=INDEX_DTYPE),
+                   np.array(first_child, dtype=INDEX_DTYPE),
+                   np.array(next_sibling, dtype=INDEX_DTYPE))
+
+    @classmethod
+    def from_node(cls, root, symbols=None):
+        """Convert a ParseTreeNode tree; `symbols` is an existing table to extend, if any"""
+        symbols = list(symbols or [])
+        symbol_ids = {name: i for i, name in enumerate(symbols)}
+        sym_ids = []
+        child_counts = []
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            sym_id = symbol_ids.get(node.symbol)
+            if sym_id is None:
+                sym_id = symbol_ids[node.symbol] = len(symbols)
+                symbols.append(node.symbol)
+            sym_ids.append(sym_id)
+            child_counts.append(len(node.children))
+            stack.extend(reversed(node.children))
+        return cls.from_preorder(symbols, sym_ids, child_counts)
+
+    def to_node(self):
+        """Rebuild the equivalent ParseTreeNode tree"""
+        symbols = self.symbols
+        nodes = [ParseTreeNode(symbols[sym_id]) for sym_id in self.sym.tolist()]
+        for i, parent in enumerate(self.parent.tolist()):
+            if parent >= 0:
+                nodes[parent].children.append(nodes[i])
+        return nodes[0]
+
+    def symbol_of(self, i):
+        return self.symbols[self.sym[i]]
+
+    def children_of(self, i):
+        children = []
+        child = int(self.first_child[i])
+        while child >= 0:
+            children.append(child)
+            child = int(self.next_sibling[child])
+        return children
+
+    def accessors(self):
+        """(symbol_of, children_of) for one whole traversal
+
+        Python lists index several times faster than NumPy scalars in per-node loops, so
+        these read list copies of the arrays. The copies belong to the returned functions
+        and are freed with them; the tree itself keeps only its arrays.
+        """
+        symbols = self.symbols
+        sym = self.sym.tolist()
+        first_child = self.first_child.tolist()
+        next_sibling = self.next_sibling.tolist()
+
+        def symbol_of(i):
+            return symbols[sym[i]]
+
+        def children_of(i):
+            children = []
+            child = first_child[i]
+            while child >= 0:
+                children.append(child)
+                child = next_sibling[child]
+            return children
+        return symbol_of, children_of
+
+
+class TreeBatch:
+    """Many CompactParseTrees in shared, concatenated arrays; tree k is nodes offsets[k]:offsets[k+1]"""
+
+    def __init__(self, symbols, arrays, offsets):
+        self.symbols = symbols
+        self.arrays = arrays
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += len(self)
+        if not 0 <= k < len(self):
+            raise IndexError("tree index out of range")
+        start, stop = int(self.offsets[k]), int(self.offsets[k + 1])
+        return CompactParseTree(self.symbols, *(self.arrays[field][start:stop] for field in ARRAY_FIELDS))
+
+    def __iter__(self):
+        return (self[k] for k in range(len(self)))
+
+
+def save_batch(path, trees):
+    """Save CompactParseTrees to directory `path` as raw .npy arrays plus a JSON symbol table"""
+    symbols = []
+    symbol_ids = {}
+    parts = {field: [] for field in ARRAY_FIELDS}
+    offsets = [0]
+    for tree in trees:
+        # Trees may carry different symbol tables; remap them onto one shared table
+        remap = []
+        for name in tree.symbols:
+            if name not in symbol_ids:
+                symbol_ids[name] = len(symbols)
+                symbols.append(name)
+            remap.append(symbol_ids[name])
+        parts['sym'].append(np.asarray(remap, dtype=SYMBOL_DTYPE)[tree.sym])
+        for field in ARRAY_FIELDS[1:]:
+            parts[field].append(getattr(tree, field))
+        offsets.append(offsets[-1] + len(tree))
+
+    os.makedirs(path, exist_ok=True)
+    for field in ARRAY_FIELDS:
+        dtype = SYMBOL_DTYPE if field == 'sym' else INDEX_DTYPE
+        data = np.concatenate(parts[field]).astype(dtype, copy=False) if parts[field] else np.empty(0, dtype)
+        np.save(os.path.join(path, field + '.npy'), data, allow_pickle=False)
+    np.save(os.path.join(path, 'offsets.npy'), np.asarray(offsets, dtype=np.int64), allow_pickle=False)
+    with open(os.path.join(path, 'symbols.json'), 'w') as f:
+        json.dump(symbols, f)
+    return path
+
+
+def load_batch(path, mmap=True):
+    """Load a batch saved by save_batch; arrays are read-only memory maps unless mmap=False"""
+    mmap_mode = 'r' if mmap else None
+    with open(os.path.join(path, 'symbols.json')) as f:
+        symbols = json.load(f)
+    arrays = {field: np.load(os.path.join(path, field + '.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+              for field in ARRAY_FIELDS}
+    offsets = np.load(os.path.join(path, 'offsets.npy'), allow_pickle=False)
+    return TreeBatch(symbols, arrays, offsets)
@@ -0,0 +1,100 @@
+# stdp_events.py
+import numpy as np
+
+from BPNA import A_minus, A_plus, dt, p_post, p_pre, stdp_updates, tau_minus, tau_plus, w0
+from stdp_network import STDPNetwork
+from stdp_recording import spike_generators
+
+
+def poisson_spike_times(rng, n_steps, p):
+    """Sorted spike steps of a train that fires with probability `p` per step
+
+    Gaps between spikes of a per-step Bernoulli process are geometric, so drawing them
+    directly gives the same process as `rng.random(n_steps) < p` in O(spikes) time.
+    """
+    if p <= 0:
+        return np.empty(0, dtype=np.int64)
+    expected = n_steps * p
+    batch = int(expected + 6 * np.sqrt(expected)) + 16
+    times = np.cumsum(rng.geometric(p, batch)) - 1
+    parts = [times]
+    while parts[-1][-1] < n_steps:
+        parts.append(parts[-1][-1] + np.cumsum(rng.geometric(p, batch)))
+    times = np.concatenate(parts)
+    return times[:np.searchsorted(times, n_steps)]
+
+
+def poisson_spike_events(rng, n_steps, n_neurons, p):
+    """(steps, neuron ids) of independent Poisson trains, sorted by step and then by neuron"""
+    rates = np.broadcast_to(p, (n_neurons,))
+    trains = [poisson_spike_times(rng, n_steps, rate) for rate in rates.tolist()]
+    steps = np.concatenate(trains)
+    ids = np.repeat(np.arange(n_neurons), [len(train) for train in trains])
+    order = np.lexsort((ids, steps))
+    return steps[order], ids[order]
+
+
+def trace_updates(pre_times, post_times, w_init=w0, A_plus=A_plus, A_minus=A_minus, tau_plus=tau_plus,
+                  tau_minus=tau_minus, dt=dt, w_min=0.0, w_max=1.0):
+    """(spike steps, weight after each) for one synapse under STDPNetwork's trace rule
+
+    Traces are decayed analytically from one spike to the next; the weights equal a
+    1 x 1 STDPNetwork run on the same spikes, sampled at every spike.
+    """
+    decay_pre = np.exp(-dt / tau_plus)
+    decay_post = np.exp(-dt / tau_minus)
+    steps = np.union1d(pre_times, post_times)
+    is_pre = np.isin(steps, pre_times).tolist()
+    is_post = np.isin(steps, post_times).tolist()
+    weights = np.empty(len(steps))
+
+    w = w_init
+    pre_trace = post_trace = 0.0
+    previous = -1
+    for k, step in enumerate(steps.tolist()):
+        gap = step - previous
+        previous = step
+        pre_trace *= decay_pre ** gap
+        post_trace *= decay_post ** gap
+        if is_pre[k]:
+            w = min(max(w - A_minus * post_trace, w_min), w_max)
+        if is_post[k]:
+            w = min(max(w + A_plus * pre_trace, w_min), w_max)
+        pre_trace += is_pre[k]
+        post_trace += is_post[k]
+        weights[k] = w
+    return steps, weights
+
+
+def simulate_pair_events(n_steps, p_pre=p_pre, p_post=p_post, seed=42, mode='window', **params):
+    """Event-driven single-synapse run; returns (pre times, post times, update steps, weights)
+
+    mode='window' applies BPNA.py's pair rule (see BPNA.stdp_updates), mode='trace' the
+    trace rule of stdp_network. Nothing is allocated per timestep.
+    """
+    pre_rng, post_rng = spike_generators(seed)
+    pre_times = poisson_spike_times(pre_rng, n_steps, p_pre)
+    post_times = poisson_spike_times(post_rng, n_steps, p_post)
+    if mode == 'window':
+        steps, weights = stdp_updates(pre_times, post_times, **params)
+    elif mode == 'trace':
+        steps, weights = trace_updates(pre_times, post_times, **params)
+    else:
+        raise ValueError(f"Unknown STDP mode: {mode!r}")
+    return pre_times, post_times, steps, weights
+
+
+def weights_at(steps, update_steps, weights, w_init=w0):
+    """Sample an event trajectory at arbitrary timesteps, e.g. to compare with a dense run"""
+    idx = np.searchsorted(update_steps, steps, side='right') - 1
+    return np.where(idx >= 0, weights[np.maximum(idx, 0)], w_init)
+
+
+def simulate_network_events(n_pre, n_post, n_steps, p_pre=p_pre, p_post=p_post, seed=42, **network_kwargs):
+    """Event-driven counterpart of stdp_network.simulate_network; returns the network summary()"""
+    pre_rng, post_rng = spike_generators(seed)
+    pre_steps, pre_ids = poisson_spike_events(pre_rng, n_steps, n_pre, p_pre)
+    post_steps, post_ids = poisson_spike_events(post_rng, n_steps, n_post, p_post)
+    network = STDPNetwork(n_pre, n_post, **network_kwargs)
+    network.run_events(pre_steps, pre_ids, post_steps, post_ids, n_steps)
+    return network.summary()
@@ -0,0 +1,148 @@
+# stdp_network.py
+import numpy as np
+
+from BPNA import A_minus, A_plus, dt, p_post, p_pre, tau_minus, tau_plus, w0
+
+DEFAULT_BLOCK_STEPS = 1024
+HISTOGRAM_BINS = 10
+
+
+def poisson_spikes(rng, n_steps, n_neurons, p):
+    """Bernoulli spike trains, shape (n_steps, n_neurons); `p` is a scalar or per-neuron probability"""
+    return rng.random((n_steps, n_neurons)) < p
+
+
+class STDPNetwork:
+    """N pre- and M post-synaptic neurons joined by an N x M weight matrix under trace-based STDP
+
+    Each neuron keeps an exponentially decaying trace of its own spikes. A post spike
+    potentiates its column by A_plus times the pre traces, and a pre spike depresses its
+    row by A_minus times the post traces; with no clipping this equals all-to-all pair-based
+    STDP, without any window scan. Spikes in the same step do not pair, as in BPNA.py.
+    """
+
+    def __init__(self, n_pre, n_post, w_init=w0, A_plus=A_plus, A_minus=A_minus, tau_plus=tau_plus,
+                 tau_minus=tau_minus, dt=dt, w_min=0.0, w_max=1.0, dtype=np.float64):
+        self.dtype = np.dtype(dtype)
+        self.n_pre = n_pre
+        self.n_post = n_post
+        self.A_plus = A_plus
+        self.A_minus = A_minus
+        self.w_min = w_min
+        self.w_max = w_max
+        self.decay_pre = np.exp(-dt / tau_plus)
+        self.decay_post = np.exp(-dt / tau_minus)
+        self.w = np.full((n_pre, n_post), w_init, dtype=self.dtype)
+        self.w_initial_mean = float(self.w.mean())
+        self.pre_trace = np.zeros(n_pre, dtype=self.dtype)
+        self.post_trace = np.zeros(n_post, dtype=self.dtype)
+        self.steps = 0
+        self.pre_spike_count = 0
+        self.post_spike_count = 0
+        self.ltp_updates = 0
+        self.ltd_updates = 0
+        self._idle_steps = 0  # steps since the traces were last decayed
+
+    @property
+    def nbytes(self):
+        return self.w.nbytes + self.pre_trace.nbytes + self.post_trace.nbytes
+
+    def _decay(self, steps):
+        if steps:
+            self.pre_trace *= self.dtype.type(self.decay_pre ** steps)
+            self.post_trace *= self.dtype.type(self.decay_post ** steps)
+
+    def run(self, pre_spikes, post_spikes):
+        """Advance by one block of boolean spike rasters, shapes (steps, N) and (steps, M)"""
+        # np.nonzero walks rows first, so spikes come out sorted by step
+        pre_steps, pre_ids = np.nonzero(pre_spikes)
+        post_steps, post_ids = np.nonzero(post_spikes)
+        return self.run_events(pre_steps, pre_ids, post_steps, post_ids, len(pre_spikes))
+
+    def run_events(self, pre_steps, pre_ids, post_steps, post_ids, n_steps):
+        """Advance by `n_steps` given only the spikes, as step indices sorted in time plus neuron ids
+
+        Steps count from the start of this block. Nothing is done for silent steps, so the
+        cost follows the number of spikes rather than `n_steps`.
+        """
+        w = self.w
+        pre_trace = self.pre_trace
+        post_trace = self.post_trace
+        active_steps = np.union1d(pre_steps, post_steps)
+        pre_bounds = np.searchsorted(pre_steps, active_steps, side='right').tolist()
+        post_bounds = np.searchsorted(post_steps, active_steps, side='right').tolist()
+
+        previous = -1
+        pre_start = post_start = 0
+        for step, pre_stop, post_stop in zip(active_steps.tolist(), pre_bounds, post_bounds):
+            # Traces decay analytically across silent steps
+            self._decay(self._idle_steps + step - previous)
+            self._idle_steps = 0
+            previous = step
+            pre_active = pre_ids[pre_start:pre_stop]
+            post_active = post_ids[post_start:post_stop]
+            pre_start, post_start = pre_stop, post_stop
+
+            # Rows and columns are updated through views, one spiking neuron at a time
+            if pre_active.size:
+                depression = self.A_minus * post_trace
+                for i in pre_active.tolist():
+                    row = w[i]
+                    row -= depression
+                    np.clip(row, self.w_min, self.w_max, out=row)
+                self.ltd_updates += pre_active.size * np.count_nonzero(post_trace)
+            if post_active.size:
+                potentiation = self.A_plus * pre_trace
+                for j in post_active.tolist():
+                    col = w[:, j]
+                    col += potentiation
+                    np.clip(col, self.w_min, self.w_max, out=col)
+                self.ltp_updates += post_active.size * np.count_nonzero(pre_trace)
+
+            # This step's spikes only pair with later ones
+            pre_trace[pre_active] += 1
+            post_trace[post_active] += 1
+            self.pre_spike_count += pre_active.size
+            self.post_spike_count += post_active.size
+
+        self._idle_steps += n_steps - 1 - previous
+        self.steps += n_steps
+        return self
+
+    def summary(self):
+        """Summary statistics of the weights and of the plasticity seen so far"""
+        w = self.w
+        counts, edges = np.histogram(w, bins=HISTOGRAM_BINS, range=(self.w_min, self.w_max))
+        mean = float(w.mean(dtype=np.float64))
+        return {
+            'steps': self.steps,
+            'synapses': w.size,
+            'mean_weight': mean,
+            'std_weight': float(w.std(dtype=np.float64)),
+            'min_weight': float(w.min()),
+            'max_weight': float(w.max()),
+            'mean_drift': mean - self.w_initial_mean,
+            'fraction_at_min': float(np.count_nonzero(w <= self.w_min)) / w.size,
+            'fraction_at_max': float(np.count_nonzero(w >= self.w_max)) / w.size,
+            'weight_histogram': counts.tolist(),
+            'histogram_edges': edges.tolist(),
+            'pre_spikes': self.pre_spike_count,
+            'post_spikes': self.post_spike_count,
+            'ltp_updates': self.ltp_updates,
+            'ltd_updates': self.ltd_updates,
+        }
+
+
+def simulate_network(n_pre, n_post, n_steps, p_pre=p_pre, p_post=p_post, seed=42,
+                     block_steps=DEFAULT_BLOCK_STEPS, **network_kwargs):
+    """Run an STDPNetwork on Poisson spike trains and return its summary()
+
+    Spikes are drawn `block_steps` timesteps at a time, so memory holds the weight matrix
+    and one block of rasters however long the simulation runs.
+    """
+    rng = np.random.default_rng(seed)
+    network = STDPNetwork(n_pre, n_post, **network_kwargs)
+    for start in range(0, n_steps, block_steps):
+        steps = min(block_steps, n_steps - start)
+        network.run(poisson_spikes(rng, steps, n_pre, p_pre), poisson_spikes(rng, steps, n_post, p_post))
+    return network.summary()
@@ -0,0 +1,211 @@
+# stdp_recording.py
+import argparse
+import json
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from BPNA import (A_minus, A_plus, T, clipped_cumsum, dt, p_post, p_pre, spike_pairs, stdp_kernel,
+                  tau_minus, tau_plus, w0, window)
+
+DEFAULT_CHUNK_STEPS = 1_000_000
+DEFAULT_PLOT_POINTS = 5000
+WEIGHTS_FILE = 'weights.npy'
+PRE_SPIKES_FILE = 'pre_spikes.bin'
+POST_SPIKES_FILE = 'post_spikes.bin'
+META_FILE = 'meta.json'
+SPIKE_DTYPE = np.int64
+
+
+def spike_generators(seed):
+    """Independent generators for the pre and post trains, so the chunk size never changes the spikes"""
+    pre_seq, post_seq = np.random.SeedSequence(seed).spawn(2)
+    return np.random.default_rng(pre_seq), np.random.default_rng(post_seq)
+
+
+def simulate_chunked(path, n_steps, chunk_steps=DEFAULT_CHUNK_STEPS, decimate=1, seed=42, p_pre=p_pre,
+                     p_post=p_post, w_init=w0, A_plus=A_plus, A_minus=A_minus, tau_plus=tau_plus,
+                     tau_minus=tau_minus, window=window, weight_dtype=np.float64):
+    """Run BPNA.py's pair-based STDP `chunk_steps` at a time, recording to directory `path`
+
+    Every `decimate`-th weight goes to a memory-mapped weights.npy, and spike step
+    indices are appended to pre_spikes.bin / post_spikes.bin as raw int64. Only the pre
+    spikes of the last window and the next window's lookahead carry over between
+    chunks, so peak memory depends on `chunk_steps`, not on `n_steps`. Returns the
+    metadata also saved to meta.json.
+    """
+    os.makedirs(path, exist_ok=True)
+    lookahead = window - 1
+    pre_rng, post_rng = spike_generators(seed)
+    ltp_kernel = stdp_kernel(A_plus, tau_plus, window)
+    ltd_kernel = stdp_kernel(A_minus, tau_minus, window)
+    weights = open_memmap(os.path.join(path, WEIGHTS_FILE), mode='w+', dtype=weight_dtype,
+                          shape=(-(-n_steps // decimate),))
+
+    empty = np.empty(0, dtype=SPIKE_DTYPE)
+    pending_pre = pending_post = empty  # drawn spikes at or after the chunk start
+    past_pre = empty                    # pre spikes in the `lookahead` steps before it
+    drawn = 0
+    current = w_init
+    counts = {'pre_spikes': 0, 'post_spikes': 0, 'ltp_pairs': 0, 'ltd_pairs': 0}
+
+    with open(os.path.join(path, PRE_SPIKES_FILE), 'wb') as pre_file, \
+            open(os.path.join(path, POST_SPIKES_FILE), 'wb') as post_file:
+        for start in range(0, n_steps, chunk_steps):
+            stop = min(start + chunk_steps, n_steps)
+            # LTP at a pre spike pairs with posts up to `lookahead` steps past the chunk
+            horizon = min(stop + lookahead, n_steps)
+            if horizon > drawn:
+                pending_pre = np.concatenate(
+                    (pending_pre, drawn + np.flatnonzero(pre_rng.random(horizon - drawn) < p_pre)))
+                pending_post = np.concatenate(
+                    (pending_post, drawn + np.flatnonzero(post_rng.random(horizon - drawn) < p_post)))
+                drawn = horizon
+
+            pre, post = spike_pairs(np.concatenate((past_pre, pending_pre)), pending_post, window)
+            lag = post - pre
+            # Keep the LTP terms landing on this chunk's pre spikes and LTD terms on its post spikes
+            ltp = (pre >= start) & (pre < stop)
+            ltd = post < stop
+            delta = np.bincount(pre[ltp] - start, weights=ltp_kernel[lag[ltp]],
+                                minlength=stop - start).astype(float)
+            delta -= np.bincount(post[ltd] - start, weights=ltd_kernel[lag[ltd]], minlength=stop - start)
+            if start == 0:
+                delta[0] = 0.0  # the weight at step 0 is the initial value, never updated
+
+            events = np.flatnonzero(delta)
+            values = clipped_cumsum(current, delta[events])
+            run_lengths = np.diff(np.concatenate(([0], events, [stop - start])))
+            w_chunk = np.repeat(np.concatenate(([current], values)), run_lengths)
+            if len(values):
+                current = values[-1]
+
+            first = -start % decimate  # first sampled step of this chunk, relative to start
+            samples = w_chunk[first::decimate]
+            offset = (start + first) // decimate
+            weights[offset:offset + len(samples)] = samples
+
+            finished_pre = pending_pre[:np.searchsorted(pending_pre, stop)]
+            finished_post = pending_post[:np.searchsorted(pending_post, stop)]
+            finished_pre.tofile(pre_file)
+            finished_post.tofile(post_file)
+            past_pre = np.concatenate((past_pre, finished_pre))
+            past_pre = past_pre[np.searchsorted(past_pre, stop - lookahead):]
+            pending_pre = pending_pre[len(finished_pre):]
+            pending_post = pending_post[len(finished_post):]
+
+            counts['pre_spikes'] += len(finished_pre)
+            counts['post_spikes'] += len(finished_post)
+            counts['ltp_pairs'] += int(np.count_nonzero(ltp))
+            counts['ltd_pairs'] += int(np.count_nonzero(ltd))
+
+    weights.flush()
+    del weights
+    meta = {
+        'n_steps': n_steps, 'dt': dt, 'decimate': decimate, 'chunk_steps': chunk_steps, 'seed': seed,
+        'p_pre': p_pre, 'p_post': p_post, 'w_init': w_init, 'A_plus': A_plus, 'A_minus': A_minus,
+        'tau_plus': tau_plus, 'tau_minus': tau_minus, 'window': window,
+        'weight_dtype': np.dtype(weight_dtype).name, 'final_weight': float(current), **counts,
+    }
+    with open(os.path.join(path, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+def _load_spikes(path):
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=SPIKE_DTYPE)  # np.memmap refuses empty files
+    return np.memmap(path, dtype=SPIKE_DTYPE, mode='r')
+
+
+class Recording:
+    """A run saved by simulate_chunked; weights and spike step indices are read-only memory maps"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as f:
+            self.meta = json.load(f)
+        self.weights = np.load(os.path.join(path, WEIGHTS_FILE), mmap_mode='r')
+        self.pre_spikes = _load_spikes(os.path.join(path, PRE_SPIKES_FILE))
+        self.post_spikes = _load_spikes(os.path.join(path, POST_SPIKES_FILE))
+
+    def downsampled_weights(self, max_points=DEFAULT_PLOT_POINTS):
+        """(times in ms, weights) with at most `max_points` samples, read with a stride"""
+        stride = max(1, -(-len(self.weights) // max_points))
+        w = np.asarray(self.weights[::stride])
+        times = np.arange(len(w)) * (stride * self.meta['decimate'] * self.meta['dt'])
+        return times, w
+
+    def spike_rate(self, spikes, bins=DEFAULT_PLOT_POINTS):
+        """(bin edges in ms, spikes per second) over the whole run"""
+        # Bin step indices straight off the memory map, then scale the edges to ms
+        counts, edges = np.histogram(spikes, bins=bins, range=(0, self.meta['n_steps']))
+        edges = edges * self.meta['dt']
+        return edges, counts / (np.diff(edges) / 1000.0)
+
+
+def load_recording(path):
+    return Recording(path)
+
+
+def plot_recording(path, max_points=DEFAULT_PLOT_POINTS):
+    """Plot a saved run from disk, downsampled to about `max_points` per panel"""
+    # Imported here so recordings can be made without loading matplotlib
+    import matplotlib.pyplot as plt
+
+    recording = load_recording(path)
+    duration = recording.meta['n_steps'] * recording.meta['dt']
+    plt.figure(figsize=(12, 10))
+
+    # Plot Synaptic Weight Evolution
+    plt.subplot(3, 1, 1)
+    times, w = recording.downsampled_weights(max_points)
+    plt.plot(times, w, color='blue', lw=2)
+    plt.xlabel('Time (ms)')
+    plt.ylabel('Synaptic Weight')
+    plt.title('Evolution of Synaptic Weight (Memristor Conductance)')
+    plt.grid(True)
+
+    for position, (label, spikes, color) in enumerate(
+            (('Pre', recording.pre_spikes, 'black'), ('Post', recording.post_spikes, 'red')), start=2):
+        plt.subplot(3, 1, position)
+        if len(spikes) <= max_points:
+            plt.eventplot(np.asarray(spikes) * recording.meta['dt'], colors=color, lineoffsets=0.5)
+            plt.ylim(0, 1.5)
+            plt.ylabel(f'{label}-Synaptic Spikes')
+        else:
+            # Too many spikes to draw one by one; show the firing rate instead
+            edges, rate = recording.spike_rate(spikes, max_points)
+            plt.stairs(rate, edges, color=color)
+            plt.ylabel(f'{label}-Synaptic Rate (Hz)')
+        plt.xlabel('Time (ms)')
+        plt.title(f'{label}-Synaptic Spike Train')
+        plt.xlim(0, duration)
+        plt.grid(True)
+
+    plt.tight_layout()
+    plt.show()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record a long STDP run to disk in fixed-size chunks.")
+    parser.add_argument('--steps', type=int, default=int(T / dt), help="timesteps to simulate")
+    parser.add_argument('-o', '--out', default='stdp_run', help="output directory")
+    parser.add_argument('--chunk-steps', type=int, default=DEFAULT_CHUNK_STEPS)
+    parser.add_argument('--decimate', type=int, default=1, help="keep every Nth weight sample")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--float32', action='store_true', help="store weights as float32")
+    parser.add_argument('--plot', action='store_true', help="plot the recording when done")
+    args = parser.parse_args(argv)
+
+    meta = simulate_chunked(args.out, args.steps, args.chunk_steps, args.decimate, args.seed,
+                            weight_dtype=np.float32 if args.float32 else np.float64)
+    print(f"{meta['n_steps']} steps, {meta['pre_spikes']} pre / {meta['post_spikes']} post spikes, "
+          f"final weight {meta['final_weight']:.4f} -> {args.out}")
+    if args.plot:
+        plot_recording(args.out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+# stdp_sweep.py
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory, util
+
+import numpy as np
+
+from BPNA import A_minus, A_plus, T, clipped_cumsum, dt, p_post, p_pre, stdp_deltas, tau_minus, tau_plus, w0, window
+from stdp_events import poisson_spike_times
+from stdp_recording import spike_generators
+
+PARAM_NAMES = ('A_plus', 'A_minus', 'tau_plus', 'tau_minus', 'window', 'p_pre', 'p_post')
+PARAM_DEFAULTS = {'A_plus': A_plus, 'A_minus': A_minus, 'tau_plus': tau_plus, 'tau_minus': tau_minus,
+                  'window': window, 'p_pre': p_pre, 'p_post': p_post}
+METRIC_NAMES = ('final_weight', 'mean_drift', 'ltp_events', 'ltd_events', 'pre_spikes', 'post_spikes')
+RESULT_FIELDS = PARAM_NAMES + ('seed',) + METRIC_NAMES
+SPIKE_DTYPE = np.int64
+
+_worker_state = {}
+
+
+def parameter_grid(**values):
+    """Every combination of the given parameter lists; parameters not given keep BPNA.py's value"""
+    unknown = set(values) - set(PARAM_NAMES)
+    if unknown:
+        raise ValueError(f"Unknown STDP parameter(s): {', '.join(sorted(unknown))}")
+    axes = [values.get(name, [PARAM_DEFAULTS[name]]) for name in PARAM_NAMES]
+    return [dict(zip(PARAM_NAMES, combo)) for combo in itertools.product(*axes)]
+
+
+def run_stdp(pre_idx, post_idx, n_steps, w_init=w0, A_plus=A_plus, A_minus=A_minus, tau_plus=tau_plus,
+             tau_minus=tau_minus, window=window, **_):
+    """One pair-rule run on sorted spike steps, reduced to the sweep's result columns
+
+    mean_drift is the time average of w(t) - w_init. LTP and LTD events count the steps
+    whose net update was positive or negative.
+    """
+    steps, delta = stdp_deltas(pre_idx, post_idx, A_plus, A_minus, tau_plus, tau_minus, window)
+    weights = clipped_cumsum(w_init, delta)
+    # Each weight holds from its update step until the next one
+    hold = np.diff(np.append(steps, n_steps))
+    return {
+        'final_weight': float(weights[-1]) if len(weights) else w_init,
+        'mean_drift': float(np.dot(weights - w_init, hold)) / n_steps,
+        'ltp_events': int(np.count_nonzero(delta > 0)),
+        'ltd_events': int(np.count_nonzero(delta < 0)),
+        'pre_spikes': len(pre_idx),
+        'post_spikes': len(post_idx),
+    }
+
+
+def _train_key(params, seed):
+    return (params['p_pre'], params['p_post'], seed)
+
+
+def share_spike_trains(keys, n_steps):
+    """Draw the spike trains for each (p_pre, p_post, seed) into one shared memory block
+
+    Returns the SharedMemory and a layout mapping each key to (pre start, pre stop,
+    post start, post stop) in the block's int64 array. The caller closes and unlinks it.
+    """
+    trains = []
+    for p_pre_key, p_post_key, seed in keys:
+        pre_rng, post_rng = spike_generators(seed)
+        trains.append((poisson_spike_times(pre_rng, n_steps, p_pre_key),
+                       poisson_spike_times(post_rng, n_steps, p_post_key)))
+    total = sum(len(pre) + len(post) for pre, post in trains)
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * np.dtype(SPIKE_DTYPE).itemsize)
+    block = np.ndarray(total, dtype=SPIKE_DTYPE, buffer=shm.buf)
+    layout = {}
+    offset = 0
+    for key, (pre, post) in zip(keys, trains):
+        block[offset:offset + len(pre)] = pre
+        block[offset + len(pre):offset + len(pre) + len(post)] = post
+        layout[key] = (offset, offset + len(pre), offset + len(pre), offset + len(pre) + len(post))
+        offset += len(pre) + len(post)
+    del block  # the SharedMemory cannot close while a view of its buffer is alive
+    return shm, layout
+
+
+def _init_worker(shm_name, layout, n_steps):
+    # Workers map the parent's block instead of receiving pickled copies of the trains
+    shm = shared_memory.SharedMemory(name=shm_name)
+    total = max(stop for *_, stop in layout.values()) if layout else 0
+    _worker_state.update(shm=shm, layout=layout, n_steps=n_steps,
+                         block=np.ndarray(total, dtype=SPIKE_DTYPE, buffer=shm.buf))
+    # Runs when a pool worker exits normally, i.e. after pool.close() and join()
+    util.Finalize(None, _close_worker, exitpriority=10)
+
+
+def _close_worker():
+    """Drop the worker's view of the shared block and close its mapping; the parent unlinks it"""
+    shm = _worker_state.get('shm')
+    _worker_state.clear()  # the block view goes first, or close() fails with a BufferError
+    if shm is not None:
+        shm.close()
+
+
+def _run_in_worker(task):
+    params, seed = task
+    pre_start, pre_stop, post_start, post_stop = _worker_state['layout'][_train_key(params, seed)]
+    block = _worker_state['block']
+    metrics = run_stdp(block[pre_start:pre_stop], block[post_start:post_stop], _worker_state['n_steps'], **params)
+    return {**params, 'seed': seed, **metrics}
+
+
+def _row_key(row):
+    # Compare as CSV text so rows read back from a previous run match new tasks
+    return tuple(str(row[name]) for name in PARAM_NAMES + ('seed',))
+
+
+def completed_runs(path):
+    """Keys of the runs already in a results file, so an interrupted sweep can resume"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='') as f:
+        return {_row_key(row) for row in csv.DictReader(f)}
+
+
+def run_sweep(path, grid, seeds, n_steps=int(T / dt), workers=None, chunksize=4, progress=None):
+    """Run every parameter set in `grid` for every seed, appending one CSV row per run to `path`
+
+    Runs already in `path` are skipped. Rows are written in completion order and flushed
+    as they arrive, so an interrupted sweep loses at most the runs in flight.
+    """
+    done = completed_runs(path)
+    tasks = [(params, seed) for params in grid for seed in seeds
+             if _row_key({**params, 'seed': seed}) not in done]
+    start_time = time.perf_counter()
+    if tasks:
+        keys = list(dict.fromkeys(_train_key(params, seed) for params, seed in tasks))
+        shm, layout = share_spike_trains(keys, n_steps)
+        config = (shm.name, layout, n_steps)
+        write_header = not done and not (os.path.exists(path) and os.path.getsize(path))
+        try:
+            with open(path, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+                if write_header:
+                    writer.writeheader()
+                for finished, row in enumerate(_iter_runs(tasks, config, workers, chunksize), start=1):
+                    writer.writerow(row)
+                    f.flush()
+                    if progress:
+                        progress(finished, len(tasks))
+        finally:
+            shm.close()
+            shm.unlink()
+    return {'runs': len(tasks), 'skipped': len(grid) * len(seeds) - len(tasks),
+            'seconds': time.perf_counter() - start_time, 'path': path}
+
+
+def _iter_runs(tasks, config, workers, chunksize):
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(*config)
+        try:
+            yield from map(_run_in_worker, tasks)
+        finally:
+            _close_worker()
+        return
+
+    with multiprocessing.Pool(workers, initializer=_init_worker, initargs=config) as pool:
+        yield from pool.imap_unordered(_run_in_worker, tasks, chunksize=chunksize)
+        # Let workers exit on their own so their finalizers close the mapping; leaving the
+        # with block would terminate them first
+        pool.close()
+        pool.join()
+
+
+def summarize(path):
+    """Mean and standard deviation of every metric across seeds, one row per parameter set"""
+    groups = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            groups.setdefault(tuple(row[name] for name in PARAM_NAMES), []).append(row)
+    summary = []
+    for params, rows in groups.items():
+        entry = dict(zip(PARAM_NAMES, params))
+        entry['seeds'] = len(rows)
+        for metric in METRIC_NAMES:
+            values = np.array([float(row[metric]) for row in rows])
+            entry[f'{metric}_mean'] = float(values.mean())
+            entry[f'{metric}_std'] = float(values.std())
+        summary.append(entry)
+    return summary
+
+
+def _float_list(text):
+    return [float(value) for value in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep STDP parameters over many seeds in parallel.")
+    for name in PARAM_NAMES:
+        parser.add_argument(f"--{name.lower().replace('_', '-')}", dest=name, default=None,
+                            help=f"comma-separated values (default {PARAM_DEFAULTS[name]})")
+    parser.add_argument('--seeds', type=int, default=10, help="seeds 0..N-1 per parameter set")
+    parser.add_argument('--steps', type=int, default=int(T / dt), help="timesteps per run")
+    parser.add_argument('-w', '--workers', type=int, default=None, help="processes (default: all CPUs)")
+    parser.add_argument('-o', '--out', default='stdp_sweep.csv', help="results table; rerun to resume")
+    args = parser.parse_args(argv)
+
+    values = {}
+    for name in PARAM_NAMES:
+        text = getattr(args, name)
+        if text is not None:
+            values[name] = [int(v) for v in text.split(',')] if name == 'window' else _float_list(text)
+    grid = parameter_grid(**values)
+
+    def progress(done, total):
+        if done == total or done % max(1, total // 20) == 0:
+            print(f"  {done}/{total} runs")
+
+    stats = run_sweep(args.out, grid, range(args.seeds), args.steps, args.workers, progress=progress)
+    print(f"{stats['runs']} runs in {stats['seconds']:.2f}s ({stats['skipped']} already done) -> {stats['path']}")
+    for entry in summarize(args.out):
+        params = ' '.join(f"{name}={entry[name]}" for name in PARAM_NAMES if name in values)
+        print(f"{params or 'defaults'}: final w {entry['final_weight_mean']:.4f} +- {entry['final_weight_std']:.4f}, "
+              f"drift {entry['mean_drift_mean']:+.4f}, LTP/LTD {entry['ltp_events_mean']:.0f}/"
+              f"{entry['ltd_events_mean']:.0f} over {entry['seeds']} seeds")
+
+
+if __name__ == "__main__":
+    main()
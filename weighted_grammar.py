@@ -0,0 +1,300 @@
+# weighted_grammar.py
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from grammar_compiler import CompiledGrammar, build_parse_tree
+from music_env import CHORD_MAP, HARMONIC_PROGRESSIONS, MUSIC_CFG, MUSIC_CFG_WEIGHTS, STAR_CONTINUE
+
+RANDOM_BUFFER_SIZE = 512
+
+
+class AliasTable:
+    """Walker/Vose alias table: O(n) to build, then one uniform number per O(1) draw
+
+    Column i is kept with probability prob[i] and otherwise gives alias[i]. A single
+    uniform u picks the column from int(u * n) and the coin from the remaining fraction.
+    """
+
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=float)
+        if weights.ndim != 1 or not len(weights) or (weights < 0).any() or not weights.sum() > 0:
+            raise ValueError(f"Alias table weights must be non-negative with a positive sum: {weights}")
+        n = len(weights)
+        self.n = n
+        self.probabilities = weights / weights.sum()
+        scaled = (self.probabilities * n).tolist()
+        prob = [1.0] * n
+        alias = list(range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            prob[s] = scaled[s]
+            alias[s] = l
+            scaled[l] -= 1.0 - scaled[s]
+            (small if scaled[l] < 1.0 else large).append(l)
+        # Whatever is left is 1 up to rounding and keeps its own column
+        self.prob = prob
+        self.alias = alias
+
+    def draw(self, u):
+        """Index drawn from one uniform number u in [0, 1)"""
+        x = u * self.n
+        i = int(x)
+        return i if x - i < self.prob[i] else self.alias[i]
+
+    def sample(self, rng, size):
+        """`size` indices at once from a NumPy Generator"""
+        x = rng.random(size) * self.n
+        i = x.astype(np.int64)
+        return np.where(x - i < np.asarray(self.prob)[i], i, np.asarray(self.alias)[i])
+
+
+class RandomBuffer:
+    """Uniform numbers from a NumPy Generator, drawn `size` at a time and handed out one by one"""
+
+    def __init__(self, rng=None, size=RANDOM_BUFFER_SIZE):
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.size = size
+        # A C-level iterator over the blocks, so each number costs one next() call
+        self.next = itertools.chain.from_iterable(iter(self._block, None)).__next__
+
+    def _block(self):
+        return self.rng.random(self.size).tolist()
+
+
+class WeightedGrammar(CompiledGrammar):
+    """CompiledGrammar plus an alias table per symbol built from production weights
+
+    `weights` maps a symbol to one weight per production, in grammar order; symbols
+    left out are uniform. Harmony's weights go to the progression named by each
+    production. `star_continue` is the chance a Kleene-star item repeats once more.
+    """
+
+    def __init__(self, grammar=MUSIC_CFG, weights=MUSIC_CFG_WEIGHTS, progressions=HARMONIC_PROGRESSIONS,
+                 star_continue=STAR_CONTINUE):
+        super().__init__(grammar, progressions)
+        weights = weights or {}
+        for lhs, rhs in grammar.items():
+            if lhs in weights and len(weights[lhs]) != len(rhs):
+                raise ValueError(f"{lhs!r} has {len(rhs)} productions but {len(weights[lhs])} weights")
+        if not 0 <= star_continue < 1:
+            raise ValueError(f"star_continue must be in [0, 1): {star_continue}")
+        self.star_continue = star_continue
+        self.tables = tuple(
+            AliasTable(weights.get(self.symbols[sym_id], [1] * len(options))) if options else None
+            for sym_id, options in enumerate(self.productions))
+
+        harmony_weights = dict(zip((rhs[0] for rhs in grammar.get('Harmony', []) if len(rhs) == 1),
+                                   weights.get('Harmony', [])))
+        self.progression_table = AliasTable([harmony_weights.get(name, 1) for name in progressions])
+
+
+def sample_preorder(weighted, start_symbol='Song', max_depth=5, rng=None):
+    """Expand like grammar_compiler.expand_preorder, drawing productions from the alias tables
+
+    `rng` is a NumPy Generator (or a seed for one); uniforms come from it in blocks
+    through a RandomBuffer rather than one call per node. Pass a RandomBuffer instead
+    to share one across many songs. Returns flat preorder (symbol ids, child counts)
+    lists for build_parse_tree or CompactParseTree.
+    """
+    if not isinstance(rng, RandomBuffer):
+        rng = RandomBuffer(rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng))
+    uniform = rng.next
+    productions = weighted.productions
+    # (n, prob, alias) per symbol, so draws are inlined rather than AliasTable.draw calls
+    tables = [(t.n, t.prob, t.alias) if t is not None else None for t in weighted.tables]
+    is_terminal = weighted.is_terminal
+    star_base = weighted.star_base
+    harmony_id = weighted.harmony_id
+    chord_phrase_id = weighted.chord_phrase_id
+    progression_ids = weighted.progression_ids
+    progression_table = weighted.progression_table
+    star_continue = weighted.star_continue
+
+    sym_ids = []
+    child_counts = []
+    push_sym = sym_ids.append
+    push_count = child_counts.append
+
+    def open_node(sym_id, depth):
+        """Emit `sym_id` and return its chosen production, or None for leaves"""
+        push_sym(sym_id)
+        push_count(0)
+        if depth > max_depth:
+            return None
+        if sym_id == harmony_id:
+            push_sym(progression_ids[progression_table.draw(uniform())])
+            push_count(0)
+            child_counts[-2] = 1
+            return None
+        if is_terminal[sym_id]:
+            return None
+        n, prob, alias = tables[sym_id]
+        x = uniform() * n
+        i = int(x)
+        return productions[sym_id][i if x - i < prob[i] else alias[i]]
+
+    if start_symbol not in weighted.symbol_ids:
+        raise KeyError(f"Unknown start symbol: {start_symbol!r}")
+    start_id = weighted.symbol_ids[start_symbol]
+    production = open_node(start_id, 0)
+    if not production:
+        return sym_ids, child_counts
+
+    # Same pending-item scheme as expand_preorder
+    stars = start_id != chord_phrase_id
+    stack = [(child_id, 0, 1, stars) for child_id in reversed(production)]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        item = pop()
+        sym_id, parent, depth, stars = item
+        if stars:
+            base_id = star_base[sym_id]
+            if base_id >= 0:
+                if uniform() >= star_continue:
+                    continue
+                push(item)
+                sym_id = base_id
+
+        child_counts[parent] += 1
+        if is_terminal[sym_id]:
+            push_sym(sym_id)
+            push_count(0)
+            continue
+        index = len(sym_ids)
+        production = open_node(sym_id, depth)
+        if production:
+            stars = sym_id != chord_phrase_id
+            depth += 1
+            for child_id in reversed(production):
+                push((child_id, index, depth, stars))
+    return sym_ids, child_counts
+
+
+def generate_weighted_tree(weighted, start_symbol='Song', max_depth=5, rng=None):
+    """ParseTreeNode tree sampled with the grammar's weights"""
+    sym_ids, child_counts = sample_preorder(weighted, start_symbol, max_depth, rng)
+    return build_parse_tree(weighted.symbols, sym_ids, child_counts)
+
+
+def expected_counts(weighted, start_symbol='Song', max_depth=5):
+    """Expected number of nodes of every symbol in a tree grown from `start_symbol`
+
+    Dynamic programming over depth, from max_depth + 1 (where every node is a leaf)
+    back to 0: a symbol opened at depth d contributes itself plus the weighted average
+    of its productions' children at depth d + 1, and a starred item contributes
+    c / (1 - c) copies of its base symbol, c being star_continue. Matches the
+    expanders exactly, ChordPhrase's star rule and the depth cut-off included.
+    Returns an array indexed by symbol id.
+    """
+    n_symbols = len(weighted.symbols)
+    identity = np.eye(n_symbols)
+    star_copies = weighted.star_continue / (1 - weighted.star_continue)
+    progression_mean = weighted.progression_table.probabilities @ identity[list(weighted.progression_ids)]
+
+    # below[s]: expected counts under symbol s opened one level deeper. Starred items
+    # have no productions, so where stars are off (under ChordPhrase) they are leaves.
+    below = identity  # at max_depth + 1 everything is a leaf
+    for _ in range(max_depth + 1):
+        current = identity.copy()
+        current[weighted.harmony_id] += progression_mean
+        for sym_id, table in enumerate(weighted.tables):
+            if table is None or sym_id == weighted.harmony_id:
+                continue
+            stars = sym_id != weighted.chord_phrase_id
+            for p, production in zip(table.probabilities, weighted.productions[sym_id]):
+                for child_id in production:
+                    base_id = weighted.star_base[child_id]
+                    if stars and base_id >= 0:
+                        current[sym_id] += p * star_copies * below[base_id]
+                    else:
+                        current[sym_id] += p * below[child_id]
+        below = current
+    return below[weighted.symbol_ids[start_symbol]]
+
+
+def sounds_as_note(symbol):
+    """True for symbols the renderers play as a single note, e.g. 'C4'"""
+    # The same test as parse_tree_to_events and parse_tree_to_music; 'C5' leaves stay silent
+    return len(symbol) == 2 and symbol[1] == '4'
+
+
+def estimate_song(weighted, start_symbol='Song', max_depth=5):
+    """Expected size of one song: tree nodes, leaves, notes and chords
+
+    Notes and chords are counted as the renderers sound them: every ChordPhrase plays a
+    chord of its own (from the progression or a random fallback) besides its Chord leaves.
+    """
+    counts = expected_counts(weighted, start_symbol, max_depth)
+    leaves = [sym_id for sym_id, terminal in enumerate(weighted.is_terminal) if terminal]
+    chords = [sym_id for sym_id, name in enumerate(weighted.symbols) if name in CHORD_MAP]
+    chords.append(weighted.chord_phrase_id)
+    notes = [sym_id for sym_id, name in enumerate(weighted.symbols) if sounds_as_note(name)]
+    return {
+        'nodes': float(counts.sum()),
+        'leaves': float(counts[leaves].sum()),
+        'notes': float(counts[notes].sum()),
+        'chords': float(counts[chords].sum()),
+        'counts': {weighted.symbols[sym_id]: float(c) for sym_id, c in enumerate(counts) if c},
+    }
+
+
+def estimate_batch(n_songs, weighted=None, start_symbol='Song', max_depth=5, seconds_per_node=None):
+    """Predicted totals for `n_songs` songs, before generating any
+
+    With `seconds_per_node` (see calibrate), the expected generation time is included.
+    """
+    weighted = weighted or WeightedGrammar()
+    song = estimate_song(weighted, start_symbol, max_depth)
+    estimate = {
+        'songs': n_songs,
+        'nodes_per_song': song['nodes'],
+        'notes_per_song': song['notes'],
+        'chords_per_song': song['chords'],
+        'total_nodes': song['nodes'] * n_songs,
+        'total_notes': song['notes'] * n_songs,
+    }
+    if seconds_per_node is not None:
+        estimate['seconds_per_node'] = seconds_per_node
+        estimate['expected_seconds'] = seconds_per_node * estimate['total_nodes']
+    return estimate
+
+
+def calibrate(generate, n_songs=200):
+    """Seconds per node of `generate(index)`, which must return a (sym_ids, child_counts) pair"""
+    nodes = 0
+    start_time = time.perf_counter()
+    for index in range(n_songs):
+        nodes += len(generate(index)[0])
+    return (time.perf_counter() - start_time) / max(nodes, 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Predict the size and cost of a batch of songs from MUSIC_CFG")
+    parser.add_argument('-n', '--songs', type=int, default=10_000, help="songs in the batch")
+    parser.add_argument('--max-depth', type=int, default=5)
+    parser.add_argument('--check', type=int, default=0, help="sample this many songs to compare with the prediction")
+    args = parser.parse_args(argv)
+
+    weighted = WeightedGrammar()
+    seconds_per_node = calibrate(lambda i: sample_preorder(weighted, max_depth=args.max_depth, rng=i))
+    estimate = estimate_batch(args.songs, weighted, max_depth=args.max_depth, seconds_per_node=seconds_per_node)
+    print(f"Per song: {estimate['nodes_per_song']:.1f} nodes, {estimate['notes_per_song']:.1f} notes, "
+          f"{estimate['chords_per_song']:.1f} chords")
+    print(f"{args.songs} songs: {estimate['total_nodes']:.0f} nodes, {estimate['total_notes']:.0f} notes, "
+          f"about {estimate['expected_seconds']:.2f}s to expand the trees")
+    if args.check:
+        rng = np.random.default_rng(0)
+        sizes = [len(sample_preorder(weighted, max_depth=args.max_depth, rng=rng)[0]) for _ in range(args.check)]
+        print(f"Sampled {args.check} songs: {np.mean(sizes):.1f} +- {np.std(sizes) / np.sqrt(args.check):.1f} "
+              f"nodes per song")
+
+
+if __name__ == "__main__":
+    main()